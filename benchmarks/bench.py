@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the core hot paths and end-to-end CLI invocations.
+
+    python3 benchmarks/bench.py run                        # print results
+    python3 benchmarks/bench.py run --output new.json      # save results
+    python3 benchmarks/bench.py run --save-baseline        # overwrite baseline.json
+    python3 benchmarks/bench.py compare                    # run, compare with baseline.json
+    python3 benchmarks/bench.py compare old.json new.json  # compare two saved runs
+    python3 benchmarks/bench.py scaling --workers 1 2 4 8  # parallel CBT records/sec
+
+compare exits with status 1 if any benchmark is slower than the baseline by
+more than --tolerance (default 25%).
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+sys.path.insert(0, PROJECT_ROOT)
+
+MBTI_TYPES = [
+    'ISTJ', 'ISFJ', 'INFJ', 'INTJ', 'ISTP', 'ISFP', 'INFP', 'INTP',
+    'ESTP', 'ESFP', 'ENFP', 'ENTP', 'ESTJ', 'ESFJ', 'ENFJ', 'ENTJ',
+]
+
+SHORT_THOUGHT = "I always mess things up and it's my fault that nobody likes me."
+
+# name -> (setup() returning a zero-argument callable, operations per call)
+BENCHMARKS = {}
+
+
+def benchmark(name, ops=1, cli=False):
+    def register(setup):
+        BENCHMARKS[name] = (setup, ops, cli)
+        return setup
+    return register
+
+
+def _long_text(size=10 * 1024):
+    filler = (
+        "Today was a normal day at work and I finished most of my tasks. "
+        "Later I went for a walk, had dinner with a friend and read a book. "
+    )
+    text = SHORT_THOUGHT + " "
+    while len(text) < size:
+        text += filler
+    return text[:size]
+
+
+@benchmark('derive_cognitive_stack', ops=16)
+def _derive_cognitive_stack():
+    from core.functions import derive_cognitive_stack
+    def run():
+        for mbti in MBTI_TYPES:
+            derive_cognitive_stack(mbti)
+    return run
+
+
+@benchmark('get_function_roles', ops=16)
+def _get_function_roles():
+    from core.functions import get_function_roles
+    def run():
+        for mbti in MBTI_TYPES:
+            get_function_roles(mbti)
+    return run
+
+
+@benchmark('infer_mbti_from_stack', ops=32)
+def _infer_mbti_from_stack():
+    from core.functions import infer_mbti_from_stack, VALID_STACKS
+    exact = list(VALID_STACKS.values())
+    closest = [stack[:1] + stack[2:3] + stack[1:2] + stack[3:] for stack in exact]
+    stacks = exact + closest
+    def run():
+        for stack in stacks:
+            infer_mbti_from_stack(stack)
+    return run
+
+
+@benchmark('get_intertype_relation_256', ops=256)
+def _get_intertype_relation():
+    from core.socionics import get_intertype_relation
+    pairs = [(a, b) for a in MBTI_TYPES for b in MBTI_TYPES]
+    def run():
+        for a, b in pairs:
+            get_intertype_relation(a, b)
+    return run
+
+
+@benchmark('bigfive_report_population')
+def _bigfive_report_population():
+    from core.bigfive import BigFiveProfile
+    profile = BigFiveProfile(62.0, 48.5, 35.0, 71.0, 55.5)
+    return profile.get_report
+
+
+@benchmark('bigfive_report_type_norms')
+def _bigfive_report_type_norms():
+    from core.bigfive import BigFiveProfile
+    profile = BigFiveProfile(62.0, 48.5, 35.0, 71.0, 55.5, mbti_type='INFJ')
+    profile.get_report()  # load norms outside the timed loop
+    return profile.get_report
+
+
+@benchmark('analyze_cbt_thought_short')
+def _analyze_cbt_thought_short():
+    from core.cbt import analyze_cbt_thought
+    return lambda: analyze_cbt_thought(SHORT_THOUGHT)
+
+
+@benchmark('analyze_cbt_thought_10kb')
+def _analyze_cbt_thought_10kb():
+    from core.cbt import analyze_cbt_thought
+    text = _long_text()
+    return lambda: analyze_cbt_thought(text)
+
+
+def _cli(*args):
+    cmd = [sys.executable, os.path.join(PROJECT_ROOT, 'eidon.py')] + list(args)
+    return lambda: subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True, cwd=PROJECT_ROOT)
+
+
+@benchmark('cli_infer', cli=True)
+def _cli_infer():
+    return _cli('infer', '--stack', 'Ni', 'Fe', 'Ti', 'Se')
+
+
+@benchmark('cli_analyze', cli=True)
+def _cli_analyze():
+    return _cli('analyze', '--type', 'INFJ', '--show-socionics', '--compare-to', 'ISTJ')
+
+
+@benchmark('cli_analyze_bigfive_cbt', cli=True)
+def _cli_analyze_bigfive_cbt():
+    return _cli('analyze', '--type', 'INFJ', '--bigfive', '60', '50', '40', '70', '30',
+                '--cbt-thought', SHORT_THOUGHT)
+
+
+def time_benchmark(setup, ops, cli, repeat):
+    """Best seconds per operation over `repeat` timing rounds."""
+    func = setup()
+    timer = timeit.Timer(func)
+    if cli:
+        number = 1
+        repeat = max(repeat, 5)
+    else:
+        number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / (number * ops)
+
+
+def run_benchmarks(names=None, repeat=5, include_cli=True):
+    results = {}
+    for name, (setup, ops, cli) in BENCHMARKS.items():
+        if names and not any(pattern in name for pattern in names):
+            continue
+        if cli and not include_cli:
+            continue
+        seconds = time_benchmark(setup, ops, cli, repeat)
+        results[name] = {'seconds_per_op': seconds, 'ops_per_call': ops}
+        print(f"{name:32s} {format_time(seconds):>12s}/op", file=sys.stderr)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+def compare(baseline, current, tolerance):
+    """Print a comparison table; return the names that regressed."""
+    regressions = []
+    print(f"{'benchmark':32s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        now = result['seconds_per_op']
+        if base is None:
+            print(f"{name:32s} {'-':>12s} {format_time(now):>12s} {'new':>8s}")
+            continue
+        ratio = now / base['seconds_per_op']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:32s} {format_time(base['seconds_per_op']):>12s} {format_time(now):>12s} "
+              f"{(ratio - 1) * 100:+7.1f}%{flag}")
+    return regressions
+
+
+def cbt_scaling(workers_list, records, chunk_size):
+    """Records/sec of ParallelCBTAnalyzer for each worker count, pool start-up excluded."""
+    from core.cbt import ParallelCBTAnalyzer
+    thoughts = [SHORT_THOUGHT, "Today was a normal day at work.", _long_text(400)]
+    texts = [thoughts[i % len(thoughts)] for i in range(records)]
+    rows = []
+    for workers in workers_list:
+        with ParallelCBTAnalyzer(workers, chunk_size) as analyzer:
+            for _ in analyzer.imap(texts[:workers * chunk_size]):
+                pass  # warm up every worker
+            start = time.perf_counter()
+            for _ in analyzer.imap(texts):
+                pass
+            elapsed = time.perf_counter() - start
+        rows.append({'workers': workers, 'records_per_sec': records / elapsed})
+    return rows
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Eidon benchmark suite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run benchmarks")
+    scaling_parser = subparsers.add_parser("scaling", help="Parallel CBT throughput against worker count")
+    scaling_parser.add_argument("--workers", type=int, nargs="+",
+                                default=sorted({1, 2, 4, os.cpu_count() or 1}),
+                                help="Worker counts to measure (default: 1 2 4 and the CPU count)")
+    scaling_parser.add_argument("--records", type=int, default=200000, help="Records per measurement (default: 200000)")
+    scaling_parser.add_argument("--chunk-size", type=int, default=2000, help="Records per worker task (default: 2000)")
+    compare_parser = subparsers.add_parser("compare", help="Compare results with a baseline")
+    for sub in (run_parser, compare_parser):
+        sub.add_argument("--filter", nargs="+", help="Only run benchmarks whose name contains one of these")
+        sub.add_argument("--repeat", type=int, default=5, help="Timing rounds per benchmark (default: 5)")
+        sub.add_argument("--no-cli", action="store_true", help="Skip end-to-end CLI benchmarks")
+    run_parser.add_argument("--output", help="Write results as JSON to this file")
+    run_parser.add_argument("--save-baseline", action="store_true", help=f"Write results to {BASELINE_PATH}")
+    compare_parser.add_argument("baseline", nargs="?", default=BASELINE_PATH, help="Baseline results JSON")
+    compare_parser.add_argument("current", nargs="?", help="Current results JSON (default: run now)")
+    compare_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown as a fraction before flagging a regression (default: 0.25)"
+    )
+    args = parser.parse_args()
+
+    if args.command == "scaling":
+        rows = cbt_scaling(args.workers, args.records, args.chunk_size)
+        print(f"{'workers':>7s} {'records/s':>12s} {'speedup':>8s}")
+        for row in rows:
+            speedup = row['records_per_sec'] / rows[0]['records_per_sec']
+            print(f"{row['workers']:7d} {row['records_per_sec']:12,.0f} {speedup:7.2f}x")
+        return
+
+    if args.command == "run":
+        results = run_benchmarks(args.filter, args.repeat, not args.no_cli)
+        if args.save_baseline:
+            save(results, BASELINE_PATH)
+        if args.output:
+            save(results, args.output)
+        if not (args.save_baseline or args.output):
+            print(json.dumps(results, indent=2, sort_keys=True))
+        return
+
+    baseline = load(args.baseline)
+    if args.current:
+        current = load(args.current)
+    else:
+        current = run_benchmarks(args.filter, args.repeat, not args.no_cli)
+    regressions = compare(baseline, current, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}: "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+aggregate.py
+
+Streaming cohort aggregation: builds per-type Big Five norms from raw
+(MBTI type, O, C, E, A, N) rows in CSV or JSONL files.
+
+Each type (and the whole population, under ANY) keeps, per trait, a count,
+mean and sum of squared deviations updated with Welford's algorithm, plus an
+optional fixed-bin histogram over the 0-100 score range as a quantile
+sketch. Memory is constant in the number of rows. Aggregates from separate
+shards merge exactly (Chan et al.'s pairwise update; histograms add), and
+are saved as small JSON partial files between runs. With NumPy, rows are
+folded in chunk by chunk using the same pairwise merge.
+"""
+
+import csv
+import json
+import math
+
+from core.bigfive import TRAITS
+from core.compat import require_numpy
+from core.normstore import ANY, DEFAULT_QUANTILES, write_norm_store
+from core.typecode import TYPE_CODES, TYPE_NAMES
+
+PARTIAL_VERSION = 1
+
+# Quantile sketch resolution: 1000 bins of 0.1 points over 0-100
+HISTOGRAM_BINS = 1000
+SCORE_MIN, SCORE_MAX = 0.0, 100.0
+
+TYPE_COLUMNS = ('type', 'mbti', 'mbti_type')
+# Accepted column names per trait, in TRAITS order (partial files record
+# the trait names so shards from another version are not mixed)
+TRAIT_COLUMNS = (
+    ('openness', 'o'),
+    ('conscientiousness', 'c'),
+    ('extraversion', 'e'),
+    ('agreeableness', 'a'),
+    ('neuroticism', 'n'),
+)
+
+
+class TraitStats:
+    """Online count, mean and variance of one trait, with an optional histogram."""
+
+    __slots__ = ('n', 'mean', 'm2', 'histogram')
+
+    def __init__(self, bins=None):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.histogram = [0] * bins if bins else None
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        if self.histogram is not None:
+            bins = len(self.histogram)
+            index = int((value - SCORE_MIN) * (bins / (SCORE_MAX - SCORE_MIN)))
+            self.histogram[min(max(index, 0), bins - 1)] += 1
+
+    def merge(self, other):
+        """Fold another TraitStats into this one."""
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        if self.histogram is not None:
+            if other.histogram is None or len(other.histogram) != len(self.histogram):
+                raise ValueError("Cannot merge aggregates with different quantile sketches")
+            self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+    @property
+    def sd(self):
+        """Sample standard deviation, or None with fewer than two values."""
+        if self.n < 2:
+            return None
+        return math.sqrt(self.m2 / (self.n - 1))
+
+    def quantile(self, p):
+        """Approximate quantile from the histogram (linear within a bin), or None."""
+        if self.histogram is None or self.n == 0:
+            return None
+        target = p * self.n
+        width = (SCORE_MAX - SCORE_MIN) / len(self.histogram)
+        cumulative = 0
+        for i, count in enumerate(self.histogram):
+            if count and cumulative + count >= target:
+                return SCORE_MIN + width * (i + (target - cumulative) / count)
+            cumulative += count
+        return SCORE_MAX
+
+    def to_dict(self):
+        state = {'n': self.n, 'mean': self.mean, 'm2': self.m2}
+        if self.histogram is not None:
+            state['histogram'] = self.histogram
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls()
+        stats.n = state['n']
+        stats.mean = state['mean']
+        stats.m2 = state['m2']
+        stats.histogram = state.get('histogram')
+        return stats
+
+
+class CohortAggregate:
+    """
+    Per-type and whole-population TraitStats for the Big Five traits.
+
+        aggregate = CohortAggregate(quantiles=True)
+        aggregate.add_rows(iter_rows(f, 'csv'))
+        aggregate.write_norms('norms.bin')
+    """
+
+    def __init__(self, traits=TRAITS, quantiles=False):
+        self.traits = tuple(traits)
+        self.bins = HISTOGRAM_BINS if quantiles else None
+        # group (MBTI type or ANY) -> [TraitStats per trait]
+        self.groups = {}
+        self.skipped = 0
+
+    def _group(self, name):
+        stats = self.groups.get(name)
+        if stats is None:
+            stats = self.groups[name] = [TraitStats(self.bins) for _ in self.traits]
+        return stats
+
+    def add(self, mbti_type, scores):
+        for group in (mbti_type, ANY):
+            for stats, value in zip(self._group(group), scores):
+                stats.add(value)
+
+    def add_rows(self, rows, chunk_size=8192):
+        """
+        Add (mbti_type, scores) rows; rows that are None are counted as
+        skipped. With NumPy installed, rows are buffered into chunks whose
+        per-group statistics are computed in bulk and merged in.
+        """
+        try:
+            np = require_numpy("CohortAggregate.add_rows")
+        except ImportError:
+            np = None
+        if np is None:
+            for row in rows:
+                if row is None:
+                    self.skipped += 1
+                else:
+                    self.add(*row)
+            return
+        types, scores = [], []
+        for row in rows:
+            if row is None:
+                self.skipped += 1
+                continue
+            types.append(row[0])
+            scores.append(row[1])
+            if len(types) >= chunk_size:
+                self._add_chunk(np, types, scores)
+                types, scores = [], []
+        if types:
+            self._add_chunk(np, types, scores)
+
+    def add_arrays(self, type_codes, scores):
+        """
+        Add a chunk of rows given as arrays: type codes and (N, 5) scores
+        (e.g. from a ProfileStore). Rows with a missing or out-of-range
+        score are counted as skipped.
+        """
+        np = require_numpy("CohortAggregate.add_arrays")
+        scores = np.asarray(scores, dtype=np.float64)
+        valid = ((scores >= SCORE_MIN) & (scores <= SCORE_MAX)).all(axis=1)
+        self.skipped += int(len(valid) - valid.sum())
+        if valid.any():
+            names = np.array(TYPE_NAMES)[np.asarray(type_codes)[valid]]
+            self._add_chunk(np, names, scores[valid])
+
+    def _add_chunk(self, np, types, scores):
+        types = np.array(types)
+        scores = np.array(scores, dtype=np.float64)
+        if self.bins:
+            span = SCORE_MAX - SCORE_MIN
+            bin_index = np.clip(((scores - SCORE_MIN) * (self.bins / span)).astype(np.intp), 0, self.bins - 1)
+        groups = [(name, types == name) for name in np.unique(types).tolist()]
+        groups.append((ANY, None))
+        for name, rows in groups:
+            block = scores if rows is None else scores[rows]
+            mean = block.mean(axis=0)
+            m2 = ((block - mean) ** 2).sum(axis=0)
+            for t, stats in enumerate(self._group(name)):
+                chunk = TraitStats()
+                chunk.n = len(block)
+                chunk.mean = float(mean[t])
+                chunk.m2 = float(m2[t])
+                if self.bins:
+                    column = bin_index[:, t] if rows is None else bin_index[rows, t]
+                    chunk.histogram = np.bincount(column, minlength=self.bins).tolist()
+                stats.merge(chunk)
+
+    def merge(self, other):
+        if other.traits != self.traits:
+            raise ValueError("Cannot merge aggregates over different traits")
+        if not self.groups:
+            # Nothing added yet: take on the shards' sketch setting
+            self.bins = other.bins
+        if other.bins != self.bins:
+            raise ValueError("Cannot merge aggregates with and without quantile sketches")
+        for name, other_stats in other.groups.items():
+            for stats, extra in zip(self._group(name), other_stats):
+                stats.merge(extra)
+        self.skipped += other.skipped
+
+    def count(self, group=ANY):
+        stats = self.groups.get(group)
+        return stats[0].n if stats else 0
+
+    def to_dict(self):
+        return {
+            'version': PARTIAL_VERSION,
+            'traits': list(self.traits),
+            'bins': self.bins,
+            'skipped': self.skipped,
+            'groups': {
+                name: {trait: s.to_dict() for trait, s in zip(self.traits, stats)}
+                for name, stats in self.groups.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        if state.get('version') != PARTIAL_VERSION:
+            raise ValueError(f"Unsupported partial aggregate version: {state.get('version')}")
+        aggregate = cls(state['traits'])
+        aggregate.bins = state['bins']
+        aggregate.skipped = state.get('skipped', 0)
+        for name, traits in state['groups'].items():
+            aggregate.groups[name] = [TraitStats.from_dict(traits[trait]) for trait in aggregate.traits]
+        return aggregate
+
+    def save_partial(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load_partial(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def cells(self, min_count=1, quantiles=DEFAULT_QUANTILES):
+        """Norm store cells, one per group with at least min_count rows."""
+        cells = []
+        for name, stats in sorted(self.groups.items()):
+            if stats[0].n < min_count:
+                continue
+            cell = {'type': name, 'n': stats[0].n}
+            for trait, s in zip(self.traits, stats):
+                cell[trait] = {
+                    'mean': _round(s.mean),
+                    'sd': _round(s.sd),
+                    'quantiles': [_round(s.quantile(p)) for p in quantiles] if s.histogram is not None else None,
+                }
+            cells.append(cell)
+        return cells
+
+    def write_norms(self, path, min_count=1):
+        """
+        Write norms BigFiveNorms can load: flat {TYPE: {trait: mean}} JSON
+        for a .json path, otherwise a binary norms store that also holds
+        counts, SDs, quantiles and the whole-population cell.
+
+        Returns:
+            int: number of types written
+        """
+        cells = self.cells(min_count)
+        types = [cell for cell in cells if cell['type'] != ANY]
+        if path.endswith('.json'):
+            norms = {
+                cell['type']: {trait: cell[trait]['mean'] for trait in self.traits}
+                for cell in types
+            }
+            with open(path, 'w') as f:
+                json.dump(norms, f, indent=2)
+                f.write('\n')
+        else:
+            write_norm_store(path, cells, self.traits)
+        return len(types)
+
+
+def _round(value):
+    # Norms are published to two decimals, as in data/mbti_bigfive_norms.json
+    return None if value is None else round(value, 2)
+
+
+def _column_index(header, names):
+    lowered = [column.strip().lower() for column in header]
+    for name in names:
+        if name in lowered:
+            return lowered.index(name)
+    raise ValueError(f"Missing column: one of {', '.join(names)}")
+
+
+def _parse_row(mbti_type, values):
+    """(MBTI type, scores) if the row is valid, else None."""
+    mbti_type = str(mbti_type).strip().upper()
+    if mbti_type not in TYPE_CODES:
+        return None
+    try:
+        scores = [float(value) for value in values]
+    except (TypeError, ValueError):
+        return None
+    if not all(SCORE_MIN <= score <= SCORE_MAX for score in scores):
+        return None
+    return mbti_type, scores
+
+
+def iter_csv_rows(lines):
+    """Yield (mbti_type, scores) or None (invalid row) from CSV with a header row."""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    type_index = _column_index(header, TYPE_COLUMNS)
+    trait_indexes = [_column_index(header, names) for names in TRAIT_COLUMNS]
+    for record in reader:
+        if not record:
+            continue
+        try:
+            yield _parse_row(record[type_index], [record[i] for i in trait_indexes])
+        except IndexError:
+            yield None
+
+
+def iter_jsonl_rows(lines):
+    """
+    Yield (mbti_type, scores) or None (invalid row) from JSONL objects with
+    a type field and either trait fields or a five-value "bigfive" list.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            mbti_type = next(record[name] for name in TYPE_COLUMNS if name in record)
+            if 'bigfive' in record:
+                values = record['bigfive']
+                if len(values) != len(TRAIT_COLUMNS):
+                    raise ValueError
+            else:
+                values = [next(record[name] for name in names if name in record) for names in TRAIT_COLUMNS]
+        except (ValueError, TypeError, AttributeError, StopIteration):
+            yield None
+            continue
+        yield _parse_row(mbti_type, values)
+
+
+def iter_rows(lines, fmt):
+    """Rows of a 'csv' or 'jsonl' stream."""
+    if fmt == 'csv':
+        return iter_csv_rows(lines)
+    if fmt == 'jsonl':
+        return iter_jsonl_rows(lines)
+    raise ValueError(f"Unknown input format: {fmt}")
+
+
+def detect_format(path):
+    """Input format from a file name: .jsonl/.ndjson/.json are JSONL, anything else CSV."""
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
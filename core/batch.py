@@ -0,0 +1,265 @@
+"""
+batch.py
+
+Newline-delimited JSON batch processing: one request per input line, one
+result per output line, all in a single interpreter.
+"""
+
+import hashlib
+import json
+import math
+import sys
+
+from core.cache import MISSING, code_fingerprint, content_hash
+from core.instrument import instrumented
+from core.functions import (
+    DISTRIBUTION_TEMPERATURE, describe_roles, distribution_row, infer_mbti_from_stack, infer_type_distribution,
+)
+from core.socionics import get_intertype_relation
+from core.bigfive import BigFiveNorms, BigFiveProfile, infer_mbti_from_bigfive
+from core.cbt import CBT_DISTORTIONS, analyze_cbt_thought
+from core.results import to_plain
+
+ROLES = ["ego", "subconscious", "unconscious", "superego"]
+
+
+def _int_arg(request, name, default, low, high):
+    """Integer argument between low and high; whole floats such as 3.0 are accepted."""
+    value = request.get(name, default)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        raise ValueError(f"{name} must be an integer from {low} to {high}")
+    return value
+
+
+def _positive_arg(request, name, default):
+    """Finite positive number argument."""
+    value = request.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value < math.inf:
+        raise ValueError(f"{name} must be a positive number")
+    return value
+
+
+def _analyze_type(request):
+    mbti_type = request['type'].upper()
+    result = {'type': mbti_type, 'roles': describe_roles(mbti_type, request.get('functions') or ROLES)}
+    compare_to = request.get('compare_to')
+    if compare_to:
+        result['relation'] = get_intertype_relation(mbti_type, compare_to.upper())
+    return result
+
+
+def _infer_mbti_from_stack(request):
+    return infer_mbti_from_stack([func.strip() for func in request['stack']]).to_dict()
+
+
+def _infer_type_distribution(request):
+    temperature = _positive_arg(request, 'temperature', DISTRIBUTION_TEMPERATURE)
+    if 'strengths' in request:
+        ranked = infer_type_distribution(strengths=request['strengths'], temperature=temperature)
+    else:
+        ranked = infer_type_distribution(stacks=request['stack'], temperature=temperature)
+    if isinstance(ranked, dict):
+        # Several rows: one list of 16 types per row
+        ranked = [distribution_row(ranked, row) for row in range(len(ranked['types']))]
+    return {'types': to_plain(ranked)}
+
+
+def _get_intertype_relation(request):
+    relation = get_intertype_relation(request['type'], request['compare_to'])
+    if relation is None:
+        raise ValueError(f"Unknown MBTI type pair: {request['type']}, {request['compare_to']}")
+    return {'relation': relation}
+
+
+def _bigfive_report(request):
+    scores = request['bigfive']
+    if len(scores) != 5:
+        raise ValueError("Big Five input must have exactly 5 values.")
+    stratum = {key: request.get(key) for key in ('age', 'sex', 'country')}
+    b5 = BigFiveProfile(*[float(v) for v in scores], mbti_type=request.get('type'), stratum=stratum)
+    b5.validate()
+    return {'report': b5.get_report()}
+
+
+def _infer_mbti_from_bigfive(request):
+    scores = request['bigfive']
+    if len(scores) != 5:
+        raise ValueError("Big Five input must have exactly 5 values.")
+    BigFiveProfile(*[float(v) for v in scores]).validate()
+    return {'types': to_plain(infer_mbti_from_bigfive(scores, top_k=_int_arg(request, 'top_k', 3, 1, 16)))}
+
+
+def _analyze_cbt_thought(request):
+    return analyze_cbt_thought(request['text']).to_dict()
+
+
+# Operation name -> handler(request dict) -> JSON-serializable result
+OPERATIONS = {
+    'analyze_type': _analyze_type,
+    'get_function_roles': _analyze_type,
+    'infer_mbti_from_stack': _infer_mbti_from_stack,
+    'get_intertype_relation': _get_intertype_relation,
+    'BigFiveProfile.get_report': _bigfive_report,
+    'bigfive': _bigfive_report,
+    'infer_mbti_from_bigfive': _infer_mbti_from_bigfive,
+    'infer_type_distribution': _infer_type_distribution,
+    'analyze_cbt_thought': _analyze_cbt_thought,
+}
+
+
+# Modules whose source determines batch results
+RESULT_MODULES = (
+    'core.typecode', 'core.functions', 'core.socionics', 'core.bigfive', 'core.percentiles',
+    'core.normstore', 'core.cbt', 'core.results', 'core.render', __name__,
+)
+
+# Hash of the code and lexicon, computed once
+_code_fingerprint = None
+# (norms path, norms digest, fingerprint) for the last norms snapshot seen
+_fingerprint = None
+
+_encode_key = json.JSONEncoder(ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode
+
+
+def result_fingerprint():
+    """
+    Version of everything a result depends on: the source of the modules
+    that compute it, the CBT lexicon and the loaded norms (path and
+    content digest). Part of every result cache key, so edits to any of
+    them invalidate cached results. The norms part follows
+    BigFiveNorms.reload(), so results computed from reloaded norms are
+    cached under new keys.
+    """
+    global _code_fingerprint, _fingerprint
+    if _code_fingerprint is None:
+        _code_fingerprint = content_hash(code_fingerprint(*RESULT_MODULES), CBT_DISTORTIONS)
+    norms = BigFiveNorms.snapshot()
+    fingerprint = _fingerprint
+    if fingerprint is None or fingerprint[:2] != (norms.path, norms.digest):
+        fingerprint = (norms.path, norms.digest, content_hash(_code_fingerprint, norms.path, norms.digest))
+        _fingerprint = fingerprint
+    return fingerprint[2]
+
+
+def normalize_request(op, request):
+    """
+    Copy of a request's arguments as the handlers and cache keys see them:
+    no id or op, type names stripped and upper-cased, and CBT text
+    lower-cased as the analysis does. Handlers only ever run on normalized
+    arguments, so requests with the same key give the same result.
+    """
+    args = {}
+    for name, value in request.items():
+        if name in ('id', 'op'):
+            continue
+        if name in ('type', 'compare_to') and isinstance(value, str):
+            value = value.strip().upper()
+        elif name == 'text' and op == 'analyze_cbt_thought' and isinstance(value, str):
+            value = value.lower()
+        args[name] = value
+    return args
+
+
+def cache_key(op, args):
+    """Result cache key for normalized arguments (see normalize_request) plus the result fingerprint."""
+    key = f"{result_fingerprint()}\0{op}\0{_encode_key(args)}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+@instrumented('process_request')
+def process_request(request, cache=None):
+    """
+    Run a single batch request and return its result record.
+
+    The request is a dict with an 'op' naming one of OPERATIONS plus the
+    operation's arguments. An optional 'id' is echoed back. Errors are
+    reported in the record instead of being raised, so one bad line never
+    aborts the batch. Handlers get the normalize_request arguments. With a
+    ResultCache, results are looked up by cache_key first; errors, and
+    results computed while the norms were reloaded, are never cached.
+    """
+    record = {}
+    if isinstance(request, dict) and 'id' in request:
+        record['id'] = request['id']
+    try:
+        if not isinstance(request, dict):
+            raise ValueError("Request must be a JSON object")
+        op = request.get('op')
+        handler = OPERATIONS.get(op)
+        if handler is None:
+            raise ValueError(f"Unknown operation: {op}")
+        record['op'] = op
+        args = normalize_request(op, request)
+        if cache is None:
+            record['result'] = handler(args)
+        else:
+            digest = BigFiveNorms.snapshot().digest
+            key = cache_key(op, args)
+            result = cache.get(key)
+            if result is MISSING:
+                result = handler(args)
+                # Not cached if the norms were reloaded meanwhile: the key
+                # may name the old norms and the result the new ones
+                if BigFiveNorms.snapshot().digest == digest:
+                    cache.put(key, result)
+            record['result'] = result
+    except KeyError as e:
+        record['error'] = f"Missing field: {e.args[0]}"
+    except (ValueError, TypeError, AttributeError) as e:
+        record['error'] = str(e)
+    except Exception as e:
+        # Anything else is still this request's error, not the batch's
+        record['error'] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def iter_results(lines, cache=None):
+    """Yield one result record per non-blank JSONL input line."""
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {'line': line_no, 'error': f"Invalid JSON: {e.msg}"}
+            continue
+        yield process_request(request, cache)
+
+
+def run_batch(infile, outfile, cache=None):
+    """
+    Stream JSONL requests from infile and write JSONL results to outfile.
+
+    Input is consumed line by line and output goes through the file's own
+    buffer, so memory use stays constant regardless of input size.
+
+    Returns:
+        tuple: (processed, failed) record counts
+    """
+    processed = failed = 0
+    write = outfile.write
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    for record in iter_results(infile, cache):
+        processed += 1
+        if 'error' in record:
+            failed += 1
+        write(dumps(record))
+        write('\n')
+    outfile.flush()
+    return processed, failed
+
+
+def open_batch_files(input_path, output_path, buffer_size=1 << 16):
+    """Open batch input/output, treating '-' as stdin/stdout."""
+    if input_path in (None, '-'):
+        infile = sys.stdin
+    else:
+        infile = open(input_path, 'r', encoding='utf-8', buffering=buffer_size)
+    if output_path in (None, '-'):
+        outfile = sys.stdout
+    else:
+        outfile = open(output_path, 'w', encoding='utf-8', buffering=buffer_size)
+    return infile, outfile
@@ -1,29 +1,294 @@
+import hashlib
 import json
 import os
+import sys
+import threading
+
+from core.compat import require_numpy
+from core.instrument import count, instrumented
+from core.percentiles import QuantileTable, display_percentile, normal_cdf_array, normal_percentile
+from core.results import BigFiveReport, TraitDeviation, TypeMatch
+from core.typecode import TYPE_CODES, TYPE_NAMES
+
+TRAITS = ('openness', 'conscientiousness', 'extraversion', 'agreeableness', 'neuroticism')
+
+NORMS_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'mbti_bigfive_norms.json')
+
+
+def _file_signature(path):
+    """(size, mtime) of a file, or None if it cannot be read."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _file_digest(path):
+    """SHA-256 of a file's contents, or None if it cannot be read."""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class NormsSnapshot:
+    """
+    One loaded version of the norms file: per-type means, the NormStore
+    for binary files, and the file's signature (size, mtime) and content
+    digest at load time.
+
+    Snapshots are never modified once published (the type matrix is
+    derived from the norms on first use), so a reader that holds one sees
+    consistent norms however often the file is reloaded meanwhile.
+    """
+
+    __slots__ = ('path', 'signature', 'digest', 'norms', 'store', '_type_matrix')
+
+    def __init__(self, path, signature, digest, norms, store=None, type_matrix=None):
+        self.path = path
+        self.signature = signature
+        self.digest = digest
+        self.norms = norms
+        self.store = store
+        self._type_matrix = type_matrix
+
+    def get_stratum(self, mbti_type=None, age=None, sex=None, country=None):
+        if self.store is None:
+            return None
+        return self.store.lookup(mbti_type, age, sex, country)
+
+    def quantile_tables(self, mbti_type=None, age=None, sex=None, country=None):
+        cell = self.get_stratum(mbti_type, age, sex, country)
+        if cell is None:
+            return {}
+        tables = {}
+        for i, trait in enumerate(self.store.traits):
+            table = QuantileTable.from_cell(cell, i, self.store.quantile_probs)
+            if table is not None:
+                tables[trait] = table
+        return tables
+
+    def get_type_norms(self, mbti_type, age=None, sex=None, country=None):
+        if self.store is not None and (age, sex, country) != (None, None, None):
+            cell = self.store.lookup(mbti_type, age, sex, country)
+            return cell.trait_means(self.store.traits) if cell is not None else None
+        return self.norms.get(mbti_type.upper(), None)
+
+    def type_norm_matrix(self):
+        if self._type_matrix is None:
+            np = require_numpy("BigFiveNorms.type_norm_matrix")
+            matrix = np.full((16, len(TRAITS)), np.nan)
+            for code, mbti in enumerate(TYPE_NAMES):
+                type_norms = self.get_type_norms(mbti) or {}
+                for i, trait in enumerate(TRAITS):
+                    norm = type_norms.get(trait)
+                    if norm is not None:
+                        matrix[code, i] = norm
+            matrix.setflags(write=False)
+            # Two threads may both build it; either result is the same
+            self._type_matrix = matrix
+        return self._type_matrix
+
 
 class BigFiveNorms:
-    _norms = None
+    """
+    Process-wide norms, held as an immutable NormsSnapshot.
+
+    Readers take the current snapshot without locking. Loading and
+    reloading run under a lock: the first load happens once even when
+    threads race for it, and reload() swaps in a new snapshot in a single
+    assignment. Code that reads the norms several times for one result
+    (BigFiveProfile.analyze, BigFiveBatch) takes snapshot() once, so it
+    finishes on the version it started with.
+    """
+
+    _snapshot = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def snapshot(cls, filepath=None):
+        """The current NormsSnapshot, loading filepath (default: default_path()) on first use."""
+        snapshot = cls._snapshot
+        if snapshot is None:
+            with cls._lock:
+                if cls._snapshot is None:
+                    cls._snapshot = cls._read_snapshot(filepath or cls.default_path())
+                snapshot = cls._snapshot
+        return snapshot
 
     @classmethod
     def load_norms(cls, filepath=None):
-        if cls._norms is None:
-            if filepath is None:
-                filepath = os.path.join(os.path.dirname(__file__), '..', 'data', 'mbti_bigfive_norms.json')
+        """
+        Per-type trait means, {mbti_type: {trait: mean}}.
+
+        The file defaults to EIDON_NORMS_FILE if set, otherwise
+        data/mbti_bigfive_norms.json. It may be JSON or a binary norms store
+        (see core.normstore), which also provides stratified norms. It is
+        read on first use; see reload() for picking up changes.
+        """
+        return cls.snapshot(filepath).norms
+
+    @classmethod
+    def reload(cls, filepath=None, force=False):
+        """
+        Re-read the norms file (or switch to filepath) if it changed: its
+        size or mtime differ from the loaded snapshot's and so does its
+        content digest. force re-reads it regardless.
+
+        A file that cannot be read or parsed leaves the current norms in
+        place (with a warning), so a half-written file is picked up on a
+        later call instead. Returns True if a new snapshot was swapped in.
+        """
+        with cls._lock:
+            current = cls._snapshot
+            path = filepath or (current.path if current is not None else cls.default_path())
+            if current is not None and path == current.path and not force:
+                signature = _file_signature(path)
+                if signature == current.signature:
+                    return False
+                if _file_digest(path) == current.digest:
+                    # Touched but unchanged: remember the new signature so
+                    # later checks compare against it
+                    cls._snapshot = NormsSnapshot(current.path, signature, current.digest, current.norms,
+                                                  current.store, current._type_matrix)
+                    return False
             try:
-                with open(filepath, 'r') as f:
-                    cls._norms = json.load(f)
-            except FileNotFoundError:
-                print(f"Warning: Normative data file not found at {filepath}. Using empty norms.")
-                cls._norms = {}
-            except json.JSONDecodeError:
-                print(f"Warning: Normative data file at {filepath} is invalid JSON. Using empty norms.")
-                cls._norms = {}
-        return cls._norms
-
-    @classmethod 
-    def get_type_norms(cls, mbti_type):
-        norms = cls.load_norms()
-        return norms.get(mbti_type.upper(), None)
+                snapshot = cls._read_snapshot(path, strict=current is not None)
+            except (OSError, ValueError) as e:
+                count('norms_reload.failed')
+                print(f"Warning: cannot reload norms from {path}: {e}. Keeping the loaded norms.", file=sys.stderr)
+                return False
+            cls._snapshot = snapshot
+            count('norms_reload.reloaded')
+            return True
+
+    @classmethod
+    @instrumented('BigFiveNorms.load_norms')
+    def _read_snapshot(cls, filepath, strict=False):
+        """
+        Snapshot of filepath. Unless strict, a missing or invalid file gives
+        empty norms with a warning; strict raises OSError or ValueError.
+        """
+        from core.normstore import NormStore, is_norm_store
+        signature = _file_signature(filepath)
+        if is_norm_store(filepath):
+            digest = _file_digest(filepath)
+            try:
+                store = NormStore(filepath)
+                return NormsSnapshot(filepath, signature, digest, store.type_means(), store)
+            except ValueError as e:
+                if strict:
+                    raise
+                count('norms_fallback.invalid_store')
+                print(f"Warning: {e}. Using empty norms.", file=sys.stderr)
+                return NormsSnapshot(filepath, signature, digest, {})
+        digest = None
+        try:
+            with open(filepath, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            return NormsSnapshot(filepath, signature, digest, json.loads(data))
+        except FileNotFoundError:
+            if strict:
+                raise
+            count('norms_fallback.not_found')
+            print(f"Warning: Normative data file not found at {filepath}. Using empty norms.", file=sys.stderr)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            if strict:
+                raise
+            count('norms_fallback.invalid_json')
+            print(f"Warning: Normative data file at {filepath} is invalid JSON. Using empty norms.", file=sys.stderr)
+        return NormsSnapshot(filepath, signature, digest, {})
+
+    @classmethod
+    def default_path(cls):
+        return os.environ.get('EIDON_NORMS_FILE') or NORMS_PATH
+
+    @classmethod
+    def path(cls):
+        """Path of the loaded norms file (or the one that would be loaded)."""
+        snapshot = cls._snapshot
+        return snapshot.path if snapshot is not None else cls.default_path()
+
+    @classmethod
+    def store(cls):
+        """The open NormStore when norms come from a binary file, else None."""
+        return cls.snapshot().store
+
+    @classmethod
+    def get_stratum(cls, mbti_type=None, age=None, sex=None, country=None):
+        """
+        NormCell (n, means, SDs, quantiles) for the most specific populated
+        stratum, or None. Requires a binary norms store; JSON norms have no
+        strata.
+        """
+        return cls.snapshot().get_stratum(mbti_type, age, sex, country)
+
+    @classmethod
+    def quantile_tables(cls, mbti_type=None, age=None, sex=None, country=None):
+        """
+        {trait: QuantileTable} from the empirical quantiles of a stratum
+        (mbti_type None for the whole population). Empty unless the binary
+        norms store has quantiles for it.
+        """
+        return cls.snapshot().quantile_tables(mbti_type, age, sex, country)
+
+    @classmethod
+    def get_type_norms(cls, mbti_type, age=None, sex=None, country=None):
+        """
+        {trait: mean} for a type, optionally narrowed to an age (years or
+        band label), sex and country. Strata without data fall back to
+        broader ones; with JSON norms the stratum keys are ignored.
+        """
+        return cls.snapshot().get_type_norms(mbti_type, age, sex, country)
+
+    @classmethod
+    def type_norm_matrix(cls):
+        """
+        Per-type norms as a (16, 5) float array indexed by type code and
+        TRAITS order; NaN where a type or trait has no norm. A row of all
+        NaN means the type has no norms at all.
+        """
+        return cls.snapshot().type_norm_matrix()
+
+
+# Seconds between checks of the norms file by a NormsWatcher
+DEFAULT_WATCH_INTERVAL = 2.0
+
+
+class NormsWatcher:
+    """
+    Daemon thread calling BigFiveNorms.reload() every interval seconds, so
+    a long-running process picks up an updated norms file. A check costs
+    one stat() unless the file changed.
+
+        watcher = NormsWatcher(interval=5).start()
+        ...
+        watcher.stop()
+    """
+
+    def __init__(self, interval=DEFAULT_WATCH_INTERVAL):
+        if interval <= 0:
+            raise ValueError("Watch interval must be positive")
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="eidon-norms-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            BigFiveNorms.reload()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
 
 
 class BigFiveProfile:
@@ -36,7 +301,8 @@ class BigFiveProfile:
         'neuroticism': {'mean': 50.0, 'sd': 10.0}
     }
 
-    def __init__(self, openness, conscientiousness, extraversion, agreeableness, neuroticism, mbti_type=None):
+    def __init__(self, openness, conscientiousness, extraversion, agreeableness, neuroticism, mbti_type=None,
+                 stratum=None):
         self.traits = {
             'openness': openness,
             'conscientiousness': conscientiousness,
@@ -45,36 +311,266 @@ class BigFiveProfile:
             'neuroticism': neuroticism
         }
         self.mbti_type = mbti_type.upper() if mbti_type else None
+        # Optional {'age', 'sex', 'country'} keys selecting stratified type norms
+        self.stratum = {key: value for key, value in (stratum or {}).items() if value is not None}
 
     def validate(self):
         for trait, value in self.traits.items():
             if not 0 <= value <= 100:
                 raise ValueError(f"Invalid {trait} value: {value}. Must be between 0 and 100.")
 
-    def get_report(self):
-        report = []
+    def analyze(self, norms=None):
+        """
+        BigFiveReport of each trait against the type norms for mbti_type
+        (and the stratum) when available, else the population norms.
+        norms is a NormsSnapshot (default: the current one).
+        """
+        if norms is None:
+            norms = BigFiveNorms.snapshot()
         if self.mbti_type:
-            type_norms = BigFiveNorms.get_type_norms(self.mbti_type)
+            type_norms = norms.get_type_norms(self.mbti_type, **self.stratum)
             if type_norms:
-                report.append(f"Using MBTI type-specific norms for {self.mbti_type}:")
+                tables = norms.quantile_tables(self.mbti_type, **self.stratum)
+                traits = []
                 for trait, value in self.traits.items():
                     norm = type_norms.get(trait)
-                    if norm is not None:
-                        deviation = value - norm
-                        report.append(f"{trait.title()}: {value:.1f} (Type norm: {norm}, Deviation: {deviation:+.1f})")
-                    else:
-                        report.append(f"{trait.title()}: {value:.1f} (No norm available)")
-                return report
-
-        # Fallback: Use population norms with percentiles
-        report.append("Using general population norms:")
+                    if norm is None:
+                        traits.append(TraitDeviation(trait, value, None, None, None))
+                        continue
+                    percentile = display_percentile(tables[trait].percentile(value)) if trait in tables else None
+                    traits.append(TraitDeviation(trait, value, norm, value - norm, percentile))
+                return BigFiveReport(self.mbti_type, 'type', traits)
+
+        # Fallback: Use population norms with percentiles, from the
+        # population quantile tables if the norms store has them
+        tables = norms.quantile_tables()
+        traits = []
         for trait, value in self.traits.items():
             norm = self.POPULATION_NORMS[trait]['mean']
             sd = self.POPULATION_NORMS[trait]['sd']
-            deviation = value - norm
-            z = deviation / sd if sd > 0 else 0
-            # Rough percentile approximation (normal distribution)
-            percentile = int(50 + (z * 34))
-            percentile = max(1, min(99, percentile))
-            report.append(f"{trait.title()}: {value:.1f} (Norm: {norm}, Deviation: {deviation:+.1f}, Approx. percentile: {percentile}%)")
-        return report
+            if trait in tables:
+                percentile = tables[trait].percentile(value)
+            else:
+                percentile = normal_percentile(value, norm, sd)
+            traits.append(TraitDeviation(trait, value, norm, value - norm, display_percentile(percentile)))
+        return BigFiveReport(self.mbti_type, 'population', traits)
+
+    def get_report(self, norms=None):
+        """Report lines of analyze(norms), as the CLI prints them."""
+        from core.render import text_lines
+        return text_lines(self.analyze(norms))
+
+
+class BigFiveBatch:
+    """
+    Vectorized Big Five scoring for many profiles at once.
+
+    scores is an (N, 5) array in TRAITS order. mbti_types is an optional
+    column of MBTI strings or type codes (see core.typecode); rows whose type
+    is missing, unknown or has no norms fall back to population norms, as
+    in BigFiveProfile.get_report. Results are arrays; strings are only
+    built by report().
+    """
+
+    def __init__(self, scores, mbti_types=None):
+        np = require_numpy("BigFiveBatch")
+        self.scores = np.asarray(scores, dtype=np.float64)
+        if self.scores.ndim != 2 or self.scores.shape[1] != len(TRAITS):
+            raise ValueError(f"Scores must have shape (N, 5), got {self.scores.shape}")
+        self.type_codes = self._parse_types(mbti_types, len(self.scores))
+        # Every result of the batch uses the norms current at creation
+        self.norms_snapshot = BigFiveNorms.snapshot()
+        self._norms = None
+
+    @staticmethod
+    def _parse_types(mbti_types, n):
+        """Type code per row as an int8 array, -1 where no type is known."""
+        np = require_numpy("BigFiveBatch")
+        if mbti_types is None:
+            return np.full(n, -1, dtype=np.int8)
+        types = np.asarray(mbti_types)
+        if types.shape != (n,):
+            raise ValueError(f"MBTI type column must have shape ({n},), got {types.shape}")
+        if types.dtype.kind in 'iu':
+            codes = types.astype(np.int8)
+            codes[(types < 0) | (types > 15)] = -1
+            return codes
+        # Map each distinct label once instead of once per row
+        labels, inverse = np.unique(types.astype(str), return_inverse=True)
+        label_codes = np.array([TYPE_CODES.get(label.upper(), -1) for label in labels], dtype=np.int8)
+        return label_codes[inverse.ravel()]
+
+    def validate(self):
+        # NaN fails both comparisons, so it is rejected as well
+        bad = ~((self.scores >= 0) & (self.scores <= 100))
+        if bad.any():
+            row, col = (int(i) for i in require_numpy("BigFiveBatch").argwhere(bad)[0])
+            raise ValueError(
+                f"Invalid {TRAITS[col]} value: {self.scores[row, col]} in row {row}. Must be between 0 and 100."
+            )
+
+    def uses_type_norms(self):
+        """Boolean array: rows scored against MBTI type-specific norms."""
+        np = require_numpy("BigFiveBatch")
+        matrix = self.norms_snapshot.type_norm_matrix()
+        has_norms = ~np.isnan(matrix).all(axis=1)
+        codes = self.type_codes
+        return (codes >= 0) & has_norms[np.maximum(codes, 0)]
+
+    def norms(self):
+        """(N, 5) reference mean per row and trait; NaN where a type norm is missing."""
+        if self._norms is None:
+            np = require_numpy("BigFiveBatch")
+            population = np.array([BigFiveProfile.POPULATION_NORMS[t]['mean'] for t in TRAITS])
+            norms = np.broadcast_to(population, self.scores.shape).copy()
+            typed = self.uses_type_norms()
+            norms[typed] = self.norms_snapshot.type_norm_matrix()[self.type_codes[typed]]
+            self._norms = norms
+        return self._norms
+
+    def deviations(self):
+        return self.scores - self.norms()
+
+    def z_scores(self, deviations=None):
+        """Deviations scaled by the population SD (type norms carry no SD)."""
+        np = require_numpy("BigFiveBatch")
+        if deviations is None:
+            deviations = self.deviations()
+        sd = np.array([BigFiveProfile.POPULATION_NORMS[t]['sd'] for t in TRAITS])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(sd > 0, deviations / sd, 0.0)
+
+    def percentiles(self, exact=False, z=None):
+        """
+        Percentile per row and trait: from the empirical quantile tables of
+        the row's norms (type or population) where the norms store has them,
+        else, for population norms, the normal CDF of the z-score. As in
+        BigFiveProfile.analyze, a row scored against type norms has no
+        percentile (NaN) for a trait without a type quantile table, since
+        type norms carry no SD. Rows are grouped by type so each table is
+        applied to a whole column slice at once.
+
+        Returns 0-100 floats if exact, else whole numbers clamped to 1-99 as
+        shown in reports.
+        """
+        np = require_numpy("BigFiveBatch")
+        if z is None:
+            z = self.z_scores()
+        percentiles = 100.0 * normal_cdf_array(z)
+        typed = self.uses_type_norms()
+        percentiles[typed] = np.nan
+        if self.norms_snapshot.store is not None:
+            groups = [(None, ~typed)]
+            for code in np.unique(self.type_codes[typed]).tolist():
+                groups.append((TYPE_NAMES[code], typed & (self.type_codes == code)))
+            for mbti_type, rows in groups:
+                tables = self.norms_snapshot.quantile_tables(mbti_type)
+                for i, trait in enumerate(TRAITS):
+                    if trait in tables and rows.any():
+                        percentiles[rows, i] = tables[trait].percentiles(self.scores[rows, i])
+        if exact:
+            return percentiles
+        return np.clip(np.rint(percentiles), 1, 99)
+
+    def results(self):
+        """
+        Structured array with one record per row:
+        type_norms (bool), norm, deviation, z (5 x float64), percentile
+        (5 x int8, 0 where there is none).
+        """
+        np = require_numpy("BigFiveBatch")
+        n_traits = len(TRAITS)
+        dtype = np.dtype([
+            ('type_norms', np.bool_),
+            ('norm', np.float64, (n_traits,)),
+            ('deviation', np.float64, (n_traits,)),
+            ('z', np.float64, (n_traits,)),
+            ('percentile', np.int8, (n_traits,)),
+        ])
+        out = np.empty(len(self.scores), dtype=dtype)
+        out['type_norms'] = self.uses_type_norms()
+        out['norm'] = self.norms()
+        deviations = self.deviations()
+        out['deviation'] = deviations
+        z = self.z_scores(deviations)
+        out['z'] = z
+        out['percentile'] = np.nan_to_num(self.percentiles(z=z), nan=0)
+        return out
+
+    def report(self, index):
+        """
+        Formatted report lines for one row, identical to
+        BigFiveProfile.get_report on the batch's norms snapshot.
+        """
+        code = int(self.type_codes[index])
+        profile = BigFiveProfile(*self.scores[index].tolist(), mbti_type=TYPE_NAMES[code] if code >= 0 else None)
+        return profile.get_report(self.norms_snapshot)
+
+
+def infer_mbti_from_bigfive(scores, top_k=3, temperature=10.0, chunk_size=65536):
+    """
+    Rank MBTI types by Euclidean distance between Big Five scores and the
+    per-type centroids in the normative data.
+
+    Confidences are a softmax of -distance / temperature over all types with
+    complete norms. Each chunk of rows is scored with a single (rows, 16)
+    distance computation.
+
+    Args:
+        scores: five values (one profile) or an (N, 5) array in TRAITS order.
+        top_k (int): number of ranked types to return per row.
+
+    Returns:
+        For one profile, a list of TypeMatch results, best first. For an
+        (N, 5) array, a dict of (N, k) arrays: 'types' (type codes),
+        'distances' and 'confidences' (0-100).
+    """
+    np = require_numpy("infer_mbti_from_bigfive")
+    x = np.asarray(scores, dtype=np.float64)
+    single = x.ndim == 1
+    x = np.atleast_2d(x)
+    if x.ndim != 2 or x.shape[1] != len(TRAITS):
+        raise ValueError(f"Scores must have 5 values per row, got shape {np.shape(scores)}")
+    if temperature <= 0:
+        raise ValueError("Temperature must be positive")
+
+    matrix = BigFiveNorms.type_norm_matrix()
+    candidates = np.flatnonzero(~np.isnan(matrix).any(axis=1))
+    if candidates.size == 0:
+        raise ValueError("No MBTI type norms available")
+    centroids = matrix[candidates]
+    centroid_sq = (centroids ** 2).sum(axis=1)
+    k = max(1, min(int(top_k), candidates.size))
+
+    n = len(x)
+    types = np.empty((n, k), dtype=np.int8)
+    distances = np.empty((n, k))
+    confidences = np.empty((n, k))
+    for start in range(0, n, chunk_size):
+        chunk = x[start:start + chunk_size]
+        sq = (chunk ** 2).sum(axis=1)[:, None] - 2.0 * chunk @ centroids.T + centroid_sq
+        dist = np.sqrt(np.maximum(sq, 0.0))
+
+        logits = -dist / temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        weights = np.exp(logits)
+        probs = weights / weights.sum(axis=1, keepdims=True)
+
+        if k < candidates.size:
+            top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(k), dist.shape).copy()
+        order = np.take_along_axis(dist, top, axis=1).argsort(axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+
+        rows = slice(start, start + len(chunk))
+        types[rows] = candidates[top]
+        distances[rows] = np.take_along_axis(dist, top, axis=1)
+        confidences[rows] = np.take_along_axis(probs, top, axis=1) * 100
+
+    if single:
+        return [
+            TypeMatch(TYPE_NAMES[types[0, i]], round(float(distances[0, i]), 2), round(float(confidences[0, i]), 1))
+            for i in range(k)
+        ]
+    return {'types': types, 'distances': distances, 'confidences': confidences}
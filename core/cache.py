@@ -0,0 +1,259 @@
+"""
+cache.py
+
+On-disk cache location and helpers shared by the compiled caches, and the
+two-tier (memory LRU + SQLite) result cache.
+
+The cache directory is EIDON_CACHE_DIR if set, otherwise
+$XDG_CACHE_HOME/eidon or ~/.cache/eidon. Setting EIDON_CACHE_DIR to an
+empty string disables on-disk caching.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+
+def cache_dir():
+    """Cache directory path, or None when on-disk caching is disabled."""
+    path = os.environ.get("EIDON_CACHE_DIR")
+    if path is not None:
+        return path or None
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "eidon")
+
+
+def content_hash(*parts):
+    """Hex SHA-256 over JSON-serializable parts, stable across runs."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def read_cache_file(name):
+    """Bytes of a cache file, or None if caching is disabled or it is missing."""
+    directory = cache_dir()
+    if directory is None:
+        return None
+    try:
+        with open(os.path.join(directory, name), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_cache_file(name, data):
+    """
+    Atomically write a cache file so concurrent readers never see a partial
+    file. Failures are ignored: the cache is only an optimization.
+    """
+    directory = cache_dir()
+    if directory is None:
+        return False
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(directory, name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        return False
+    return True
+
+
+def file_fingerprint(path):
+    """(size, mtime) identity of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def code_fingerprint(*module_names):
+    """Hash of the source files of the named modules."""
+    import importlib
+    digest = hashlib.sha256()
+    for name in module_names:
+        path = getattr(importlib.import_module(name), '__file__', None)
+        if path:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Sentinel for a cache miss (None is a valid cached result)
+MISSING = object()
+
+DEFAULT_MEMORY_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Pending disk writes are committed in one transaction every this many
+_FLUSH_EVERY = 512
+
+
+class ResultCache:
+    """
+    Two-tier cache of JSON-serializable results: an in-memory LRU in front
+    of a SQLite database that persists across runs.
+
+    Keys are content hashes; callers include a version fingerprint in
+    what they hash, so results computed by other code or data never match.
+    The SQLite tier is bounded by max_bytes of stored values; when over,
+    the least recently used entries are evicted down to 90%. Writes (and
+    recency updates for disk hits) are batched into one transaction per
+    _FLUSH_EVERY operations and on flush()/close().
+
+    Values are returned as stored, so callers must not mutate them.
+    """
+
+    def __init__(self, path=None, memory_entries=DEFAULT_MEMORY_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        import sqlite3
+        from collections import OrderedDict
+
+        if path is None:
+            directory = cache_dir()
+            if directory is None:
+                raise ValueError("On-disk caching is disabled (EIDON_CACHE_DIR is empty); pass a cache path")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, 'results.sqlite')
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._memory = OrderedDict()
+        self._pending = {}
+        self._touched = set()
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        self._db.commit()
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def _remember(self, key, value):
+        memory = self._memory
+        memory[key] = value
+        memory.move_to_end(key)
+        if len(memory) > self.memory_entries:
+            memory.popitem(last=False)
+
+    def get(self, key):
+        """Cached value for key, or MISSING."""
+        memory = self._memory
+        if key in memory:
+            memory.move_to_end(key)
+            self.hits_memory += 1
+            return memory[key]
+        encoded = self._pending.get(key)
+        if encoded is None:
+            row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return MISSING
+            encoded = row[0]
+            self._touch(key)
+        self.hits_disk += 1
+        value = json.loads(encoded)
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        self._remember(key, value)
+        self._pending[key] = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        if len(self._pending) + len(self._touched) >= _FLUSH_EVERY:
+            self.flush()
+
+    def _touch(self, key):
+        self._touched.add(key)
+        if len(self._pending) + len(self._touched) >= _FLUSH_EVERY:
+            self.flush()
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def flush(self):
+        """Write pending entries and recency updates, then evict if over max_bytes."""
+        if not self._pending and not self._touched:
+            return
+        now = time.time_ns()
+        db = self._db
+        with db:
+            if self._pending:
+                rows = [(key, encoded, len(encoded), now) for key, encoded in self._pending.items()]
+                db.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", rows)
+                self._disk_bytes += sum(row[2] for row in rows)
+            if self._touched:
+                db.executemany("UPDATE results SET accessed = ? WHERE key = ?",
+                               [(now, key) for key in self._touched])
+            if self._disk_bytes > self.max_bytes:
+                # The running total over-counts replaced rows and other
+                # processes' writes are not in it; recount before evicting
+                self._disk_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+                if self._disk_bytes > self.max_bytes:
+                    self._evict(db)
+        self._pending.clear()
+        self._touched.clear()
+
+    def _evict(self, db):
+        target = self.max_bytes * 0.9
+        doomed = []
+        freed = 0
+        for key, size in db.execute("SELECT key, size FROM results ORDER BY accessed"):
+            if self._disk_bytes - freed <= target:
+                break
+            doomed.append((key,))
+            freed += size
+        db.executemany("DELETE FROM results WHERE key = ?", doomed)
+        self._disk_bytes -= freed
+        self.evictions += len(doomed)
+
+    def clear(self):
+        self._memory.clear()
+        self._pending.clear()
+        self._touched.clear()
+        with self._db:
+            self._db.execute("DELETE FROM results")
+        self._disk_bytes = 0
+
+    def stats(self):
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            'hits': self.hits_memory + self.hits_disk,
+            'hits_memory': self.hits_memory,
+            'hits_disk': self.hits_disk,
+            'misses': self.misses,
+            'hit_rate': round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'memory_entries': len(self._memory),
+            'disk_bytes': self._disk_bytes,
+        }
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,68 +1,330 @@
+import glob
+import heapq
+import json
+import os
 import re
+import sys
+from collections import deque
+from itertools import islice
 
-CBT_DISTORTIONS = {
-    "all-or-nothing": {
-        "name": "All-or-Nothing Thinking",
-        "description": "Seeing things in black-or-white terms, without middle ground.",
-        "keywords": [r"\balways\b", r"\bnever\b", r"\bcompletely\b", r"\btotally\b", r"\bperfect\b"],
-        "reframe": "Try to see the gray areas and exceptions instead of absolutes."
-    },
-    "catastrophizing": {
-        "name": "Catastrophizing",
-        "description": "Expecting the worst possible outcome in every situation.",
-        "keywords": [r"\bdisaster\b", r"\bruined\b", r"\bworst\b", r"\bterrible\b", r"\bawful\b"],
-        "reframe": "Consider more likely and less extreme outcomes."
-    },
-    "overgeneralization": {
-        "name": "Overgeneralization",
-        "description": "Making broad conclusions based on a single event.",
-        "keywords": [r"\balways\b", r"\bnever\b", r"\bevery\b", r"\bnobody\b", r"\beveryone\b"],
-        "reframe": "Focus on specific instances rather than generalizing."
-    },
-    "mental_filter": {
-        "name": "Mental Filter",
-        "description": "Focusing only on the negative details and ignoring positives.",
-        "keywords": [r"\bonly\b", r"\bjust\b", r"\bnothing\b"],
-        "reframe": "Try to notice positive aspects as well."
-    },
-    "disqualifying_positive": {
-        "name": "Disqualifying the Positive",
-        "description": "Rejecting positive experiences by insisting they don’t count.",
-        "keywords": [r"\bdoesn't matter\b", r"\bnot good enough\b"],
-        "reframe": "Accept positive experiences and acknowledge your successes."
-    },
-    "jumping_to_conclusions": {
-        "name": "Jumping to Conclusions",
-        "description": "Making negative interpretations without evidence.",
-        "keywords": [r"\bmust\b", r"\bshould\b", r"\bcan't\b", r"\bwon't\b"],
-        "reframe": "Look for evidence before concluding."
-    },
-    "emotional_reasoning": {
-        "name": "Emotional Reasoning",
-        "description": "Assuming feelings reflect reality.",
-        "keywords": [r"\bfeel\b", r"\bfeelings\b", r"\bseems\b"],
-        "reframe": "Remember that feelings are not facts."
-    },
-    "should_statements": {
-        "name": "Should Statements",
-        "description": "Having rigid rules about how you or others should behave.",
-        "keywords": [r"\bshould\b", r"\bought to\b", r"\bmust\b"],
-        "reframe": "Be flexible and realistic with expectations."
-    },
-    "labeling": {
-        "name": "Labeling",
-        "description": "Assigning global negative labels to yourself or others.",
-        "keywords": [r"\bfailure\b", r"\bstupid\b", r"\bidiot\b", r"\bloser\b"],
-        "reframe": "Focus on specific behaviors rather than labels."
-    },
-    "personalization": {
-        "name": "Personalization",
-        "description": "Blaming yourself for things outside your control.",
-        "keywords": [r"\bmy fault\b", r"\bI caused\b", r"\bI am to blame\b"],
-        "reframe": "Recognize what you can and cannot control."
-    }
-}
+from core.cache import content_hash, read_cache_file, write_cache_file
+from core.instrument import instrumented
+from core.results import CBTAnalysis, DistortionHit
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+DEFAULT_LEXICON = os.path.join(DATA_DIR, 'cbt_distortions.json')
+# Extra lexicon files (e.g. other languages) merged after the default one
+LEXICON_DIR = os.path.join(DATA_DIR, 'cbt_lexicons')
+
+LEXICON_EXTENSIONS = ('.json', '.yaml', '.yml')
+DISTORTION_FIELDS = ('name', 'description', 'reframe')
+
+
+def lexicon_paths():
+    """
+    Lexicon files to load: EIDON_CBT_LEXICONS (os.pathsep-separated) if set,
+    otherwise data/cbt_distortions.json followed by data/cbt_lexicons/*.
+    """
+    env = os.environ.get('EIDON_CBT_LEXICONS')
+    if env:
+        return [path for path in env.split(os.pathsep) if path]
+    paths = [DEFAULT_LEXICON]
+    for ext in LEXICON_EXTENSIONS:
+        paths.extend(glob.glob(os.path.join(LEXICON_DIR, '*' + ext)))
+    return paths[:1] + sorted(paths[1:])
+
+
+def _keyword_pattern(keyword):
+    """
+    Regex for a lexicon keyword. Plain phrases match as whole words,
+    case-insensitively; entries already written as r"\b...\b" regexes are
+    used as they are.
+    """
+    if keyword.startswith(r"\b"):
+        return keyword
+    if _REGEX_META.intersection(keyword):
+        return r"\b" + re.escape(keyword.lower()) + r"\b"
+    return r"\b" + keyword.lower() + r"\b"
+
+
+def load_lexicon_file(path):
+    """Parse one JSON or YAML lexicon file: {key: {name, description, reframe, keywords}}."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError(f"Loading {path} requires PyYAML (pip install pyyaml)") from None
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"Invalid lexicon {path}: expected a mapping of distortions")
+    return data
+
+
+def load_lexicons(paths=None):
+    """
+    Load and merge lexicon files into the CBT_DISTORTIONS format.
+
+    A later file may add keywords to a distortion defined earlier (e.g. a
+    second language) or override its text fields. Every distortion must end
+    up with a name, description and reframe.
+    """
+    distortions = {}
+    for path in lexicon_paths() if paths is None else paths:
+        try:
+            data = load_lexicon_file(path)
+        except FileNotFoundError:
+            print(f"Warning: CBT lexicon file not found at {path}. Skipping.", file=sys.stderr)
+            continue
+        except (json.JSONDecodeError, ValueError) as e:
+            print(f"Warning: CBT lexicon file at {path} is invalid ({e}). Skipping.", file=sys.stderr)
+            continue
+        for key, entry in data.items():
+            distortion = distortions.setdefault(key, {'keywords': []})
+            for field in DISTORTION_FIELDS:
+                if field in entry:
+                    distortion[field] = entry[field]
+            for keyword in entry.get('keywords', []):
+                pattern = _keyword_pattern(keyword)
+                if pattern not in distortion['keywords']:
+                    distortion['keywords'].append(pattern)
+
+    for key, distortion in distortions.items():
+        missing = [field for field in DISTORTION_FIELDS if field not in distortion]
+        if missing:
+            raise ValueError(f"Distortion '{key}' is missing {', '.join(missing)}")
+        # Keep the field order of the original in-code table
+        distortions[key] = {
+            'name': distortion['name'],
+            'description': distortion['description'],
+            'keywords': distortion['keywords'],
+            'reframe': distortion['reframe'],
+        }
+    return distortions
+
+
+# Regex metacharacters; a keyword containing none of them between its \b
+# anchors is matched literally by the combined trie pattern
+_REGEX_META = set(".^$*+?{}[]\\|()")
+
+_WORD_CHAR = re.compile(r"\w")
+# A character just after a word boundary
+_BOUNDARY_CHAR = re.compile(r"\b(.)", re.DOTALL)
+
+
+def _literal_keyword(pattern):
+    """Return the literal text of a r"\bliteral\b" pattern, or None."""
+    if len(pattern) > 4 and pattern.startswith(r"\b") and pattern.endswith(r"\b"):
+        literal = pattern[2:-2]
+        if not _REGEX_META.intersection(literal):
+            return literal
+    return None
+
+
+def _trie_pattern(node):
+    """Regex for a character trie, trying longer continuations first."""
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    if '' in node:
+        return "(?:" + "|".join(branches) + ")?"
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+class DistortionMatcher:
+    """
+    All distortion keywords compiled into a single matcher.
+
+    Literal keywords (r"\bword\b" patterns) are merged into one trie-shaped
+    alternation wrapped in a lookahead, so the text is scanned once and
+    overlapping keywords are all reported. At each word start the trie
+    yields the longest keyword; shorter keywords that are word-bounded
+    prefixes of it are implied by that hit and added without rescanning.
+    Keywords shared by several distortions map to all of them. Any
+    non-literal pattern is kept as its own regex.
+
+    The alternation is kept as one branch per first character and compiled
+    on first use. A text of up to SHORT_TEXT characters is matched with
+    the branches for the characters it contains, each compiled once, so a
+    short analysis compiles only a part of a large lexicon; longer texts
+    compile the whole alternation once and scan the text once.
+    """
+
+    SHORT_TEXT = 512
+
+    def __init__(self, distortions):
+        # keyword -> distortion keys, in distortion order
+        self.keyword_keys = {}
+        patterns = {}
+        for key, distortion in distortions.items():
+            for pattern in distortion['keywords']:
+                literal = _literal_keyword(pattern)
+                if literal is None:
+                    patterns.setdefault(pattern, []).append(key)
+                else:
+                    keys = self.keyword_keys.setdefault(literal, [])
+                    if key not in keys:
+                        keys.append(key)
+
+        self.keyword_keys = {literal: tuple(keys) for literal, keys in self.keyword_keys.items()}
+
+        trie = {}
+        for literal in self.keyword_keys:
+            node = trie
+            for ch in literal:
+                node = node.setdefault(ch, {})
+            node[''] = {}
+
+        # Keywords that match wherever a longer keyword matches: proper
+        # prefixes followed by a word boundary inside the longer keyword
+        self.implied = {}
+        for literal in self.keyword_keys:
+            implied = []
+            for i in range(1, len(literal)):
+                prefix = literal[:i]
+                if prefix in self.keyword_keys and (
+                    bool(_WORD_CHAR.match(literal[i - 1])) != bool(_WORD_CHAR.match(literal[i]))
+                ):
+                    implied.append(prefix)
+            self.implied[literal] = tuple(implied)
+
+        # First character -> trie pattern of the keywords starting with it
+        self.branches = {ch: _trie_pattern({ch: child}) for ch, child in sorted(trie.items())}
+        self.extra_patterns = [(re.compile(pattern), tuple(keys)) for pattern, keys in patterns.items()]
+        self._init_regexes()
+
+    def _init_regexes(self):
+        self._regex = None
+        self._branch_regexes = {}
+
+    @property
+    def regex(self):
+        """The whole keyword alternation, compiled on first use (None without literal keywords)."""
+        if self._regex is None and self.branches:
+            self._regex = re.compile(r"\b(?=(" + "|".join(self.branches.values()) + r")\b)")
+        return self._regex
+
+    def _branch_regex(self, ch):
+        regex = self._branch_regexes.get(ch)
+        if regex is None:
+            regex = self._branch_regexes[ch] = re.compile(r"\b(?=(" + self.branches[ch] + r")\b)")
+        return regex
+
+    def to_state(self):
+        """
+        JSON-serializable snapshot for the on-disk cache. Branches and
+        extra regexes are kept as pattern source; from_state skips building
+        the trie and the implied-prefix table, and branches are compiled on
+        first use as usual.
+        """
+        return {
+            'keyword_keys': self.keyword_keys,
+            'implied': self.implied,
+            'branches': self.branches,
+            'extra_patterns': [(regex.pattern, keys) for regex, keys in self.extra_patterns],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        matcher = cls.__new__(cls)
+        matcher.keyword_keys = {literal: tuple(keys) for literal, keys in state['keyword_keys'].items()}
+        matcher.implied = {literal: tuple(prefixes) for literal, prefixes in state['implied'].items()}
+        matcher.branches = dict(state['branches'])
+        if not all(isinstance(ch, str) and isinstance(branch, str) for ch, branch in matcher.branches.items()):
+            raise TypeError("Matcher branches must be pattern strings")
+        matcher.extra_patterns = [(re.compile(pattern), tuple(keys)) for pattern, keys in state['extra_patterns']]
+        matcher._init_regexes()
+        return matcher
+
+    @property
+    def max_keyword_length(self):
+        """Length of the longest literal keyword."""
+        return max(map(len, self.keyword_keys), default=0)
+
+    def finditer(self, text, pos=0, endpos=None):
+        """
+        Yield (start, end, keyword, distortion_keys) for every keyword hit in
+        text[pos:endpos]. Word boundaries at pos still see the character
+        before it. Matching is case-sensitive; callers lowercase text first.
+        """
+        if endpos is None:
+            endpos = len(text)
+        if self.branches:
+            keyword_keys = self.keyword_keys
+            implied = self.implied
+            if self._regex is None and endpos - pos <= self.SHORT_TEXT:
+                # Only characters at word boundaries can start a hit. Hits of
+                # different branches start at different characters, so
+                # merging them by start gives the whole regex's order
+                branches = self.branches
+                matches = heapq.merge(
+                    *(self._branch_regex(ch).finditer(text, pos, endpos)
+                      for ch in sorted(set(_BOUNDARY_CHAR.findall(text, pos, endpos))) if ch in branches),
+                    key=lambda match: match.start(),
+                )
+            else:
+                matches = self.regex.finditer(text, pos, endpos)
+            for match in matches:
+                start = match.start(1)
+                keyword = match.group(1)
+                for prefix in implied[keyword]:
+                    yield start, start + len(prefix), prefix, keyword_keys[prefix]
+                yield start, match.end(1), keyword, keyword_keys[keyword]
+        for regex, keys in self.extra_patterns:
+            for match in regex.finditer(text, pos, endpos):
+                yield match.start(), match.end(), match.group(), keys
+
+
+# Bump when the DistortionMatcher state layout changes
+MATCHER_CACHE_VERSION = 3
+
+
+def _matcher_cache_name(distortions):
+    key = content_hash(MATCHER_CACHE_VERSION, distortions)
+    return f"cbt-matcher-{key[:32]}.json"
+
+
+def load_matcher(distortions):
+    """
+    DistortionMatcher for a lexicon, reusing the on-disk compiled cache.
+
+    The cache file is named by a content hash of the lexicon, so an edited
+    lexicon never loads a stale matcher; it is simply compiled again and
+    cached under its new hash. The file holds only plain data and pattern
+    source. Loading it skips the trie and implied-prefix tables; keyword
+    branches are compiled on first use, as for a freshly built matcher.
+    """
+    name = _matcher_cache_name(distortions)
+    data = read_cache_file(name)
+    if data is not None:
+        try:
+            return DistortionMatcher.from_state(json.loads(data))
+        except (ValueError, TypeError, KeyError, AttributeError, re.error):
+            pass  # Corrupt or incompatible cache file: rebuild below
+    matcher = DistortionMatcher(distortions)
+    write_cache_file(name, json.dumps(matcher.to_state(), ensure_ascii=False).encode('utf-8'))
+    return matcher
 
+
+_default_matcher = None
+
+
+def get_default_matcher():
+    """Matcher for CBT_DISTORTIONS, compiled (or loaded from cache) on first use."""
+    global _default_matcher
+    if _default_matcher is None:
+        _default_matcher = load_matcher(CBT_DISTORTIONS)
+    return _default_matcher
+
+
+CBT_DISTORTIONS = load_lexicons()
+
+
+@instrumented('analyze_cbt_thought')
 def analyze_cbt_thought(text):
     """
     Analyze the input thought text for cognitive distortions.
@@ -71,32 +333,231 @@ def analyze_cbt_thought(text):
         text (str): The user's free-text thought.
 
     Returns:
+        CBTAnalysis: distortions holds a DistortionHit (name, description,
+        reframe, and spans: (start, end) keyword matches in text) per
+        detected distortion, in lexicon order.
+    """
+    # Lowercase text for case-insensitive matching, keeping offsets valid
+    text_lower = _lower_same_length(text)
+
+    spans = {}
+    for start, end, _, keys in get_default_matcher().finditer(text_lower):
+        for key in keys:
+            spans.setdefault(key, []).append((start, end))
+
+    detected = []
+    for key, distortion in CBT_DISTORTIONS.items():
+        if key in spans:
+            detected.append(DistortionHit(
+                distortion['name'], distortion['description'], distortion['reframe'], sorted(spans[key])
+            ))
+
+    return CBTAnalysis(detected)
+
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+# End of a sentence: terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace, or a blank line
+_SENTENCE_END = re.compile(r"[.!?]+[\"'\u2019\u201d)\]]*(?=\s)|\n[^\S\n]*\n")
+_LAST_SPACE = re.compile(r"\s(?=\S*\Z)")
+
+
+def _lower_same_length(text):
+    """Lowercase text without changing its length, so offsets stay valid."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(ch if len(ch.lower()) != 1 else ch.lower() for ch in text)
+
+
+def iter_cbt_sentences(stream, chunk_size=DEFAULT_CHUNK_SIZE, max_sentence=None, include_empty=False):
+    """
+    Stream a text file through the distortion matcher sentence by sentence.
+
+    The input is read chunk_size characters at a time; only the unfinished
+    tail of the last sentence is carried into the next chunk, so keywords
+    that straddle a chunk boundary are matched and memory stays bounded by
+    chunk_size + max_sentence regardless of input size. A run of more than
+    max_sentence characters (default: chunk_size) without a sentence end is
+    split at whitespace, with matching looking past the split far enough
+    for the longest keyword. Each chunk's completed sentences are matched
+    in one pass and the hits assigned to sentences by offset.
+
+    Args:
+        stream: Text file object (anything with read(size)).
+        chunk_size (int): Characters per read.
+        max_sentence (int): Longest span held before a forced split.
+        include_empty (bool): Also yield sentences with no distortions.
+
+    Yields:
         dict: {
-            'distortions': [
-                {
-                    'name': str,
-                    'description': str,
-                    'reframe': str
-                },
-                ...
-            ]
+            'start': int,   # character offsets in the stream
+            'end': int,
+            'text': str,
+            'counts': {distortion_key: keyword hits, ...}
         }
     """
-    detected = []
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    matcher = get_default_matcher()
+    max_sentence = max(max_sentence or chunk_size, 1)
+    margin = matcher.max_keyword_length
+    order = {key: i for i, key in enumerate(CBT_DISTORTIONS)}
 
-    # Lowercase text for case-insensitive matching
-    text_lower = text.lower()
+    buffer = ''
+    base = 0  # stream offset of buffer[0]
+    # One character of context is kept before the unfinished sentence so
+    # word boundaries at its start are judged correctly
+    context = 0
+    eof = False
+    while not eof:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+        pos = context
 
-    for key, distortion in CBT_DISTORTIONS.items():
-        # Check if any keyword matches the text (using regex word boundaries)
-        for pattern in distortion['keywords']:
-            if re.search(pattern, text_lower):
-                detected.append({
-                    "name": distortion['name'],
-                    "description": distortion['description'],
-                    "reframe": distortion['reframe']
-                })
-                break  # Avoid duplicate detection of same distortion
-
-    return {"distortions": detected}
+        ends = [match.end() for match in _SENTENCE_END.finditer(buffer, pos)]
+        done = ends[-1] if ends else pos
+        match_end = done
+        if eof:
+            if done < len(buffer):
+                ends.append(len(buffer))
+            done = match_end = len(buffer)
+        else:
+            while len(buffer) - done > max_sentence + margin:
+                cut = done + max_sentence
+                space = _LAST_SPACE.search(buffer, done + 1, cut)
+                if space is not None:
+                    cut = space.end()
+                ends.append(cut)
+                done = cut
+                match_end = cut + margin
+        if not ends:
+            continue
+
+        lowered = _lower_same_length(buffer[:match_end])
+        hits = sorted(
+            (start, keys) for start, _, _, keys in matcher.finditer(lowered, pos, match_end)
+            if start < done
+        )
+
+        i = 0
+        start = pos
+        for end in ends:
+            counts = {}
+            while i < len(hits) and hits[i][0] < end:
+                for key in hits[i][1]:
+                    counts[key] = counts.get(key, 0) + 1
+                i += 1
+            if counts or include_empty:
+                text = buffer[start:end]
+                stripped = text.strip()
+                if stripped:
+                    lead = len(text) - len(text.lstrip())
+                    yield {
+                        'start': base + start + lead,
+                        'end': base + start + lead + len(stripped),
+                        'text': stripped,
+                        'counts': dict(sorted(counts.items(), key=lambda item: order[item[0]])),
+                    }
+            start = end
+
+        context = 1 if done else 0
+        base += done - context
+        buffer = buffer[done - context:]
+
+
+def analyze_cbt_stream(stream, chunk_size=DEFAULT_CHUNK_SIZE, max_sentence=None):
+    """
+    Total distortion counts for a text stream, in constant memory.
+
+    Returns:
+        dict: {'sentences': int matched sentences, 'counts': {distortion_key: hits}}
+    """
+    sentences = 0
+    totals = {}
+    for result in iter_cbt_sentences(stream, chunk_size, max_sentence):
+        sentences += 1
+        for key, count in result['counts'].items():
+            totals[key] = totals.get(key, 0) + count
+    return {
+        'sentences': sentences,
+        'counts': {key: totals[key] for key in CBT_DISTORTIONS if key in totals},
+    }
+
+
+def count_distortions(text):
+    """Keyword hits per distortion key in text, in CBT_DISTORTIONS order."""
+    hits = {}
+    for _, _, _, keys in get_default_matcher().finditer(_lower_same_length(text)):
+        for key in keys:
+            hits[key] = hits.get(key, 0) + 1
+    return {key: hits[key] for key in CBT_DISTORTIONS if key in hits}
+
+
+def _count_chunk(texts):
+    return [count_distortions(text) for text in texts]
+
+
+DEFAULT_RECORD_CHUNK = 2000
+
+
+class ParallelCBTAnalyzer:
+    """
+    Process pool for CBT analysis of large record collections.
+
+    Each worker builds (or loads from the on-disk cache) the distortion
+    matcher once when it starts. Records are sent in chunks of chunk_size
+    to keep IPC overhead low, at most two chunks per worker are in flight
+    so memory stays bounded for arbitrarily long inputs, and results come
+    back in input order. With workers=1 everything runs in-process.
+
+        with ParallelCBTAnalyzer(workers=8) as analyzer:
+            for counts in analyzer.imap(lines):
+                ...
+    """
+
+    def __init__(self, workers=None, chunk_size=DEFAULT_RECORD_CHUNK):
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be positive")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = None
+        if self.workers > 1:
+            import multiprocessing
+            self._pool = multiprocessing.Pool(self.workers, initializer=get_default_matcher)
+
+    def imap(self, texts):
+        """Yield count_distortions(text) for each text, in order."""
+        texts = iter(texts)
+        chunks = iter(lambda: list(islice(texts, self.chunk_size)), [])
+        if self._pool is None:
+            for chunk in chunks:
+                yield from _count_chunk(chunk)
+            return
+        pending = deque()
+        for chunk in chunks:
+            pending.append(self._pool.apply_async(_count_chunk, (chunk,)))
+            if len(pending) >= 2 * self.workers:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self.close()
@@ -0,0 +1,183 @@
+"""
+checks.py
+
+In-process consistency checks across all 16 types: stack derivation and
+inference round-trips, shadow-type round-trips, socionics relation
+symmetry and socionics group masks, plus verification of the precomputed
+lookup tables.
+"""
+
+from itertools import combinations
+
+from core.functions import (
+    SHADOW_MASKS, derive_cognitive_stack, get_function_roles, infer_mbti_from_stack,
+    infer_shadow_type, verify_inference_table,
+)
+from core.socionics import (
+    ALL_TYPES, CLUBS, DICHOTOMIES, EXTRAVERTS, INTUITIVES, LOGICALS, QUADRAS, RATIONALS, TEMPERAMENTS,
+    get_intertype_relation, mask_types, parity_mask, verify_relation_table,
+)
+from core.typecode import TYPE_NAMES
+
+# Relation of B to A implied by the relation of A to B
+CONVERSE_RELATIONS = {
+    "Supervisor": "Supervisee",
+    "Supervisee": "Supervisor",
+    "Benefactor": "Beneficiary",
+    "Beneficiary": "Benefactor",
+}
+
+
+def check_ego_round_trip():
+    """Inferring each type's ego stack gives the type back as an exact match."""
+    failures = []
+    for mbti in TYPE_NAMES:
+        stack = derive_cognitive_stack(mbti)
+        result = infer_mbti_from_stack(stack)
+        if result['type'] != mbti or not result['exact_match']:
+            failures.append(f"{mbti}: ego stack {'-'.join(stack)} inferred as {result['type']}")
+    return len(TYPE_NAMES), failures
+
+
+def check_shadow_round_trips():
+    """Each shadow mapping is its own inverse and its stack infers to the shadow type."""
+    failures = []
+    checked = 0
+    for mbti in TYPE_NAMES:
+        roles = get_function_roles(mbti)
+        for mode in SHADOW_MASKS:
+            checked += 1
+            shadow = infer_shadow_type(mbti, mode)
+            back = infer_shadow_type(shadow, mode)
+            if back != mbti:
+                failures.append(f"{mbti}: {mode} of {mode} ({shadow}) is {back}")
+            inferred = infer_mbti_from_stack(roles[mode])['type']
+            if inferred != shadow:
+                failures.append(f"{mbti}: {mode} stack {'-'.join(roles[mode])} inferred as {inferred}, expected {shadow}")
+    return checked, failures
+
+
+def check_relation_symmetry():
+    """Relations exist for all pairs and agree in both directions."""
+    failures = []
+    checked = 0
+    for a in TYPE_NAMES:
+        for b in TYPE_NAMES:
+            checked += 1
+            forward = get_intertype_relation(a, b)
+            backward = get_intertype_relation(b, a)
+            if forward is None:
+                failures.append(f"{a} -> {b}: no relation")
+                continue
+            expected = CONVERSE_RELATIONS.get(forward, forward)
+            if backward != expected:
+                failures.append(f"{a} -> {b} is {forward} but {b} -> {a} is {backward}, expected {expected}")
+    return checked, failures
+
+
+def check_relation_table():
+    """The precomputed relation table matches get_exact_relation."""
+    return 256, [
+        f"{a} -> {b}: expected {expected}, table has {actual}"
+        for a, b, expected, actual in verify_relation_table()
+    ]
+
+
+# Relations between members of the same quadra
+QUADRA_RELATIONS = {"Identity", "Duality", "Activity", "Mirror"}
+
+
+def check_socionics_groups():
+    """Quadras, clubs and temperaments partition the 16 types; quadras hold only quadra relations; Reinin dichotomies are the 15 parities of the base four."""
+    failures = []
+    checked = 0
+    for kind, groups in (('quadras', QUADRAS), ('clubs', CLUBS), ('temperaments', TEMPERAMENTS)):
+        checked += 1
+        union = 0
+        for name, mask in groups.items():
+            if union & mask:
+                failures.append(f"{kind}: {name} overlaps {', '.join(mask_types(union & mask))}")
+            union |= mask
+        if union != ALL_TYPES:
+            failures.append(f"{kind}: {', '.join(mask_types(ALL_TYPES ^ union))} in no group")
+    for name, mask in QUADRAS.items():
+        members = mask_types(mask)
+        for a in members:
+            for b in members:
+                checked += 1
+                relation = get_intertype_relation(a, b)
+                if relation not in QUADRA_RELATIONS:
+                    failures.append(f"{name}: {a} -> {b} is {relation}")
+    for (first, second), mask in DICHOTOMIES.items():
+        checked += 1
+        if bin(mask).count('1') != 8:
+            failures.append(f"{first}/{second}: {first} has {bin(mask).count('1')} types")
+    # Each dichotomy is a pole of a different parity of the base ones
+    base = {'Extravert': EXTRAVERTS, 'Intuitive': INTUITIVES, 'Logical': LOGICALS, 'Rational': RATIONALS}
+    products = {}
+    for size in range(1, len(base) + 1):
+        for names in combinations(base, size):
+            products[parity_mask(*(base[name] for name in names))] = '*'.join(names)
+    found = set()
+    for (first, second), mask in DICHOTOMIES.items():
+        checked += 1
+        product = products.get(mask, products.get(ALL_TYPES ^ mask))
+        if product is None:
+            failures.append(f"{first}/{second}: not a parity of the base dichotomies")
+        elif product in found:
+            failures.append(f"{first}/{second}: same split as another dichotomy ({product})")
+        found.add(product)
+    checked += 1
+    if len(found) != len(products):
+        failures.append(f"dichotomies: {', '.join(sorted(set(products.values()) - found))} missing")
+    checked += 1
+    if DICHOTOMIES['Static', 'Dynamic'] != parity_mask(EXTRAVERTS, RATIONALS):
+        failures.append("Static/Dynamic: Static is not the parity of Extravert and Rational")
+    ile_poles = {'Extravert', 'Intuitive', 'Logical', 'Irrational', 'Democratic', 'Merry', 'Judicious', 'Static',
+                 'Carefree', 'Obstinate', 'Tactical', 'Constructivist', 'Positivist', 'Asking', 'Process'}
+    for (first, second), mask in DICHOTOMIES.items():
+        checked += 1
+        pole = first if 'ENTP' in mask_types(mask) else second
+        if pole not in ile_poles:
+            failures.append(f"{first}/{second}: ENTP (ILE) is {pole}")
+    return checked, failures
+
+
+def check_inference_table():
+    """The precomputed inference table matches the weighted scan."""
+    return 4096, [
+        f"{'-'.join(stack)}: expected {expected}, table has {actual}"
+        for stack, expected, actual in verify_inference_table()
+    ]
+
+
+CHECKS = {
+    'ego-round-trip': check_ego_round_trip,
+    'shadow-round-trips': check_shadow_round_trips,
+    'relation-symmetry': check_relation_symmetry,
+    'relation-table': check_relation_table,
+    'inference-table': check_inference_table,
+    'socionics-groups': check_socionics_groups,
+}
+
+
+def run_checks(names=None):
+    """
+    Run the named checks (default: all).
+
+    Returns:
+        list: [{'name', 'description', 'checked', 'passed', 'failures'}, ...]
+    """
+    results = []
+    for name, check in CHECKS.items():
+        if names and name not in names:
+            continue
+        checked, failures = check()
+        results.append({
+            'name': name,
+            'description': check.__doc__,
+            'checked': checked,
+            'passed': not failures,
+            'failures': failures,
+        })
+    return results
@@ -0,0 +1,29 @@
+"""
+compat.py
+
+Optional third-party dependencies. NumPy is only needed by the bulk
+(vectorized) APIs; everything else runs on the standard library. NumPy is
+imported on first use so commands that never touch arrays do not pay for it.
+"""
+
+import sys
+
+_numpy = None
+
+
+def require_numpy(feature):
+    """Return the numpy module or raise ImportError naming the feature."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(f"{feature} requires NumPy (pip install numpy)") from None
+        _numpy = numpy
+    return _numpy
+
+
+def is_ndarray(obj):
+    # An ndarray cannot exist unless numpy was already imported by the caller
+    numpy = sys.modules.get('numpy')
+    return numpy is not None and isinstance(obj, numpy.ndarray)
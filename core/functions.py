@@ -1,7 +1,19 @@
+import math
+from array import array
+from operator import add
+
 from core.socionics import * 
+from core.compat import require_numpy, is_ndarray
+from core.instrument import instrumented
+from core.results import RoleStack, StackInference, TypeAnalysis, TypeProbability
+from core.typecode import TYPE_NAMES, EI_BIT, NS_BIT, TF_BIT, PJ_BIT, type_to_code
 
 VALID_FUNCTIONS = {'Ni', 'Ne', 'Fi', 'Fe', 'Ti', 'Te', 'Si', 'Se'}
 
+# Function code (index) -> function name; FUNCTION_CODES is the reverse map
+FUNCTION_NAMES = ('Ne', 'Ni', 'Se', 'Si', 'Te', 'Ti', 'Fe', 'Fi')
+FUNCTION_CODES = {name: code for code, name in enumerate(FUNCTION_NAMES)}
+
 VALID_STACKS = {
     'ISTJ': ['Si', 'Te', 'Fi', 'Ne'],
     'ISFJ': ['Si', 'Fe', 'Ti', 'Ne'],
@@ -21,134 +33,382 @@ VALID_STACKS = {
     'ENTJ': ['Te', 'Ni', 'Se', 'Fi'],
 }
 
-def infer_mbti_from_stack(stack):
-    # Validate input
+# Weight of a match at each stack position (max possible score = 4+3+2+1 = 10)
+POSITION_WEIGHTS = (4, 3, 2, 1)
+
+# Differing-positions bitmask (bit i = position i+1) -> 1-based position list
+DIFF_POSITIONS = tuple(tuple(i + 1 for i in range(4) if mask >> i & 1) for mask in range(16))
+
+def pack_stack(stack):
+    """
+    Pack a four-function stack into a 12-bit key (3 bits per function in
+    FUNCTION_NAMES order, dominant function in the high bits).
+    """
     if len(stack) != 4:
         raise ValueError(f"Stack must have 4 functions (got {len(stack)})")
-    
-    stack = [func.capitalize() for func in stack]
+    key = 0
     for func in stack:
-        if func not in VALID_FUNCTIONS:
-            raise ValueError(f"Invalid function: {func}")
+        code = FUNCTION_CODES.get(func.capitalize())
+        if code is None:
+            raise ValueError(f"Invalid function: {func.capitalize()}")
+        key = (key << 3) | code
+    return key
+
+def unpack_stack(key):
+    return [FUNCTION_NAMES[(key >> shift) & 7] for shift in (9, 6, 3, 0)]
 
-    # Check exact match
+def _infer_by_scan(stack):
+    """
+    Reference scoring over VALID_STACKS: exact match first, then weighted
+    position scoring where a tie goes to a later stack sharing the dominant
+    function. Returns (type, score). Used to build and verify the table.
+    """
     for mbti, valid_stack in VALID_STACKS.items():
         if stack == valid_stack:
-            return {
-                'type': mbti,
-                'exact_match': True,
-                'confidence': 100.0,
-                'closest_stack': valid_stack,
-                'differences': []
-            }
-
-    # Find closest match using weighted position scoring
+            return mbti, 10
+
     max_score = -1
     closest_type = None
-    closest_stack = None
-
     for mbti, valid_stack in VALID_STACKS.items():
         score = sum((4 - i) for i in range(4) if stack[i] == valid_stack[i])
         if score > max_score or (score == max_score and stack[0] == valid_stack[0]):
             max_score = score
             closest_type = mbti
-            closest_stack = valid_stack
+    return closest_type, max_score
+
+def _build_inference_block(f0):
+    """
+    Fill the lookup tables for the 512 stacks whose dominant function is f0:
+    closest type, score and differing-position mask per pack_stack() key.
+
+    With M the best score, the scan in _infer_by_scan keeps the last
+    M-scoring stack that shares the dominant function, or else the first
+    M-scoring stack (in VALID_STACKS order). Both rules fold into one
+    composite value per candidate, score * 64 + rank, so each key only
+    needs a max() over 16 precomputed sums.
+    """
+    candidates = _INFERENCE_CANDIDATES
+    n = len(candidates)
+    match = _INFERENCE_MATCH
+    # Sharing the dominant function outranks not sharing it; among those
+    # sharing it the later candidate wins, otherwise the earlier one.
+    ranks = [32 + t if valid[0] == f0 else n - t for t, (_, valid) in enumerate(candidates)]
+    by_rank = {rank: t for t, rank in enumerate(ranks)}
+    level0 = list(map(add, ranks, match[0][f0]))
+    for f1 in range(8):
+        level1 = list(map(add, level0, match[1][f1]))
+        for f2 in range(8):
+            level2 = list(map(add, level1, match[2][f2]))
+            for f3 in range(8):
+                best = max(map(add, level2, match[3][f3]))
+                type_code, valid = candidates[by_rank[best & 63]]
+                key = (f0 << 9) | (f1 << 6) | (f2 << 3) | f3
+                _INFER_TYPES[key] = type_code
+                _INFER_SCORES[key] = best >> 6
+                _INFER_DIFFS[key] = ((f0 != valid[0]) | (f1 != valid[1]) << 1
+                                     | (f2 != valid[2]) << 2 | (f3 != valid[3]) << 3)
+    _built_blocks[f0] = True
+
+# (type code, function codes) per stack, in VALID_STACKS order
+_INFERENCE_CANDIDATES = [
+    (type_to_code(mbti), tuple(FUNCTION_CODES[f] for f in valid_stack))
+    for mbti, valid_stack in VALID_STACKS.items()
+]
 
-    # Calculate confidence (max possible score = 4+3+2+1 = 10)
-    confidence = (max_score / 10) * 100
+# _INFERENCE_MATCH[i][f][t]: composite contribution when position i holds function f
+_INFERENCE_MATCH = [
+    [[64 * POSITION_WEIGHTS[i] if valid[i] == f else 0 for _, valid in _INFERENCE_CANDIDATES] for f in range(8)]
+    for i in range(4)
+]
 
-    # Identify differing positions
-    differences = [i+1 for i in range(4) if stack[i] != closest_stack[i]]
+# Lookup tables indexed by pack_stack() keys, filled one dominant-function
+# block at a time so a single lookup only pays for 512 of the 4096 entries
+_INFER_TYPES = bytearray(4096)
+_INFER_SCORES = bytearray(4096)
+_INFER_DIFFS = bytearray(4096)
+_built_blocks = [False] * 8
+
+def get_inference_tables():
+    """(types, scores, diffs) 4096-byte lookup tables, completed on first use."""
+    for f0 in range(8):
+        if not _built_blocks[f0]:
+            _build_inference_block(f0)
+    return _INFER_TYPES, _INFER_SCORES, _INFER_DIFFS
+
+@instrumented('infer_mbti_from_stack')
+def infer_mbti_from_stack(stack):
+    key = pack_stack(stack)
+    if not _built_blocks[key >> 9]:
+        _build_inference_block(key >> 9)
+    score = _INFER_SCORES[key]
+    mbti = TYPE_NAMES[_INFER_TYPES[key]]
+    return StackInference(
+        mbti, score == 10, score * 10.0, VALID_STACKS[mbti], list(DIFF_POSITIONS[_INFER_DIFFS[key]])
+    )
 
+def infer_many(keys):
+    """
+    Look up many packed stacks (see pack_stack) at once.
+
+    Returns a dict with 'types' (type codes), 'confidences' (0-100) and
+    'differences' (bitmask, bit i set if position i+1 differs). NumPy
+    input gives uint8 NumPy arrays; any other iterable of keys gives
+    array('B') columns built by C-level table lookups.
+    """
+    types, scores, diffs = get_inference_tables()
+    if is_ndarray(keys):
+        np = require_numpy("infer_many")
+        keys = keys.astype(np.intp, copy=False)
+        if keys.size and (keys.min() < 0 or keys.max() > 4095):
+            raise ValueError("Packed stack keys must be in range 0-4095")
+        return {
+            'types': np.frombuffer(types, dtype=np.uint8)[keys],
+            'confidences': np.frombuffer(scores, dtype=np.uint8)[keys] * np.uint8(10),
+            'differences': np.frombuffer(diffs, dtype=np.uint8)[keys],
+        }
+    try:
+        # Negative keys or keys over 65535 overflow the array itself
+        keys = array('H', keys)
+    except OverflowError:
+        keys = None
+    if keys is None or (keys and max(keys) > 4095):
+        raise ValueError("Packed stack keys must be in range 0-4095")
+    confidences = bytes(s * 10 for s in range(11))
     return {
-        'type': closest_type,
-        'exact_match': False,
-        'confidence': round(confidence, 1),
-        'closest_stack': closest_stack,
-        'differences': differences
+        'types': array('B', map(types.__getitem__, keys)),
+        'confidences': array('B', bytes(map(scores.__getitem__, keys)).translate(confidences + bytes(245))),
+        'differences': array('B', map(diffs.__getitem__, keys)),
     }
 
+# Position weights as fractions of the full-match score, so a type's score
+# is the weighted mean of its stack's strengths (0-1 for 0-1 strengths)
+_DISTRIBUTION_WEIGHTS = tuple(w / sum(POSITION_WEIGHTS) for w in POSITION_WEIGHTS)
+
+# Default softmax temperature, in units of the 0-1 type score
+DISTRIBUTION_TEMPERATURE = 0.1
+
+_distribution_matrices = None
+
+def get_distribution_matrices():
+    """
+    (strength_weights, position_weights): the 16x8 matrix of each type's
+    weight on each function (its position weight, 0 for functions outside
+    its stack) and the 16x32 matrix of its weight on each (position,
+    function) pair. Rows are type codes, columns FUNCTION_NAMES order.
+    """
+    global _distribution_matrices
+    if _distribution_matrices is None:
+        np = require_numpy("get_distribution_matrices")
+        strength_weights = np.zeros((16, 8))
+        position_weights = np.zeros((16, 4, 8))
+        for type_code, valid in _INFERENCE_CANDIDATES:
+            for i, f in enumerate(valid):
+                strength_weights[type_code, f] = _DISTRIBUTION_WEIGHTS[i]
+                position_weights[type_code, i, f] = _DISTRIBUTION_WEIGHTS[i]
+        _distribution_matrices = (strength_weights, position_weights.reshape(16, 32))
+    return _distribution_matrices
+
+def _strength_rows(np, strengths):
+    """(N, 8) float array from a {function: strength} dict, one row or rows."""
+    if isinstance(strengths, dict):
+        row = [0.0] * 8
+        for func, value in strengths.items():
+            code = FUNCTION_CODES.get(func.capitalize())
+            if code is None:
+                raise ValueError(f"Invalid function: {func.capitalize()}")
+            row[code] = float(value)
+        strengths = row
+    x = np.asarray(strengths, dtype=np.float64)
+    if x.ndim not in (1, 2) or x.shape[-1] != 8:
+        raise ValueError(f"Strengths must have 8 values per row, got shape {x.shape}")
+    if np.isnan(x).any():
+        raise ValueError("Strengths must not be NaN")
+    return x
+
+def _partial_stack_codes(np, stacks):
+    """
+    (N, 4) int array of function codes, -1 for unknown positions, from one
+    partial stack (up to four names, None/'?'/'' unknown), a list of them,
+    or an integer array of codes.
+    """
+    if is_ndarray(stacks):
+        codes = np.asarray(stacks, dtype=np.intp)
+    else:
+        single = stacks and all(isinstance(f, str) or f is None for f in stacks)
+        rows = [stacks] if single else stacks
+        codes = np.full((len(rows), 4), -1, dtype=np.intp)
+        for r, stack in enumerate(rows):
+            if len(stack) > 4:
+                raise ValueError(f"Stack must have at most 4 functions (got {len(stack)})")
+            for i, func in enumerate(stack):
+                if func is None or func.strip() in ('', '?', '_'):
+                    continue
+                code = FUNCTION_CODES.get(func.strip().capitalize())
+                if code is None:
+                    raise ValueError(f"Invalid function: {func.strip().capitalize()}")
+                codes[r, i] = code
+        if single:
+            codes = codes[0]
+    if codes.ndim not in (1, 2) or codes.shape[-1] != 4:
+        raise ValueError(f"Partial stacks must have 4 positions per row, got shape {codes.shape}")
+    if codes.size and (codes.min() < -1 or codes.max() > 7):
+        raise ValueError("Function codes must be in range 0-7, or -1 for unknown")
+    return codes
+
+def infer_type_distribution(strengths=None, stacks=None, temperature=DISTRIBUTION_TEMPERATURE, chunk_size=65536):
+    """
+    Probability distribution over the 16 types from function strengths or
+    partial stacks.
+
+    Strengths are scored against each type's stack with the position
+    weights (a dominant function counts 4/10, the inferior 1/10); each
+    row is first divided by its largest absolute value, so any scale of
+    assessment scores works. A partial stack scores POSITION_WEIGHTS/10
+    for each known position matching the type's stack, i.e. the
+    confidence infer_mbti_from_stack reports, over 100. Either way a chunk
+    of rows is scored with one matrix product against the matrices from
+    get_distribution_matrices(), and probabilities are a softmax of
+    score / temperature.
+
+    Args:
+        strengths: 8 strengths in FUNCTION_NAMES order or a {function:
+            strength} dict (one row), or an (N, 8) array.
+        stacks: one partial stack (up to four function names, None, '?'
+            or '_' for unknown positions), a list of them, or an (N, 4)
+            array of function codes with -1 for unknown.
+
+    Returns:
+        For one row, all 16 TypeProbability results, most probable first.
+        For N rows, a dict of (N, 16) arrays, each row most probable first:
+        'types' (type codes), 'scores' and 'probabilities';
+        distribution_row(result, i) gives row i as TypeProbability results.
+    """
+    np = require_numpy("infer_type_distribution")
+    if (strengths is None) == (stacks is None):
+        raise ValueError("Pass either strengths or stacks")
+    # NaN fails the comparison too
+    if not 0 < temperature < math.inf:
+        raise ValueError("Temperature must be a positive finite number")
+    strength_weights, position_weights = get_distribution_matrices()
+    if strengths is not None:
+        x = _strength_rows(np, strengths)
+        weights = strength_weights
+    else:
+        x = _partial_stack_codes(np, stacks)
+        weights = position_weights
+    single = x.ndim == 1
+    x = x.reshape(-1, x.shape[-1])
+
+    n = len(x)
+    types = np.empty((n, 16), dtype=np.int8)
+    scores = np.empty((n, 16))
+    probabilities = np.empty((n, 16))
+    for start in range(0, n, chunk_size):
+        chunk = x[start:start + chunk_size]
+        if strengths is not None:
+            scale = np.abs(chunk).max(axis=1, keepdims=True)
+            chunk = chunk / np.where(scale > 0, scale, 1.0)
+        else:
+            # One-hot (position, function) columns; unknown positions stay 0
+            onehot = np.zeros((len(chunk), 32))
+            rows, positions = np.nonzero(chunk >= 0)
+            onehot[rows, positions * 8 + chunk[rows, positions]] = 1.0
+            chunk = onehot
+        # Rounded off, so rows that tie exactly rank in type code order
+        # whatever the product's summation order (which varies with shape)
+        score = np.round(chunk @ weights.T, 12)
+
+        logits = score / temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        prob = np.exp(logits)
+        prob /= prob.sum(axis=1, keepdims=True)
+
+        order = np.argsort(-prob, axis=1, kind='stable')
+        rows = slice(start, start + len(chunk))
+        types[rows] = order
+        scores[rows] = np.take_along_axis(score, order, axis=1)
+        probabilities[rows] = np.take_along_axis(prob, order, axis=1)
+
+    result = {'types': types, 'scores': scores, 'probabilities': probabilities}
+    if single:
+        return distribution_row(result, 0)
+    return result
+
+
+def distribution_row(result, row):
+    """The 16 TypeProbability results of one row of infer_type_distribution's arrays."""
+    return [
+        TypeProbability(TYPE_NAMES[code], round(score, 4), round(probability, 4))
+        for code, score, probability in zip(
+            result['types'][row].tolist(), result['scores'][row].tolist(), result['probabilities'][row].tolist()
+        )
+    ]
+
+
+def verify_inference_table():
+    """
+    Compare the lookup tables with _infer_by_scan for all 4096 stacks.
+    Returns a list of (stack, expected, actual) mismatches.
+    """
+    types, scores, _ = get_inference_tables()
+    mismatches = []
+    for key in range(4096):
+        stack = unpack_stack(key)
+        expected = _infer_by_scan(stack)
+        actual = (TYPE_NAMES[types[key]], scores[key])
+        if expected != actual:
+            mismatches.append((stack, expected, actual))
+    return mismatches
+
 def opposite_jp(jp):
     return 'F' if jp == 'T' else 'T'
 
 def opposite_ns(ns):
     return 'S' if ns == 'N' else 'N'
 
-def derive_cognitive_stack(mbti_type):
-    attitude = mbti_type[0]  # I or E
-    perception = mbti_type[1]  # N or S
-    judgment = mbti_type[2]    # T or F
-    lifestyle = mbti_type[3]   # J or P
-
-    is_introvert = attitude == 'I'
-    is_judging = lifestyle == 'J'
-
-    # Function pairs: (extraverted, introverted)
-    perceiving_funcs = {'N': ('Ne', 'Ni'), 'S': ('Se', 'Si')}
-    judging_funcs = {'T': ('Te', 'Ti'), 'F': ('Fe', 'Fi')}
-
-    # Determine dominant and auxiliary functions
-    if is_introvert:
-        if is_judging:
-            # Dominant: introverted perceiving, Auxiliary: extraverted judging
-            dom = perceiving_funcs[perception][1]  # Ni or Si
-            aux = judging_funcs[judgment][0]       # Te or Fe
-        else:
-            # Dominant: introverted judging, Auxiliary: extraverted perceiving
-            dom = judging_funcs[judgment][1]       # Ti or Fi
-            aux = perceiving_funcs[perception][0]  # Ne or Se
-    else:
-        if is_judging:
-            # Dominant: extraverted judging, Auxiliary: introverted perceiving
-            dom = judging_funcs[judgment][0]       # Te or Fe
-            aux = perceiving_funcs[perception][1]  # Ni or Si
-        else:
-            # Dominant: extraverted perceiving, Auxiliary: introverted judging
-            dom = perceiving_funcs[perception][0]  # Ne or Se
-            aux = judging_funcs[judgment][1]       # Ti or Fi
-
-    # Determine tertiary function: opposite perceiving/judging of auxiliary, flipped attitude
-    # If auxiliary is perceiving (Ne, Ni, Se, Si), tertiary is judging (Te, Ti, Fe, Fi)
-    # If auxiliary is judging (Te, Ti, Fe, Fi), tertiary is perceiving (Ne, Ni, Se, Si)
-
-    # Helper to get opposite judging/ perceiving letter
-    def opposite_jp(jp):
-        return 'F' if jp == 'T' else 'T'
-
-    def opposite_ns(ns):
-        return 'S' if ns == 'N' else 'N'
-
-    # Auxiliary function type and attitude
-    aux_type = aux[0]  # N, S, T, or F
-    aux_attitude = aux[1]  # 'e' or 'i'
-
-    dom_type = dom[0]      # e.g. 'N' in 'Ni'
-    dom_attitude = dom[1]  # e.g. 'i' in 'Ni'
-
-    # For tertiary:
-    if aux_type in ('N', 'S'):
-        # Auxiliary is perceiving, tertiary is perceiving with opposite perception letter and opposite attitude
-        tertiary_perception = opposite_ns(aux_type)
-        tertiary_funcs = perceiving_funcs[tertiary_perception]
-        tertiary = tertiary_funcs[1] if aux_attitude == 'e' else tertiary_funcs[0]
-    else:
-        # Auxiliary is judging, tertiary is judging with opposite judgment letter and opposite attitude
-        tertiary_judgment = opposite_jp(aux_type)
-        tertiary_funcs = judging_funcs[tertiary_judgment]
-        tertiary = tertiary_funcs[1] if aux_attitude == 'e' else tertiary_funcs[0]
-
-    # Inferior function: opposite J/P and opposite attitude of dominant
-    if dom_type in ('N', 'S'):
-        inferior_perception = opposite_ns(dom_type)
-        inferior_funcs = perceiving_funcs[inferior_perception]
-        inferior = inferior_funcs[1] if dom_attitude == 'e' else inferior_funcs[0]
+# XOR masks mapping a type code to the type whose ego stack fills each role
+ROLE_MASKS = {
+    'ego': 0,
+    'subconscious': EI_BIT | NS_BIT | TF_BIT | PJ_BIT,  # flip all four letters
+    'unconscious': EI_BIT | PJ_BIT,                     # flip I/E and J/P
+    'superego': NS_BIT | TF_BIT,                        # flip N/S and T/F
+}
+
+SHADOW_MASKS = {role: mask for role, mask in ROLE_MASKS.items() if role != 'ego'}
+
+def _derive_ego_stack(code):
+    """Dominant, auxiliary, tertiary and inferior functions for a type code."""
+    perceiving = ('Ne', 'Ni') if not code & NS_BIT else ('Se', 'Si')
+    judging = ('Te', 'Ti') if not code & TF_BIT else ('Fe', 'Fi')
+    opposite = {'Ne': ('Se', 'Si'), 'Ni': ('Se', 'Si'), 'Se': ('Ne', 'Ni'), 'Si': ('Ne', 'Ni'),
+                'Te': ('Fe', 'Fi'), 'Ti': ('Fe', 'Fi'), 'Fe': ('Te', 'Ti'), 'Fi': ('Te', 'Ti')}
+
+    is_introvert = not code & EI_BIT
+    is_judging = not code & PJ_BIT
+
+    # The extraverted function of the pair is the one shown by J/P
+    if is_judging:
+        extraverted, introverted = judging[0], perceiving[1]
     else:
-        inferior_judgment = opposite_jp(dom_type)
-        inferior_funcs = judging_funcs[inferior_judgment]
-        inferior = inferior_funcs[1] if dom_attitude == 'e' else inferior_funcs[0]
+        extraverted, introverted = perceiving[0], judging[1]
+    dom, aux = (introverted, extraverted) if is_introvert else (extraverted, introverted)
+
+    # Tertiary and inferior: opposite letter and opposite attitude of aux and dom
+    tertiary = opposite[aux][1 if aux[1] == 'e' else 0]
+    inferior = opposite[dom][1 if dom[1] == 'e' else 0]
+    return (dom, aux, tertiary, inferior)
 
+# Type code -> ego stack
+EGO_STACKS = tuple(_derive_ego_stack(code) for code in range(16))
 
-    return [dom, aux, tertiary, inferior]
+# Type code -> ((role, role type code), ...) in ROLE_MASKS order
+ROLE_TYPES = tuple(
+    tuple((role, code ^ mask) for role, mask in ROLE_MASKS.items())
+    for code in range(16)
+)
+
+def derive_cognitive_stack(mbti_type):
+    return list(EGO_STACKS[type_to_code(mbti_type)])
 
 def flip_letter(ch):
     return {
@@ -160,50 +420,40 @@ def flip_letter(ch):
 
 def infer_shadow_type(mbti, mode):
     """Returns MBTI type representing shadow (subconscious, unconscious, superego)"""
-    if mode == 'subconscious':
-        # Flip all four letters (I/E, N/S, T/F, J/P)
-        shadow = ''.join([flip_letter(c) for c in mbti])
-    elif mode == 'unconscious':
-        # Flip first (I/E) and last (J/P) letters only
-        shadow = flip_letter(mbti[0]) + mbti[1] + mbti[2] + flip_letter(mbti[3])
-    elif mode == 'superego':
-        # Flip middle two letters (N/S and T/F) only
-        shadow = mbti[0] + flip_letter(mbti[1]) + flip_letter(mbti[2]) + mbti[3]
-    else:
+    mask = SHADOW_MASKS.get(mode)
+    if mask is None:
         raise ValueError("Unknown shadow mode")
-    return shadow
+    return TYPE_NAMES[type_to_code(mbti) ^ mask]
 
+@instrumented('get_function_roles')
 def get_function_roles(mbti_type):
-    ego = derive_cognitive_stack(mbti_type)
-    subconscious = derive_cognitive_stack(infer_shadow_type(mbti_type, 'subconscious'))
-    unconscious = derive_cognitive_stack(infer_shadow_type(mbti_type, 'unconscious'))
-    superego = derive_cognitive_stack(infer_shadow_type(mbti_type, 'superego'))
+    return {role: list(EGO_STACKS[role_code]) for role, role_code in ROLE_TYPES[type_to_code(mbti_type)]}
+
+@instrumented('describe_roles')
+def describe_roles(mbti_type, functions=ROLE_MASKS):
+    """{role: {'stack': [...], 'mbti': type filling that role}} for the requested roles."""
+    role_types = dict(ROLE_TYPES[type_to_code(mbti_type)])
     return {
-        'ego': ego,
-        'subconscious': subconscious,
-        'unconscious': unconscious,
-        'superego': superego
+        role: {'stack': list(EGO_STACKS[role_types[role]]), 'mbti': TYPE_NAMES[role_types[role]]}
+        for role in functions
+        if role in role_types
     }
 
 def analyze_type(mbti_type, functions, show_socionics=False, compare_to_type=None):
-    roles = get_function_roles(mbti_type)  # Assuming this function exists and returns stacks per role
-
-    if show_socionics:
-        print(f"Analysis for {mbti_type} (MBTI):")
-    else:
-        print(f"Analysis for {mbti_type}:")
-
-    for role in functions:
-        if role in roles:
-            stack = roles[role]
-            inferred = infer_mbti_from_stack(stack)['type']  # get just MBTI string
-            stack_str = '-'.join(stack)
-            if show_socionics:
-                print(f"{role.capitalize()}: {stack_str}  (MBTI: {inferred})")
-            else:
-                print(f"{role.capitalize()}: {stack_str}  (MBTI: {inferred})")
-
-    # Show Socionics intertype relation if requested
-    if show_socionics and compare_to_type:
-        relation = get_intertype_relation(mbti_type.upper(), compare_to_type.upper())
-        print(f"\nSocionics Relation between {mbti_type.upper()} and {compare_to_type.upper()}: {relation}")
+    """
+    TypeAnalysis of the requested roles. With show_socionics it carries the
+    socionics type, and with compare_to_type also the socionics relation.
+    """
+    role_types = dict(ROLE_TYPES[type_to_code(mbti_type)])
+    roles = [
+        RoleStack(role, EGO_STACKS[role_types[role]], TYPE_NAMES[role_types[role]])
+        for role in functions
+        if role in role_types
+    ]
+    if not show_socionics:
+        return TypeAnalysis(mbti_type, roles)
+    analysis = TypeAnalysis(mbti_type, roles, mbti_to_socionics(mbti_type))
+    if compare_to_type:
+        analysis.compare_to = compare_to_type.upper()
+        analysis.relation = get_intertype_relation(mbti_type.upper(), analysis.compare_to)
+    return analysis
@@ -0,0 +1,88 @@
+"""
+importprofile.py
+
+Per-module import timing, enabled by setting EIDON_IMPORT_PROFILE=1.
+
+Every module loaded after install_import_profiler() is timed while it
+executes. At exit, a table of inclusive time (module and everything it
+imported) and self time is written to stderr, slowest first. Set
+EIDON_IMPORT_PROFILE to a file path instead of 1 to write the table there.
+"""
+
+import atexit
+import os
+import sys
+import time
+from importlib.abc import MetaPathFinder
+
+# module name -> (inclusive seconds, self seconds)
+_timings = {}
+# Child import time accumulated for each module currently executing
+_stack = []
+
+
+class _TimedLoader:
+    """Delegating loader that times exec_module."""
+
+    def __init__(self, loader, name):
+        self._loader = loader
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        _stack.append(0.0)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = _stack.pop()
+            if _stack:
+                _stack[-1] += elapsed
+            _timings[self._name] = (elapsed, elapsed - children)
+
+
+class _ImportTimer(MetaPathFinder):
+    """Meta path finder that wraps the loader found by the other finders."""
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                spec.loader = _TimedLoader(spec.loader, fullname)
+            return spec
+        return None
+
+
+def format_report(limit=None):
+    rows = sorted(_timings.items(), key=lambda item: item[1][0], reverse=True)
+    lines = [f"{'inclusive ms':>12} {'self ms':>9}  module"]
+    for name, (inclusive, own) in rows[:limit]:
+        lines.append(f"{inclusive * 1000:12.2f} {own * 1000:9.2f}  {name}")
+    return "\n".join(lines)
+
+
+def _report():
+    target = os.environ.get("EIDON_IMPORT_PROFILE", "1")
+    report = format_report()
+    if target in ("1", "true", "yes", "stderr"):
+        print(report, file=sys.stderr)
+    else:
+        with open(target, 'w') as f:
+            f.write(report + "\n")
+
+
+def install_import_profiler():
+    """Start timing imports and register the exit-time report."""
+    if not any(isinstance(finder, _ImportTimer) for finder in sys.meta_path):
+        sys.meta_path.insert(0, _ImportTimer())
+        atexit.register(_report)
@@ -0,0 +1,322 @@
+"""
+instrument.py
+
+Call counters, latency histograms and event counters for the hot paths,
+with exporters for long-running processes and an exit-time profile report.
+
+Instrumentation is off unless enable() runs (or EIDON_METRICS is set)
+before the instrumented modules are imported: @instrumented checks the
+flag when it decorates, and returns the function itself when disabled, so
+disabled instrumentation costs nothing per call. count() is a single flag
+test when disabled and is meant for rare events such as norms fallbacks.
+
+Metrics are per process; workers of a process pool keep their own.
+
+    EIDON_METRICS=prometheus:/var/lib/node_exporter/eidon.prom python3 eidon.py serve
+    python3 eidon.py --profile --profile-format json --profile-output profile.json batch --input requests.jsonl
+"""
+
+import atexit
+import os
+import sys
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# Upper bounds (seconds) of the latency histogram buckets; a final +Inf
+# bucket holds the rest
+LATENCY_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+DEFAULT_EXPORT_INTERVAL = 10.0
+
+_enabled = bool(os.environ.get("EIDON_METRICS"))
+
+# function name -> CallStats
+_calls = {}
+# event name -> count
+_events = {}
+
+
+class CallStats:
+    """Call count, error count, total time and latency histogram of one function."""
+
+    __slots__ = ('calls', 'errors', 'seconds', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, elapsed):
+        self.calls += 1
+        self.seconds += elapsed
+        self.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def quantile(self, p):
+        """Approximate latency quantile: the upper bound of its bucket (None past the last)."""
+        if not self.calls:
+            return None
+        target = p * self.calls
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'seconds': self.seconds,
+            'buckets': dict(zip([*map(str, LATENCY_BUCKETS), '+Inf'], self.buckets)),
+        }
+
+
+def enable():
+    """
+    Turn instrumentation on. Only functions decorated after this call (that
+    is, in modules imported afterwards) are timed.
+    """
+    global _enabled
+    _enabled = True
+
+
+def is_enabled():
+    return _enabled
+
+
+def instrumented(name=None):
+    """
+    Decorator counting and timing calls under name (default: the function's
+    qualified name) when instrumentation is enabled at decoration time.
+    """
+    def decorate(func):
+        if not _enabled:
+            return func
+        stats = _calls.setdefault(name or func.__qualname__, CallStats())
+        clock = time.perf_counter
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                stats.errors += 1
+                raise
+            finally:
+                stats.observe(clock() - start)
+
+        return wrapper
+    return decorate
+
+
+def count(event, n=1):
+    """Add n to an event counter (no-op when disabled)."""
+    if _enabled:
+        _events[event] = _events.get(event, 0) + n
+
+
+def snapshot():
+    """All metrics as a JSON-serializable dict."""
+    return {
+        'time': time.time(),
+        'pid': os.getpid(),
+        'functions': {name: stats.to_dict() for name, stats in sorted(_calls.items())},
+        'events': dict(sorted(_events.items())),
+    }
+
+
+def reset():
+    for name in _calls:
+        _calls[name] = CallStats()
+    _events.clear()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_prometheus():
+    """Metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP eidon_calls_total Calls of instrumented functions.",
+        "# TYPE eidon_calls_total counter",
+    ]
+    calls = sorted(_calls.items())
+    lines += [f'eidon_calls_total{{function="{_label(name)}"}} {s.calls}' for name, s in calls]
+    lines += [
+        "# HELP eidon_call_errors_total Calls of instrumented functions that raised.",
+        "# TYPE eidon_call_errors_total counter",
+    ]
+    lines += [f'eidon_call_errors_total{{function="{_label(name)}"}} {s.errors}' for name, s in calls]
+    lines += [
+        "# HELP eidon_call_duration_seconds Latency of instrumented functions.",
+        "# TYPE eidon_call_duration_seconds histogram",
+    ]
+    for name, s in calls:
+        label = _label(name)
+        cumulative = 0
+        for bound, bucket in zip([*map(repr, LATENCY_BUCKETS), '+Inf'], s.buckets):
+            cumulative += bucket
+            lines.append(f'eidon_call_duration_seconds_bucket{{function="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'eidon_call_duration_seconds_sum{{function="{label}"}} {s.seconds!r}')
+        lines.append(f'eidon_call_duration_seconds_count{{function="{label}"}} {s.calls}')
+    lines += [
+        "# HELP eidon_events_total Counted events such as norms fallbacks.",
+        "# TYPE eidon_events_total counter",
+    ]
+    lines += [f'eidon_events_total{{event="{_label(event)}"}} {n}' for event, n in sorted(_events.items())]
+    return "\n".join(lines) + "\n"
+
+
+def format_report():
+    """Human-readable table of the call metrics and events."""
+    lines = [f"{'calls':>10} {'errors':>7} {'total ms':>10} {'mean us':>9} {'p50 us':>8} {'p99 us':>8}  function"]
+    for name, s in sorted(_calls.items(), key=lambda item: item[1].seconds, reverse=True):
+        if not s.calls:
+            continue
+        p50, p99 = (s.quantile(p) for p in (0.5, 0.99))
+        lines.append(
+            f"{s.calls:10d} {s.errors:7d} {s.seconds * 1000:10.2f} {s.seconds / s.calls * 1e6:9.1f} "
+            f"{'>5s' if p50 is None else f'{p50 * 1e6:.1f}':>8} {'>5s' if p99 is None else f'{p99 * 1e6:.1f}':>8}  {name}"
+        )
+    for event, n in sorted(_events.items()):
+        lines.append(f"{n:10d} {'':7} {'':10} {'':9} {'':8} {'':8}  event: {event}")
+    return "\n".join(lines)
+
+
+class PrometheusExporter:
+    """Rewrites a file in the Prometheus text format (e.g. for the node exporter's textfile collector)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(format_prometheus())
+        os.replace(tmp_path, self.path)
+
+
+class JSONLinesExporter:
+    """Appends one snapshot() JSON object per export to a file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self):
+        import json
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(snapshot(), separators=(',', ':')) + "\n")
+
+
+EXPORTERS = {
+    'prometheus': PrometheusExporter,
+    'jsonl': JSONLinesExporter,
+}
+
+
+def exporter_for(spec):
+    """Exporter for a 'FORMAT:PATH' spec, FORMAT being one of EXPORTERS."""
+    fmt, sep, path = spec.partition(':')
+    if not sep or not path or fmt not in EXPORTERS:
+        raise ValueError(f"Metrics exporter must be FORMAT:PATH with FORMAT one of {', '.join(EXPORTERS)}; got {spec!r}")
+    return EXPORTERS[fmt](path)
+
+
+def _safe_export(exporter):
+    try:
+        exporter.export()
+    except OSError as e:
+        print(f"Warning: metrics export failed: {e}", file=sys.stderr)
+
+
+def start_exporter(exporter, interval=DEFAULT_EXPORT_INTERVAL):
+    """
+    Export every interval seconds from a daemon thread, and once more at
+    exit. Any object with an export() method can be passed.
+    """
+    import threading
+
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            _safe_export(exporter)
+
+    thread = threading.Thread(target=run, name="eidon-metrics", daemon=True)
+    thread.start()
+
+    def final_export():
+        stop.set()
+        _safe_export(exporter)
+
+    atexit.register(final_export)
+    return thread
+
+
+def install_profile_report(fmt='text', output=None):
+    """
+    Profile the rest of the run and report at exit: 'text' writes the
+    call metrics and the top cProfile entries, 'json' the snapshot() plus
+    cProfile's top entries, 'pstats' a cProfile stats file (output
+    required). output defaults to stderr.
+    """
+    import cProfile
+    import json
+
+    if fmt == 'pstats' and not output:
+        raise ValueError("The pstats profile format needs an output file")
+    enable()
+    profiler = cProfile.Profile()
+
+    def report():
+        profiler.disable()
+        if fmt == 'pstats':
+            profiler.dump_stats(output)
+            return
+        if fmt == 'json':
+            text = json.dumps({**snapshot(), 'profile': _top_entries(profiler)}, indent=2)
+        else:
+            text = format_report() + "\n\n" + _profile_text(profiler)
+        if output:
+            with open(output, 'w') as f:
+                f.write(text + "\n")
+        else:
+            print(text, file=sys.stderr)
+
+    atexit.register(report)
+    profiler.enable()
+    return profiler
+
+
+def _top_entries(profiler, limit=25):
+    """cProfile's slowest functions by cumulative time, as dicts."""
+    import pstats
+
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [
+        {
+            'function': f"{path}:{line}({name})",
+            'calls': calls,
+            'total_seconds': total,
+            'cumulative_seconds': cumulative,
+        }
+        for (path, line, name), (_, calls, total, cumulative, _) in rows[:limit]
+    ]
+
+
+def _profile_text(profiler, limit=25):
+    import io
+    import pstats
+
+    buffer = io.StringIO()
+    pstats.Stats(profiler, stream=buffer).sort_stats('cumulative').print_stats(limit)
+    return buffer.getvalue().strip()
@@ -0,0 +1,395 @@
+"""
+matching.py
+
+Compatibility matching: the top-k partners for each query from a large
+candidate pool, ranked by a socionics relation preference.
+
+The pool is bucketed once by its 16 type codes. A query's type and the
+preference order fix which bucket holds each rank of partner (for a given
+type every relation is reached from exactly one type), so a query only
+visits buckets in preference order until it has k partners and never
+scores the pool per person. Within a bucket, partners come in pool order,
+or nearest first by Big Five distance when both sides have scores.
+
+    pool = MatchPool(types, bigfive=scores)
+    result = pool.match(query_types, query_bigfive, k=5)
+"""
+
+import csv
+import json
+import math
+
+from core.compat import require_numpy, is_ndarray
+from core.socionics import RELATION_CODES, RELATION_TABLE, RELATIONS
+from core.typecode import TYPE_CODES, TYPE_NAMES
+
+# Relations from best to worst partner; those left out (Conflict and
+# Supervision in either direction) are never matched
+DEFAULT_PREFERENCE = (
+    'Duality',
+    'Activity',
+    'Semi-Duality',
+    'Mirror',
+    'Identity',
+    'Comparative',
+    'Look-a-Like',
+    'Illusionary',
+    'Quasi-Identical',
+    'Contrary',
+    'Benefactor',
+    'Beneficiary',
+    'Super-Ego',
+)
+
+# Query x bucket distance blocks are kept under this many elements
+_BLOCK_ELEMENTS = 1 << 22
+
+TYPE_COLUMNS = ('type', 'mbti', 'mbti_type')
+ID_COLUMNS = ('id', 'name')
+
+
+def preference_codes(preference=DEFAULT_PREFERENCE):
+    """Relation codes for a preference list of relation names, best first."""
+    codes = []
+    for name in preference:
+        code = RELATION_CODES.get(name)
+        if code is None:
+            # Accept any capitalization, e.g. 'semi-duality'
+            code = next((c for c, relation in enumerate(RELATIONS) if relation.lower() == name.lower()), None)
+        if code is None:
+            raise ValueError(f"Unknown relation: {name}")
+        if code in codes:
+            raise ValueError(f"Relation listed twice: {RELATIONS[code]}")
+        codes.append(code)
+    if not codes:
+        raise ValueError("Relation preference is empty")
+    return codes
+
+
+def partner_types(type_code, preference=DEFAULT_PREFERENCE):
+    """
+    [(partner type code, relation code)] for a type in preference order.
+    The relation is the query's relation to the partner, as
+    get_intertype_relation(query, partner) names it.
+    """
+    row = RELATION_TABLE[type_code << 4:(type_code + 1) << 4]
+    return [(row.index(code), code) for code in preference_codes(preference)]
+
+
+def _type_codes(np, types):
+    """uint8 type codes from codes or MBTI type names."""
+    if is_ndarray(types) and types.dtype.kind in 'iu':
+        codes = types.astype(np.intp)
+    else:
+        codes = []
+        for value in types:
+            if isinstance(value, str):
+                code = TYPE_CODES.get(value.strip().upper())
+                if code is None:
+                    raise ValueError(f"Unknown MBTI type: {value}")
+                codes.append(code)
+            else:
+                codes.append(int(value))
+        codes = np.array(codes, dtype=np.intp)
+    if codes.size and (codes.min() < 0 or codes.max() > 15):
+        raise ValueError("Type codes must be in range 0-15")
+    return codes.astype(np.uint8)
+
+
+class MatchPool:
+    """
+    Candidate pool bucketed by type code.
+
+    Args:
+        types: type codes or MBTI type names, one per candidate.
+        bigfive: optional (N, 5) Big Five scores; NaN rows are matched
+            after every scored candidate of their bucket.
+        ids: optional candidate ids (default: pool positions).
+    """
+
+    def __init__(self, types, bigfive=None, ids=None):
+        np = require_numpy("MatchPool")
+        self._np = np
+        self.types = _type_codes(np, types)
+        n = len(self.types)
+        if ids is not None and len(ids) != n:
+            raise ValueError(f"Got {len(ids)} ids for {n} candidates")
+        self.ids = ids
+
+        # Stable sort by type: bucket t is order[starts[t]:starts[t + 1]],
+        # in pool order
+        order = np.argsort(self.types, kind='stable')
+        starts = np.zeros(17, dtype=np.intp)
+        np.cumsum(np.bincount(self.types, minlength=16), out=starts[1:])
+        self._buckets = [order[starts[t]:starts[t + 1]] for t in range(16)]
+
+        self.bigfive = None
+        if bigfive is not None:
+            x = np.asarray(bigfive, dtype=np.float64)
+            if x.shape != (n, 5):
+                raise ValueError(f"Big Five scores must have shape ({n}, 5), got {x.shape}")
+            self.bigfive = x
+            # Per bucket: its vectors and squared norms for the
+            # |q|^2 - 2 q.c + |c|^2 distance expansion
+            self._vectors = [x[bucket] for bucket in self._buckets]
+            self._norms = [(v ** 2).sum(axis=1) for v in self._vectors]
+
+    def __len__(self):
+        return len(self.types)
+
+    def bucket(self, type_code):
+        """Pool positions of the candidates of one type, in pool order."""
+        return self._buckets[type_code]
+
+    def counts(self):
+        """Candidates per type code."""
+        return [len(bucket) for bucket in self._buckets]
+
+    def match(self, types, bigfive=None, k=5, preference=DEFAULT_PREFERENCE, exclude=None):
+        """
+        Top-k partners for each query.
+
+        Args:
+            types: query type codes or MBTI type names.
+            bigfive: optional (Q, 5) query Big Five scores, used to order
+                candidates within a bucket (the pool needs scores too);
+                queries with NaN scores keep pool order.
+            k (int): partners per query.
+            preference: relation names, best first; other relations are
+                never matched.
+            exclude: optional pool position per query to leave out (the
+                query itself when matching pool members), -1 for none.
+
+        Returns:
+            dict of (Q, k) arrays: 'partners' (pool positions, -1 past the
+            last match), 'relations' (relation codes, 255 past the last
+            match) and 'distances' (Big Five distances, NaN when not
+            compared).
+        """
+        np = self._np
+        types = _type_codes(np, types)
+        q = len(types)
+        k = max(1, int(k))
+        codes = preference_codes(preference)
+        if bigfive is not None:
+            if self.bigfive is None:
+                raise ValueError("Big Five tie-breaking needs Big Five scores in the pool")
+            bigfive = np.asarray(bigfive, dtype=np.float64)
+            if bigfive.shape != (q, 5):
+                raise ValueError(f"Query Big Five scores must have shape ({q}, 5), got {bigfive.shape}")
+        if exclude is None:
+            exclude = np.full(q, -1, dtype=np.intp)
+        else:
+            exclude = np.asarray(exclude, dtype=np.intp)
+            if exclude.shape != (q,):
+                raise ValueError(f"Expected {q} excluded positions, got shape {exclude.shape}")
+
+        partners = np.full((q, k), -1, dtype=np.intp)
+        relations = np.full((q, k), 255, dtype=np.uint8)
+        distances = np.full((q, k), np.nan)
+        # Queries without complete scores take candidates in pool order
+        scored = None if bigfive is None else ~np.isnan(bigfive).any(axis=1)
+        for type_code in np.unique(types).tolist():
+            of_type = types == type_code
+            if scored is None:
+                groups = [(np.flatnonzero(of_type), None)]
+            else:
+                rows = np.flatnonzero(of_type & scored)
+                groups = [(rows, bigfive[rows]), (np.flatnonzero(of_type & ~scored), None)]
+            for rows, queries in groups:
+                if len(rows):
+                    self._match_type(type_code, rows, queries, k, codes, exclude, partners, relations, distances)
+        return {'partners': partners, 'relations': relations, 'distances': distances}
+
+    def _match_type(self, type_code, rows, queries, k, codes, exclude, partners, relations, distances):
+        """Fill the result rows of the queries of one type (queries: their Big Five scores or None)."""
+        np = self._np
+        # Candidate columns in preference order, gathered bucket by bucket
+        # until every row can have k partners (one spare for exclusion)
+        columns, column_relations, column_distances = [], [], []
+        width = 0
+        row_table = RELATION_TABLE[type_code << 4:(type_code + 1) << 4]
+        for code in codes:
+            if width >= k + 1:
+                break
+            partner_type = row_table.index(code)
+            bucket = self._buckets[partner_type]
+            take = min(len(bucket), k + 1)
+            if take == 0:
+                continue
+            if queries is None:
+                block = np.broadcast_to(bucket[:take], (len(rows), take))
+                block_distances = np.full((len(rows), take), np.nan)
+            else:
+                block, block_distances = self._nearest(partner_type, queries, take)
+            columns.append(block)
+            column_relations.append(np.full(take, code, dtype=np.uint8))
+            column_distances.append(block_distances)
+            width += take
+        if not columns:
+            return
+
+        candidates = np.concatenate(columns, axis=1)
+        candidate_relations = np.concatenate(column_relations)
+        candidate_distances = np.concatenate(column_distances, axis=1)
+        # Drop excluded candidates, then move the remaining ones left in order
+        valid = candidates != exclude[rows, None]
+        order = np.argsort(~valid, axis=1, kind='stable')[:, :k]
+        picked = np.take_along_axis(valid, order, axis=1)
+        n = order.shape[1]
+        partners[rows, :n] = np.where(picked, np.take_along_axis(candidates, order, axis=1), -1)
+        relations[rows, :n] = np.where(picked, candidate_relations[order], 255)
+        distances[rows, :n] = np.where(picked, np.take_along_axis(candidate_distances, order, axis=1), np.nan)
+
+    def _nearest(self, type_code, queries, take):
+        """(positions, distances) of the take nearest candidates of a bucket per query."""
+        np = self._np
+        bucket = self._buckets[type_code]
+        vectors = self._vectors[type_code]
+        norms = self._norms[type_code]
+        positions = np.empty((len(queries), take), dtype=np.intp)
+        distances = np.empty((len(queries), take))
+        step = max(1, _BLOCK_ELEMENTS // len(bucket))
+        for start in range(0, len(queries), step):
+            chunk = queries[start:start + step]
+            sq = (chunk ** 2).sum(axis=1)[:, None] - 2.0 * chunk @ vectors.T + norms
+            sq = np.where(np.isnan(sq), np.inf, np.maximum(sq, 0.0))
+            if take < len(bucket):
+                top = np.argpartition(sq, take - 1, axis=1)[:, :take]
+                # argpartition picks arbitrarily among candidates tied with
+                # the take-th distance; re-pick those rows in pool order
+                cutoff = np.take_along_axis(sq, top, axis=1).max(axis=1, keepdims=True)
+                ties = np.flatnonzero((sq <= cutoff).sum(axis=1) > take)
+                if len(ties):
+                    sq_ties, cutoff = sq[ties], cutoff[ties]
+                    closer = sq_ties < cutoff
+                    tied = sq_ties == cutoff
+                    room = take - closer.sum(axis=1, keepdims=True)
+                    chosen = closer | (tied & (np.cumsum(tied, axis=1) <= room))
+                    top[ties] = np.nonzero(chosen)[1].reshape(len(ties), take)
+            else:
+                top = np.broadcast_to(np.arange(take), sq.shape)
+            top_sq = np.take_along_axis(sq, top, axis=1)
+            # Nearest first; equal distances keep pool order
+            order = np.lexsort((top, top_sq), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_sq = np.take_along_axis(top_sq, order, axis=1)
+            rows = slice(start, start + len(chunk))
+            positions[rows] = bucket[top]
+            distances[rows] = np.where(np.isinf(top_sq), np.nan, np.sqrt(top_sq))
+        return positions, distances
+
+    def match_members(self, positions=None, k=5, preference=DEFAULT_PREFERENCE, use_bigfive=True):
+        """match() with pool members as the queries, each excluded from its own partners."""
+        np = self._np
+        if positions is None:
+            positions = np.arange(len(self))
+        positions = np.asarray(positions, dtype=np.intp)
+        bigfive = self.bigfive[positions] if use_bigfive and self.bigfive is not None else None
+        return self.match(self.types[positions], bigfive, k, preference, exclude=positions)
+
+    def describe(self, result, row):
+        """One query's partners as {'id', 'type', 'relation', 'distance'} dicts."""
+        partners = []
+        for position, relation, distance in zip(result['partners'][row].tolist(),
+                                                result['relations'][row].tolist(),
+                                                result['distances'][row].tolist()):
+            if position < 0:
+                break
+            partners.append({
+                'id': self.ids[position] if self.ids is not None else position,
+                'type': TYPE_NAMES[self.types[position]],
+                'relation': RELATIONS[relation],
+                'distance': None if math.isnan(distance) else round(distance, 2),
+            })
+        return partners
+
+
+def _column(header, names):
+    lowered = [column.strip().lower() for column in header]
+    return next((lowered.index(name) for name in names if name in lowered), None)
+
+
+def _parse_scores(values):
+    """Five floats, or None when any is missing or not a number."""
+    try:
+        scores = [float(value) for value in values]
+    except (TypeError, ValueError):
+        return None
+    return scores if len(scores) == 5 else None
+
+
+def read_profiles(lines, fmt):
+    """
+    (ids, types, bigfive, skipped) from CSV (with a header row) or JSONL
+    profiles with an optional id, a type and optional Big Five scores
+    (trait columns as for `aggregate`, or a JSONL "bigfive" list). ids
+    default to the profile's position; bigfive is None when no profile has
+    scores, else a list with None for profiles without them.
+    """
+    from core.aggregate import TRAIT_COLUMNS
+
+    ids, types, bigfive = [], [], []
+    skipped = 0
+
+    def add(profile_id, mbti_type, scores):
+        nonlocal skipped
+        code = TYPE_CODES.get(str(mbti_type).strip().upper())
+        if code is None:
+            skipped += 1
+            return
+        ids.append(len(ids) if profile_id is None else profile_id)
+        types.append(code)
+        bigfive.append(scores)
+
+    if fmt == 'csv':
+        reader = csv.reader(lines)
+        header = next(reader, None)
+        if header is None:
+            return [], [], None, 0
+        type_index = _column(header, TYPE_COLUMNS)
+        if type_index is None:
+            raise ValueError(f"Missing column: one of {', '.join(TYPE_COLUMNS)}")
+        id_index = _column(header, ID_COLUMNS)
+        trait_indexes = [_column(header, names) for names in TRAIT_COLUMNS]
+        if None in trait_indexes:
+            trait_indexes = None
+        for record in reader:
+            if not record:
+                continue
+            try:
+                scores = _parse_scores([record[i] for i in trait_indexes]) if trait_indexes else None
+                add(record[id_index] if id_index is not None else None, record[type_index], scores)
+            except IndexError:
+                skipped += 1
+    elif fmt == 'jsonl':
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                mbti_type = next(record[name] for name in TYPE_COLUMNS if name in record)
+            except (ValueError, TypeError, StopIteration):
+                skipped += 1
+                continue
+            if 'bigfive' in record:
+                scores = _parse_scores(record['bigfive'])
+            else:
+                values = [next((record[name] for name in names if name in record), None) for names in TRAIT_COLUMNS]
+                scores = _parse_scores(values) if None not in values else None
+            add(next((record[name] for name in ID_COLUMNS if name in record), None), mbti_type, scores)
+    else:
+        raise ValueError(f"Unknown input format: {fmt}")
+
+    if all(scores is None for scores in bigfive):
+        bigfive = None
+    return ids, types, bigfive, skipped
+
+
+def bigfive_array(np, bigfive):
+    """(N, 5) array from read_profiles scores, NaN rows for missing ones."""
+    if is_ndarray(bigfive):
+        return bigfive
+    nan_row = [math.nan] * 5
+    return np.array([nan_row if scores is None else scores for scores in bigfive], dtype=np.float64).reshape(-1, 5)
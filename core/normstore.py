@@ -0,0 +1,321 @@
+"""
+normstore.py
+
+Memory-mapped binary store for stratified Big Five norms.
+
+Norms are kept per cell of a type x age band x sex x country grid, each
+dimension also having an ANY ('*') label for the marginal cell. A cell holds
+the sample size and, per trait, the mean, SD and empirical quantiles.
+
+File layout (little-endian):
+
+    8 bytes   MAGIC
+    uint32    length of the JSON index
+    ...       JSON index: traits, quantile probabilities and the labels of
+              each dimension; padded to an 8-byte boundary
+    ...       one fixed-size record per grid cell, in row-major order of
+              DIMENSIONS: uint32 n, then float32 means of each trait, their
+              SDs, and each trait's quantiles in turn (NaN when unknown)
+
+The grid is dense, so a lookup is index arithmetic plus one struct unpack;
+nothing but the small index is parsed when the file is opened. The file is
+mapped read-only, so forked workers share its pages through the page cache.
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import weakref
+from functools import lru_cache
+
+MAGIC = b'EIDNORM\x01'
+DIMENSIONS = ('type', 'age', 'sex', 'country')
+ANY = '*'
+DEFAULT_QUANTILES = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+# Stored as float32; values are rounded to this many decimals when read so
+# norms such as 52.3 come back as written
+_DECIMALS = 4
+
+_HEADER = struct.Struct('<8sI')
+
+# Decoded cells kept per open store
+CELL_CACHE_SIZE = 4096
+
+
+def is_norm_store(path):
+    """True if path is a binary norms file (checked by its magic bytes)."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _data_offset(index_length):
+    """Records start at the first 8-byte boundary after the index."""
+    end = _HEADER.size + index_length
+    return end + (-end % 8)
+
+
+def _record_struct(n_traits, n_quantiles):
+    return struct.Struct(f'<I{n_traits * (2 + n_quantiles)}f')
+
+
+def _parse_age_band(label):
+    """(low, high) years covered by an age band label such as '18-24' or '65+'."""
+    if label.endswith('+'):
+        return float(label[:-1]), math.inf
+    low, _, high = label.partition('-')
+    return float(low), float(high)
+
+
+class NormCell:
+    """Norms of one stratum: sample size plus mean, SD and quantiles per trait."""
+
+    __slots__ = ('key', 'n', 'means', 'sds', 'quantiles')
+
+    def __init__(self, key, n, means, sds, quantiles):
+        self.key = key
+        self.n = n
+        self.means = means
+        self.sds = sds
+        self.quantiles = quantiles
+
+    def trait_means(self, traits):
+        """{trait: mean} for the traits that have a mean in this cell."""
+        return {trait: mean for trait, mean in zip(traits, self.means) if not math.isnan(mean)}
+
+    def __repr__(self):
+        return f"NormCell({self.key!r}, n={self.n})"
+
+
+class NormStore:
+    """
+    Read-only view of a binary norms file.
+
+        store = NormStore('norms.bin')
+        cell = store.lookup('INFJ', age=31, sex='F', country='US')
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, index_length = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a binary norms file")
+            index = json.loads(f.read(index_length).decode('utf-8'))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.traits = tuple(index['traits'])
+        self.quantile_probs = tuple(index['quantiles'])
+        self.labels = {dim: tuple(index['dimensions'][dim]) for dim in DIMENSIONS}
+        self._positions = {dim: {label: i for i, label in enumerate(labels)} for dim, labels in self.labels.items()}
+        self._age_bands = [
+            (_parse_age_band(label), label) for label in self.labels['age'] if label != ANY
+        ]
+
+        # Row-major strides over DIMENSIONS
+        self._strides = []
+        stride = 1
+        for dim in reversed(DIMENSIONS):
+            self._strides.insert(0, stride)
+            stride *= len(self.labels[dim])
+        self.cell_count = stride
+
+        self._record = _record_struct(len(self.traits), len(self.quantile_probs))
+        self._data_offset = _data_offset(index_length)
+        expected = self._data_offset + self.cell_count * self._record.size
+        if len(self._mmap) < expected:
+            raise ValueError(f"{path} is truncated: expected {expected} bytes, found {len(self._mmap)}")
+
+        # Decoded cells are small; keep the recently used ones. The cache
+        # holds the store weakly: a bound method would make a reference
+        # cycle, and the mapping would outlive the store until a GC pass.
+        store = weakref.ref(self)
+        self._read = lru_cache(maxsize=CELL_CACHE_SIZE)(lambda index: store()._read_cell(index))
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.cell_count
+
+    def age_band(self, age):
+        """Band label for an age in years, or the label itself if already one."""
+        if age is None:
+            return ANY
+        if isinstance(age, str) and not age.replace('.', '', 1).isdigit():
+            return age
+        years = float(age)
+        for (low, high), label in self._age_bands:
+            if low <= years <= high:
+                return label
+        return None
+
+    def _position(self, dim, label):
+        if label is None:
+            label = ANY
+        elif dim == 'type':
+            label = label.upper()
+        return self._positions[dim].get(label)
+
+    def cell(self, mbti_type=None, age=None, sex=None, country=None):
+        """The exact cell for these labels (None meaning ANY), or None if empty or unknown."""
+        labels = (mbti_type, self.age_band(age), sex, country)
+        index = 0
+        for dim, label, stride in zip(DIMENSIONS, labels, self._strides):
+            position = self._position(dim, label)
+            if position is None:
+                return None
+            index += position * stride
+        return self._read(index)
+
+    def lookup(self, mbti_type=None, age=None, sex=None, country=None):
+        """
+        Norms for the most specific populated stratum: the exact cell, else
+        the same cell with country, then sex, then age widened to ANY.
+        """
+        age = self.age_band(age) if age is not None else None
+        strata = [(age, sex, country), (age, sex, None), (age, None, None), (None, None, None)]
+        seen = set()
+        for stratum in strata:
+            if stratum in seen:
+                continue
+            seen.add(stratum)
+            cell = self.cell(mbti_type, *stratum)
+            if cell is not None:
+                return cell
+        return None
+
+    def _read_cell(self, index):
+        values = self._record.unpack_from(self._mmap, self._data_offset + index * self._record.size)
+        n_traits = len(self.traits)
+        stats = [round(v, _DECIMALS) if not math.isnan(v) else v for v in values[1:]]
+        means = stats[0:n_traits]
+        if all(math.isnan(mean) for mean in means):
+            return None
+        per_trait = len(self.quantile_probs)
+        quantile_start = 2 * n_traits
+        quantiles = [
+            tuple(stats[quantile_start + t * per_trait:quantile_start + (t + 1) * per_trait])
+            for t in range(n_traits)
+        ]
+        key = tuple(self.labels[dim][(index // stride) % len(self.labels[dim])]
+                    for dim, stride in zip(DIMENSIONS, self._strides))
+        return NormCell(key, values[0], tuple(means), tuple(stats[n_traits:2 * n_traits]), tuple(quantiles))
+
+    def type_means(self):
+        """{mbti_type: {trait: mean}} for the all-strata cell of each type, like the JSON norms."""
+        norms = {}
+        for mbti_type in self.labels['type']:
+            if mbti_type == ANY:
+                continue
+            cell = self.cell(mbti_type)
+            if cell is not None:
+                norms[mbti_type] = cell.trait_means(self.traits)
+        return norms
+
+
+def _sorted_labels(labels, dim):
+    labels = set(labels) - {ANY}
+    if dim == 'age':
+        ordered = sorted(labels, key=_parse_age_band)
+    else:
+        ordered = sorted(labels)
+    return [ANY] + ordered
+
+
+def write_norm_store(path, cells, traits, quantiles=DEFAULT_QUANTILES):
+    """
+    Write cells to a binary norms file.
+
+    Args:
+        cells: iterable of dicts with optional 'type', 'age', 'sex' and
+            'country' labels (missing means ANY), an optional 'n', and per
+            trait a {'mean', 'sd', 'quantiles'} dict (missing stats are NaN).
+        traits: trait names in storage order.
+        quantiles: probabilities of the stored quantiles.
+
+    Returns:
+        int: number of populated cells.
+    """
+    cells = list(cells)
+    labels = {dim: _sorted_labels((cell.get(dim) or ANY for cell in cells), dim) for dim in DIMENSIONS}
+    labels['type'] = [ANY] + sorted({label.upper() for label in labels['type']} - {ANY})
+    positions = {dim: {label: i for i, label in enumerate(values)} for dim, values in labels.items()}
+    strides = []
+    stride = 1
+    for dim in reversed(DIMENSIONS):
+        strides.insert(0, stride)
+        stride *= len(labels[dim])
+    cell_count = stride
+
+    record = _record_struct(len(traits), len(quantiles))
+    nan = float('nan')
+    index = {'traits': list(traits), 'quantiles': list(quantiles), 'dimensions': labels}
+    index_bytes = json.dumps(index).encode('utf-8')
+    data_offset = _data_offset(len(index_bytes))
+
+    n_stats = len(traits) * (2 + len(quantiles))
+    data = bytearray(record.pack(0, *([nan] * n_stats)) * cell_count)
+    populated = 0
+    for cell in cells:
+        offset = 0
+        for dim, stride in zip(DIMENSIONS, strides):
+            label = cell.get(dim) or ANY
+            offset += positions[dim][label.upper() if dim == 'type' else label] * stride
+        means, sds, quantile_values = [], [], []
+        for trait in traits:
+            stats = cell.get(trait) or {}
+            means.append(nan if stats.get('mean') is None else float(stats['mean']))
+            sds.append(nan if stats.get('sd') is None else float(stats['sd']))
+            values = stats.get('quantiles') or [nan] * len(quantiles)
+            if len(values) != len(quantiles):
+                raise ValueError(f"{trait} has {len(values)} quantiles, expected {len(quantiles)}")
+            quantile_values.extend(nan if v is None else float(v) for v in values)
+        record.pack_into(data, offset * record.size, int(cell.get('n') or 0), *means, *sds, *quantile_values)
+        populated += 1
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(index_bytes)))
+        f.write(index_bytes)
+        f.write(b'\0' * (data_offset - _HEADER.size - len(index_bytes)))
+        f.write(data)
+    os.replace(tmp_path, path)
+    return populated
+
+
+def read_json_norms(path):
+    """
+    Cells and quantile probabilities from a JSON norms file, either the flat
+    {TYPE: {trait: mean}} format or the stratified format:
+
+        {"quantiles": [0.1, 0.5, 0.9],
+         "cells": [{"type": "INFJ", "age": "18-24", "sex": "F", "country": "US", "n": 120,
+                    "openness": {"mean": 66.0, "sd": 9.5, "quantiles": [54.0, 66.0, 78.0]}, ...}]}
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if 'cells' in data:
+        return data['cells'], tuple(data.get('quantiles', DEFAULT_QUANTILES))
+    cells = [
+        {'type': mbti_type, **{trait: {'mean': mean} for trait, mean in means.items()}}
+        for mbti_type, means in data.items()
+    ]
+    return cells, DEFAULT_QUANTILES
+
+
+def convert_json_norms(json_path, out_path, traits):
+    """Convert a JSON norms file to the binary store; returns the populated cell count."""
+    cells, quantiles = read_json_norms(json_path)
+    return write_norm_store(out_path, cells, traits, quantiles)
@@ -0,0 +1,584 @@
+"""
+profilestore.py
+
+Compact binary store for assessed profiles (MBTI type, five Big Five trait
+scores, optionally a four-function stack), read back as memory-mapped
+columns.
+
+A profile takes 1 byte for its type code, 5 x 2 bytes (float16) or
+5 x 1 byte (uint8, whole points) for its traits, and 2 more bytes for the
+packed stack key (see core.functions.pack_stack) when the store has stacks:
+13 bytes per profile at most, against 30-60 for the same row in CSV.
+
+File layout (little-endian):
+
+    8 bytes   MAGIC
+    uint32    length of the JSON index
+    ...       JSON index: profile count, trait names, trait encoding and
+              whether stacks are stored; padded to an 8-byte boundary
+    ...       columns, each starting on an 8-byte boundary:
+              uint8 type codes; one column per trait in TRAITS order
+              (float16, NaN when missing, or uint8, 255 when missing);
+              uint16 packed stacks (0xFFFF when missing) if stored
+
+Columns are stored one after another rather than row by row, so filtering
+on the type reads only N bytes, and each column is handed out as a
+read-only NumPy view of the mapping without copying or per-row objects.
+The views plug straight into the bulk APIs:
+
+    store = ProfileStore('profiles.bin')
+    rows = store.select(types=['INFJ', 'INTJ'], ranges={'openness': (60, None)})
+    batch = store.bigfive_batch(rows)                 # BigFiveBatch
+    ranked = infer_mbti_from_bigfive(store.scores(rows))
+    stacks = store.infer_stacks(rows)                 # infer_many columns
+    relations = relation_matrix(store.types[rows], [type_to_code('ENTP')])
+"""
+
+import csv
+import json
+import math
+import mmap
+import os
+import re
+import struct
+
+from core.aggregate import TRAIT_COLUMNS, TYPE_COLUMNS
+from core.bigfive import TRAITS
+from core.compat import require_numpy
+from core.typecode import TYPE_CODES, type_to_code
+
+MAGIC = b'EIDPROF\x01'
+
+# Trait encoding name -> NumPy dtype
+TRAIT_DTYPES = {
+    'float16': '<f2',
+    'uint8': 'u1',
+}
+DEFAULT_TRAIT_DTYPE = 'float16'
+
+# Missing values: a uint8 trait of 255 (scores are 0-100) and a stack key of
+# 0xFFFF (keys are 0-4095); float16 traits use NaN
+MISSING_UINT8 = 255
+MISSING_STACK = 0xFFFF
+
+SCORE_MIN, SCORE_MAX = 0.0, 100.0
+# float16 trait bounds are clipped to +-this before rounding (float16 overflows past 65504)
+FLOAT16_CLIP = 1000.0
+
+STACK_COLUMNS = ('stack', 'functions')
+
+_HEADER = struct.Struct('<8sI')
+
+# Up to this many types are filtered with == comparisons, more with a
+# byte translation table
+_EQUALITY_TYPES = 3
+
+
+def is_profile_store(path):
+    """True if path is a binary profile store (checked by its magic bytes)."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _align(offset):
+    return offset + (-offset % 8)
+
+
+def _column_offsets(data_offset, count, trait_dtype, n_traits, stacks):
+    """Offsets of the type column, each trait column and the stack column (or None)."""
+    itemsize = 2 if trait_dtype == 'float16' else 1
+    offset = data_offset
+    types_offset = offset
+    offset = _align(offset + count)
+    trait_offsets = []
+    for _ in range(n_traits):
+        trait_offsets.append(offset)
+        offset = _align(offset + count * itemsize)
+    stack_offset = None
+    if stacks:
+        stack_offset = offset
+        offset = _align(offset + count * 2)
+    return types_offset, trait_offsets, stack_offset, offset
+
+
+def encode_traits(np, scores, trait_dtype=DEFAULT_TRAIT_DTYPE):
+    """
+    (N, 5) scores as stored traits: float16, or uint8 rounded to whole
+    points with MISSING_UINT8 for NaN. Scores outside 0-100 raise ValueError.
+    """
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1, len(TRAITS))
+    missing = np.isnan(scores)
+    bad = ~missing & ((scores < SCORE_MIN) | (scores > SCORE_MAX))
+    if bad.any():
+        row, col = (int(i) for i in np.argwhere(bad)[0])
+        raise ValueError(f"Invalid {TRAITS[col]} value: {scores[row, col]} in row {row}. Must be between 0 and 100.")
+    if trait_dtype == 'float16':
+        return scores.astype(TRAIT_DTYPES['float16'])
+    if trait_dtype == 'uint8':
+        encoded = np.rint(np.where(missing, 0.0, scores)).astype(np.uint8)
+        encoded[missing] = MISSING_UINT8
+        return encoded
+    raise ValueError(f"Unknown trait encoding: {trait_dtype} (expected one of {', '.join(TRAIT_DTYPES)})")
+
+
+class ProfileWriter:
+    """
+    Writes a profile store, buffering encoded columns in memory (at most
+    13 bytes per profile) until close().
+
+        with ProfileWriter('profiles.bin', stacks=True) as writer:
+            writer.add('INFJ', [66, 58, 35, 71, 52], ['Ni', 'Fe', 'Ti', 'Se'])
+            writer.add_many(type_codes, scores)
+
+    The file is written to a temporary path and renamed into place, so
+    readers never see a partial store; nothing is written if the with
+    block raises.
+    """
+
+    def __init__(self, path, trait_dtype=DEFAULT_TRAIT_DTYPE, stacks=False, chunk_size=65536):
+        self.np = require_numpy("ProfileWriter")
+        if trait_dtype not in TRAIT_DTYPES:
+            raise ValueError(f"Unknown trait encoding: {trait_dtype} (expected one of {', '.join(TRAIT_DTYPES)})")
+        self.path = path
+        self.trait_dtype = trait_dtype
+        self.stacks = stacks
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._chunks = []
+        self._types, self._scores, self._stacks = [], [], []
+
+    def add(self, mbti_type, scores=None, stack=None):
+        """
+        Add one profile: a type (string or code), five scores (None or
+        NaN entries for missing ones) and, for stores with stacks, a
+        four-function stack or packed key.
+        """
+        code = type_to_code(mbti_type) if isinstance(mbti_type, str) else int(mbti_type)
+        if not 0 <= code <= 15:
+            raise ValueError(f"Invalid type code: {code}")
+        self._types.append(code)
+        if scores is None:
+            self._scores.append([math.nan] * len(TRAITS))
+        else:
+            scores = [math.nan if score is None else score for score in scores]
+            if len(scores) != len(TRAITS):
+                raise ValueError(f"Expected {len(TRAITS)} scores, got {len(scores)}")
+            self._scores.append(scores)
+        if self.stacks:
+            self._stacks.append(_stack_key(stack))
+        if len(self._types) >= self.chunk_size:
+            self._flush()
+
+    def add_many(self, types, scores=None, stacks=None):
+        """Add arrays of type codes, (N, 5) scores and packed stack keys."""
+        np = self.np
+        self._flush()
+        types = np.asarray(types)
+        if types.dtype.kind not in 'iu':
+            types = np.array([type_to_code(t) for t in types.tolist()], dtype=np.int64)
+        types = types.ravel()
+        if types.size and (types.min() < 0 or types.max() > 15):
+            raise ValueError("Type codes must be in range 0-15")
+        n = len(types)
+        if scores is None:
+            scores = np.full((n, len(TRAITS)), np.nan)
+        encoded = encode_traits(np, scores, self.trait_dtype)
+        if len(encoded) != n:
+            raise ValueError(f"Expected {n} score rows, got {len(encoded)}")
+        keys = None
+        if self.stacks:
+            if stacks is None:
+                keys = np.full(n, MISSING_STACK, dtype='<u2')
+            else:
+                keys = np.asarray(stacks).ravel()
+                invalid = (keys < 0) | ((keys > 4095) & (keys != MISSING_STACK))
+                if len(keys) != n or invalid.any():
+                    raise ValueError("Stacks must be one packed key (0-4095, or MISSING_STACK) per profile")
+                keys = keys.astype('<u2')
+        self._chunks.append((types.astype(np.uint8), encoded, keys))
+        self.count += n
+
+    def _flush(self):
+        if not self._types:
+            return
+        np = self.np
+        keys = np.array(self._stacks, dtype='<u2') if self.stacks else None
+        encoded = encode_traits(np, self._scores, self.trait_dtype)
+        self._chunks.append((np.array(self._types, dtype=np.uint8), encoded, keys))
+        self.count += len(self._types)
+        self._types, self._scores, self._stacks = [], [], []
+
+    def close(self):
+        """Write the store; returns the number of profiles."""
+        np = self.np
+        self._flush()
+        index = {
+            'count': self.count,
+            'traits': list(TRAITS),
+            'trait_dtype': self.trait_dtype,
+            'stacks': self.stacks,
+        }
+        index_bytes = json.dumps(index).encode('utf-8')
+        data_offset = _align(_HEADER.size + len(index_bytes))
+        _, _, _, end = _column_offsets(data_offset, self.count, self.trait_dtype, len(TRAITS), self.stacks)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, len(index_bytes)))
+            f.write(index_bytes)
+            f.write(b'\0' * (data_offset - f.tell()))
+            columns = [lambda chunk: chunk[0]]
+            columns += [lambda chunk, t=t: chunk[1][:, t] for t in range(len(TRAITS))]
+            if self.stacks:
+                columns.append(lambda chunk: chunk[2])
+            for column in columns:
+                for chunk in self._chunks:
+                    f.write(np.ascontiguousarray(column(chunk)).tobytes())
+                f.write(b'\0' * (-f.tell() % 8))
+            if f.tell() != end:
+                raise AssertionError(f"Profile store layout mismatch: wrote {f.tell()} bytes, expected {end}")
+        os.replace(tmp_path, self.path)
+        self._chunks = []
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+def write_profile_store(path, types, scores=None, stacks=None, trait_dtype=DEFAULT_TRAIT_DTYPE):
+    """Write type codes, (N, 5) scores and optional packed stacks to a store; returns the count."""
+    writer = ProfileWriter(path, trait_dtype, stacks=stacks is not None)
+    writer.add_many(types, scores, stacks)
+    return writer.close()
+
+
+class ProfileStore:
+    """
+    Read-only, memory-mapped columns of a profile store.
+
+    types, trait_column() and stacks are zero-copy views of the file;
+    scores() decodes traits to float64. Row selections are integer index
+    arrays as returned by select(), boolean masks or slices. The file is mapped
+    read-only, so forked workers share its pages through the page cache.
+    """
+
+    def __init__(self, path):
+        np = require_numpy("ProfileStore")
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, index_length = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a binary profile store")
+            index = json.loads(f.read(index_length).decode('utf-8'))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.count = index['count']
+        self.traits = tuple(index['traits'])
+        self.trait_dtype = index['trait_dtype']
+        self.has_stacks = index['stacks']
+        if self.trait_dtype not in TRAIT_DTYPES:
+            raise ValueError(f"{path} has unknown trait encoding {self.trait_dtype}")
+        if self.traits != TRAITS:
+            raise ValueError(f"{path} stores traits {', '.join(self.traits)}, expected {', '.join(TRAITS)}")
+
+        types_offset, trait_offsets, stack_offset, end = _column_offsets(
+            _align(_HEADER.size + index_length), self.count, self.trait_dtype, len(self.traits), self.has_stacks
+        )
+        if len(self._mmap) < end:
+            raise ValueError(f"{path} is truncated: expected {end} bytes, found {len(self._mmap)}")
+        buffer = self._mmap
+        self.types = np.frombuffer(buffer, dtype=np.uint8, count=self.count, offset=types_offset)
+        dtype = np.dtype(TRAIT_DTYPES[self.trait_dtype])
+        self._trait_columns = tuple(
+            np.frombuffer(buffer, dtype=dtype, count=self.count, offset=offset) for offset in trait_offsets
+        )
+        self.stacks = None
+        if self.has_stacks:
+            self.stacks = np.frombuffer(buffer, dtype='<u2', count=self.count, offset=stack_offset)
+
+    def close(self):
+        """
+        Drop the store's views and unmap the file. If arrays taken from the
+        store are still referenced, the mapping stays until they are freed.
+        """
+        self.types = self.stacks = None
+        self._trait_columns = ()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def chunks(self, chunk_size=65536):
+        """Slices covering all rows in chunks, for decoding a large store piece by piece."""
+        return [slice(start, min(start + chunk_size, self.count)) for start in range(0, self.count, chunk_size)]
+
+    def trait_column(self, trait):
+        """Stored values of one trait (a name from TRAITS or its index), undecoded."""
+        position = self.traits.index(trait) if isinstance(trait, str) else trait
+        return self._trait_columns[position]
+
+    def scores(self, rows=None):
+        """(N, 5) float64 scores of the selected rows (all by default), NaN where missing."""
+        np = require_numpy("ProfileStore")
+        n = self.count if rows is None else len(self.types[rows])
+        out = np.empty((n, len(self.traits)))
+        for t, column in enumerate(self._trait_columns):
+            values = column if rows is None else column[rows]
+            out[:, t] = values
+            if self.trait_dtype == 'uint8':
+                out[values == MISSING_UINT8, t] = np.nan
+        return out
+
+    def stack_keys(self, rows=None):
+        """Packed stack keys of the selected rows, MISSING_STACK where unknown."""
+        if self.stacks is None:
+            raise ValueError(f"{self.path} has no stacks")
+        return self.stacks if rows is None else self.stacks[rows]
+
+    def type_mask(self, types):
+        """Boolean mask of rows whose type is one of types (strings or codes)."""
+        np = require_numpy("ProfileStore")
+        codes = sorted({type_to_code(t) if isinstance(t, str) else int(t) for t in types})
+        if len(codes) <= _EQUALITY_TYPES:
+            mask = np.zeros(self.count, dtype=bool)
+            for code in codes:
+                mask |= self.types == code
+            return mask
+        # One C-level pass over the type bytes
+        table = bytearray(256)
+        for code in codes:
+            table[code] = 1
+        return np.frombuffer(bytearray(self.types.tobytes().translate(table)), dtype=bool)
+
+    def trait_mask(self, trait, low=None, high=None):
+        """
+        Boolean mask of rows whose stored trait lies in [low, high] (either
+        bound may be None). Missing values never match. Bounds are compared
+        with the stored values directly, without decoding the column.
+        """
+        np = require_numpy("ProfileStore")
+        column = self.trait_column(trait)
+        if self.trait_dtype == 'uint8':
+            # Stored values are whole points; the upper bound is always
+            # applied so missing values (255) never match
+            high = math.floor(SCORE_MAX if high is None else min(high, SCORE_MAX))
+            low = None if low is None or low <= SCORE_MIN else math.ceil(low)
+            if high < 0 or (low is not None and low > high):
+                return np.zeros(self.count, dtype=bool)
+            low = None if low is None else np.uint8(low)
+            high = np.uint8(high)
+        else:
+            # Bounds are rounded to float16 like the stored values, so a
+            # value packed equal to a bound still matches it. Clipping
+            # (well outside the score range) keeps them finite in float16.
+            low = None if low is None else np.float16(min(max(low, -FLOAT16_CLIP), FLOAT16_CLIP))
+            high = None if high is None else np.float16(min(max(high, -FLOAT16_CLIP), FLOAT16_CLIP))
+        if low is None and high is None:
+            # NaN fails the comparison
+            return column == column
+        if low is None:
+            return column <= high
+        mask = column >= low
+        if high is not None:
+            mask &= column <= high
+        return mask
+
+    def mask(self, types=None, ranges=None):
+        """Boolean mask of rows matching types (if given) and every trait range in {trait: (low, high)}."""
+        np = require_numpy("ProfileStore")
+        mask = self.type_mask(types) if types is not None else None
+        for trait, (low, high) in (ranges or {}).items():
+            trait_mask = self.trait_mask(trait, low, high)
+            mask = trait_mask if mask is None else mask & trait_mask
+        return np.ones(self.count, dtype=bool) if mask is None else mask
+
+    def select(self, types=None, ranges=None):
+        """Indexes of the rows matching mask(types, ranges), in store order."""
+        np = require_numpy("ProfileStore")
+        return np.flatnonzero(self.mask(types, ranges))
+
+    def complete(self, rows=None):
+        """Indexes of the profiles (among rows, if given) with all five scores."""
+        np = require_numpy("ProfileStore")
+        rows = _row_indexes(np, rows, self.count)
+        present = np.ones(self.count if rows is None else len(rows), dtype=bool)
+        for column in self._trait_columns:
+            values = column if rows is None else column[rows]
+            present &= values != MISSING_UINT8 if self.trait_dtype == 'uint8' else values == values
+        return np.flatnonzero(present) if rows is None else rows[present]
+
+    def type_counts(self, rows=None):
+        """Profiles per type code, as 16 counts."""
+        np = require_numpy("ProfileStore")
+        types = self.types if rows is None else self.types[rows]
+        return np.bincount(types, minlength=16)[:16]
+
+    def bigfive_batch(self, rows=None):
+        """BigFiveBatch over the selected rows' scores and types."""
+        from core.bigfive import BigFiveBatch
+        types = self.types if rows is None else self.types[rows]
+        return BigFiveBatch(self.scores(rows), types)
+
+    def infer_stacks(self, rows=None):
+        """
+        infer_many() over the stacks of the selected rows, plus 'rows': the
+        indexes of the profiles that have a stack.
+        """
+        from core.functions import infer_many
+        np = require_numpy("ProfileStore")
+        rows = _row_indexes(np, rows, self.count)
+        keys = self.stack_keys(rows)
+        known = np.flatnonzero(keys != MISSING_STACK)
+        result = infer_many(keys[known])
+        result['rows'] = known if rows is None else rows[known]
+        return result
+
+
+def _row_indexes(np, rows, count):
+    """Row selection (indexes, boolean mask or slice) as an index array; None stays None."""
+    if rows is None:
+        return None
+    if isinstance(rows, slice):
+        return np.arange(*rows.indices(count))
+    rows = np.asarray(rows)
+    return np.flatnonzero(rows) if rows.dtype == bool else rows
+
+
+def _stack_key(stack):
+    """Packed key of a stack (list of four functions, or a key), MISSING_STACK if None."""
+    if stack is None:
+        return MISSING_STACK
+    if isinstance(stack, int):
+        if not 0 <= stack <= 4095:
+            raise ValueError(f"Packed stack keys must be in range 0-4095, got {stack}")
+        return stack
+    from core.functions import pack_stack
+    return pack_stack(stack)
+
+
+def _parse_stack(value):
+    """Packed key of a stack given as a list or a 'Ni Fe Ti Se' / 'Ni-Fe-Ti-Se' string, or MISSING_STACK."""
+    if isinstance(value, str):
+        value = [part for part in re.split(r'[^A-Za-z]+', value) if part]
+    if not isinstance(value, list) or len(value) != 4:
+        return MISSING_STACK
+    from core.functions import pack_stack
+    try:
+        return pack_stack([str(function) for function in value])
+    except (KeyError, ValueError):
+        return MISSING_STACK
+
+
+def _parse_scores(values):
+    """Five floats in 0-100 (NaN for missing or empty values), or None if any is invalid."""
+    scores = []
+    for value in values:
+        if value is None or value == '':
+            scores.append(math.nan)
+            continue
+        try:
+            score = float(value)
+        except (TypeError, ValueError):
+            return None
+        if not SCORE_MIN <= score <= SCORE_MAX:
+            return None
+        scores.append(score)
+    return scores
+
+
+def _lower_index(header, names):
+    lowered = [column.strip().lower() for column in header]
+    return next((lowered.index(name) for name in names if name in lowered), None)
+
+
+def iter_csv_profiles(lines):
+    """
+    Yield (type code, scores, stack key) or None (invalid row) from CSV with
+    a header row: a type column, optional trait columns (as for
+    `aggregate`) and an optional stack column.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    type_index = _lower_index(header, TYPE_COLUMNS)
+    if type_index is None:
+        raise ValueError(f"Missing column: one of {', '.join(TYPE_COLUMNS)}")
+    trait_indexes = [_lower_index(header, names) for names in TRAIT_COLUMNS]
+    stack_index = _lower_index(header, STACK_COLUMNS)
+    for record in reader:
+        if not record:
+            continue
+        try:
+            code = TYPE_CODES.get(record[type_index].strip().upper())
+            scores = _parse_scores([None if i is None else record[i] for i in trait_indexes])
+            stack = _parse_stack(record[stack_index]) if stack_index is not None else MISSING_STACK
+        except IndexError:
+            yield None
+            continue
+        yield None if code is None or scores is None else (code, scores, stack)
+
+
+def iter_jsonl_profiles(lines):
+    """
+    Yield (type code, scores, stack key) or None (invalid row) from JSONL
+    objects with a type field, optional trait fields or "bigfive" list and
+    an optional "stack".
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+            mbti_type = next(record[name] for name in TYPE_COLUMNS if name in record)
+            code = TYPE_CODES.get(str(mbti_type).strip().upper())
+            if 'bigfive' in record:
+                values = record['bigfive']
+                if len(values) != len(TRAIT_COLUMNS):
+                    raise ValueError
+            else:
+                values = [next((record[name] for name in names if name in record), None) for names in TRAIT_COLUMNS]
+            stack = next((record[name] for name in STACK_COLUMNS if name in record), None)
+        except (ValueError, TypeError, AttributeError, StopIteration):
+            yield None
+            continue
+        scores = _parse_scores(values)
+        yield None if code is None or scores is None else (code, scores, _parse_stack(stack))
+
+
+def iter_profiles(lines, fmt):
+    """Profiles of a 'csv' or 'jsonl' stream."""
+    if fmt == 'csv':
+        return iter_csv_profiles(lines)
+    if fmt == 'jsonl':
+        return iter_jsonl_profiles(lines)
+    raise ValueError(f"Unknown input format: {fmt}")
+
+
+def pack_profiles(writer, rows):
+    """Add iter_profiles() rows to a ProfileWriter; returns the number of invalid rows skipped."""
+    skipped = 0
+    for row in rows:
+        if row is None:
+            skipped += 1
+            continue
+        code, scores, stack = row
+        writer.add(code, scores, stack if stack != MISSING_STACK else None)
+    return skipped
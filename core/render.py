@@ -0,0 +1,395 @@
+"""
+render.py
+
+Renderers turning result objects (core.results) into text, JSON lines,
+CSV or a MessagePack stream, all through one buffered OutputWriter per run.
+
+Compute functions never format; only a renderer does, so library callers
+that use the result objects directly pay no string-formatting cost. The
+text renderer reproduces the CLI's report format exactly.
+
+    writer = OutputWriter(sys.stdout)
+    renderer = get_renderer('json', writer)
+    for result in results:
+        renderer.render(result)
+    writer.close()
+"""
+
+import struct
+import sys
+
+from core.results import (
+    BigFiveReport, CBTAnalysis, Relation, StackInference, TypeAnalysis, TypeProbability,
+    TypeRanking,
+)
+
+FORMATS = ('text', 'json', 'csv', 'msgpack')
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+
+class OutputWriter:
+    """
+    Collects output pieces and writes them to the stream in large blocks.
+
+    stream is a text stream for str output, or a binary stream (or a text
+    stream with a .buffer, such as sys.stdout) when binary is true.
+    close() flushes but leaves standard streams open.
+    """
+
+    def __init__(self, stream=None, binary=False, buffer_size=DEFAULT_BUFFER_SIZE):
+        if stream is None:
+            stream = sys.stdout
+        if binary and hasattr(stream, 'buffer'):
+            stream.flush()
+            stream = stream.buffer
+        self.stream = stream
+        self.binary = binary
+        self.buffer_size = buffer_size
+        self._pieces = []
+        self._size = 0
+
+    def write(self, data):
+        self._pieces.append(data)
+        self._size += len(data)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._pieces:
+            joiner = b'' if self.binary else ''
+            self.stream.write(joiner.join(self._pieces))
+            self._pieces.clear()
+            self._size = 0
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+        if self.stream not in (sys.stdout, sys.stderr, getattr(sys.stdout, 'buffer', None)):
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# Text ---------------------------------------------------------------------
+
+def _type_analysis_lines(result):
+    if result.socionics is not None:
+        lines = [f"Analysis for {result.type} (MBTI):"]
+    else:
+        lines = [f"Analysis for {result.type}:"]
+    for role in result.roles:
+        lines.append(f"{role.role.capitalize()}: {'-'.join(role.stack)}  (MBTI: {role.mbti})")
+    if result.compare_to is not None and result.socionics is not None:
+        lines.append("")
+        lines.append(f"Socionics Relation between {result.type} and {result.compare_to}: {result.relation}")
+    return lines
+
+
+def _stack_inference_lines(result):
+    if result.exact_match:
+        return [f"MBTI Type: {result.type}"]
+    return [
+        f"Closest MBTI: {result.type} (confidence: {result.confidence}%)",
+        f"Expected stack: {'-'.join(result.closest_stack)}",
+        f"Differences in positions: {', '.join(map(str, result.differences))}",
+    ]
+
+
+def _type_ranking_lines(result):
+    if result.types and isinstance(result.types[0], TypeProbability):
+        lines = ["MBTI type probabilities:"]
+        lines.extend(
+            f"{rank}. {match.type} (probability: {match.probability * 100:.1f}%, score: {match.score})"
+            for rank, match in enumerate(result.types, 1)
+        )
+        return lines
+    lines = ["Closest MBTI types from Big Five:"]
+    lines.extend(
+        f"{rank}. {match.type} (distance: {match.distance}, confidence: {match.confidence}%)"
+        for rank, match in enumerate(result.types, 1)
+    )
+    return lines
+
+
+def _relation_lines(result):
+    return [f"Socionics Relation between {result.type} and {result.compare_to}: {result.relation}"]
+
+
+def _bigfive_lines(result):
+    if result.norms == 'type':
+        lines = [f"Using MBTI type-specific norms for {result.mbti_type}:"]
+        for t in result.traits:
+            if t.norm is None:
+                lines.append(f"{t.trait.title()}: {t.score:.1f} (No norm available)")
+                continue
+            line = f"{t.trait.title()}: {t.score:.1f} (Type norm: {t.norm}, Deviation: {t.deviation:+.1f}"
+            if t.percentile is not None:
+                line += f", Percentile: {t.percentile}%"
+            lines.append(line + ")")
+        return lines
+    lines = ["Using general population norms:"]
+    lines.extend(
+        f"{t.trait.title()}: {t.score:.1f} (Norm: {t.norm}, Deviation: {t.deviation:+.1f}, "
+        f"Percentile: {t.percentile}%)"
+        for t in result.traits
+    )
+    return lines
+
+
+def _cbt_lines(result):
+    if not result.distortions:
+        return ["No common cognitive distortions detected."]
+    lines = ["Detected cognitive distortions:"]
+    for hit in result.distortions:
+        lines.append(f"- {hit.name}: {hit.description}")
+        lines.append(f"  Suggested reframe: {hit.reframe}")
+    return lines
+
+
+_TEXT_LINES = {
+    TypeAnalysis: _type_analysis_lines,
+    StackInference: _stack_inference_lines,
+    TypeRanking: _type_ranking_lines,
+    Relation: _relation_lines,
+    BigFiveReport: _bigfive_lines,
+    CBTAnalysis: _cbt_lines,
+}
+
+
+def text_lines(result):
+    """Report lines of a result, as the CLI prints them."""
+    try:
+        format_lines = _TEXT_LINES[type(result)]
+    except KeyError:
+        raise TypeError(f"No text format for {type(result).__name__}") from None
+    return format_lines(result)
+
+
+class TextRenderer:
+    """Human-readable reports; section() writes a blank line and a title."""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def section(self, title):
+        self.writer.write(f"\n{title}:\n")
+
+    def render(self, result):
+        self.writer.write("\n".join(text_lines(result)) + "\n")
+
+    def line(self, text):
+        """Free text that belongs to the report (separators, messages)."""
+        self.writer.write(text + "\n")
+
+
+class _StructuredRenderer:
+    """Base for the machine-readable renderers: sections and free text are dropped."""
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def section(self, title):
+        pass
+
+    def line(self, text):
+        pass
+
+
+# JSON lines ---------------------------------------------------------------
+
+class JSONRenderer(_StructuredRenderer):
+    """One JSON object per result: {"kind": ..., fields...}."""
+
+    def __init__(self, writer):
+        import json
+        super().__init__(writer)
+        self._encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+    def render(self, result):
+        record = {'kind': result.kind}
+        record.update(result.to_dict())
+        self.writer.write(self._encode(record) + "\n")
+
+
+# CSV ----------------------------------------------------------------------
+
+def _csv_type_analysis(result):
+    return [(result.type, role.role, '-'.join(role.stack), role.mbti, result.socionics, result.compare_to,
+             result.relation) for role in result.roles]
+
+
+def _csv_stack_inference(result):
+    return [(result.type, result.exact_match, result.confidence, '-'.join(result.closest_stack),
+             ' '.join(map(str, result.differences)))]
+
+
+def _csv_type_ranking(result):
+    return [(rank, match.type, *(getattr(match, name) for name in match.__slots__[1:]))
+            for rank, match in enumerate(result.types, 1)]
+
+
+def _csv_bigfive(result):
+    return [(result.mbti_type, result.norms, t.trait, t.score, t.norm, t.deviation, t.percentile)
+            for t in result.traits]
+
+
+def _csv_cbt(result):
+    return [(hit.name, len(hit.spans), ' '.join(f"{start}-{end}" for start, end in hit.spans))
+            for hit in result.distortions]
+
+
+# Result class -> (header function, rows function); the header may depend
+# on the result (rankings of matches vs probabilities)
+_CSV = {
+    TypeAnalysis: (lambda r: ('type', 'role', 'stack', 'mbti', 'socionics', 'compare_to', 'relation'),
+                   _csv_type_analysis),
+    StackInference: (lambda r: ('type', 'exact_match', 'confidence', 'closest_stack', 'differences'),
+                     _csv_stack_inference),
+    TypeRanking: (lambda r: ('rank', 'type', 'score', 'probability') if r.types and isinstance(r.types[0], TypeProbability)
+                  else ('rank', 'type', 'distance', 'confidence'),
+                  _csv_type_ranking),
+    Relation: (lambda r: ('type', 'compare_to', 'relation'), lambda r: [(r.type, r.compare_to, r.relation)]),
+    BigFiveReport: (lambda r: ('mbti_type', 'norms', 'trait', 'score', 'norm', 'deviation', 'percentile'),
+                    _csv_bigfive),
+    CBTAnalysis: (lambda r: ('distortion', 'matches', 'spans'), _csv_cbt),
+}
+
+
+class CSVRenderer(_StructuredRenderer):
+    """Flat CSV rows; a header row is written whenever the kind of result changes."""
+
+    def __init__(self, writer):
+        import csv
+        super().__init__(writer)
+        self._csv = csv.writer(writer, lineterminator="\n")
+        self._header = None
+
+    def render(self, result):
+        try:
+            header, rows = _CSV[type(result)]
+        except KeyError:
+            raise TypeError(f"No CSV format for {type(result).__name__}") from None
+        header = header(result)
+        if header != self._header:
+            self._csv.writerow(header)
+            self._header = header
+        self._csv.writerows(rows(result))
+
+
+# MessagePack --------------------------------------------------------------
+
+def packb(obj):
+    """
+    Encode a JSON-like value (None, bool, int, float, str, bytes, lists,
+    tuples and dicts) in the MessagePack format.
+    """
+    out = []
+    _pack(obj, out.append)
+    return b''.join(out)
+
+
+def _pack(obj, write):
+    if obj is None:
+        write(b'\xc0')
+    elif obj is True:
+        write(b'\xc3')
+    elif obj is False:
+        write(b'\xc2')
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            write(bytes((obj,)))
+        elif -32 <= obj < 0:
+            write(struct.pack('b', obj))
+        elif 0 <= obj <= 0xffffffff:
+            write(struct.pack('>BI', 0xce, obj) if obj > 0xffff else
+                  struct.pack('>BH', 0xcd, obj) if obj > 0xff else struct.pack('>BB', 0xcc, obj))
+        elif -0x80000000 <= obj < 0:
+            write(struct.pack('>Bi', 0xd2, obj))
+        elif 0 <= obj <= 0xffffffffffffffff:
+            write(struct.pack('>BQ', 0xcf, obj))
+        elif -0x8000000000000000 <= obj < 0:
+            write(struct.pack('>Bq', 0xd3, obj))
+        else:
+            raise OverflowError("Integer out of MessagePack range")
+    elif isinstance(obj, float):
+        write(struct.pack('>Bd', 0xcb, obj))
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        n = len(data)
+        if n < 32:
+            write(bytes((0xa0 | n,)))
+        elif n <= 0xff:
+            write(struct.pack('>BB', 0xd9, n))
+        elif n <= 0xffff:
+            write(struct.pack('>BH', 0xda, n))
+        else:
+            write(struct.pack('>BI', 0xdb, n))
+        write(data)
+    elif isinstance(obj, (bytes, bytearray)):
+        n = len(obj)
+        if n <= 0xff:
+            write(struct.pack('>BB', 0xc4, n))
+        elif n <= 0xffff:
+            write(struct.pack('>BH', 0xc5, n))
+        else:
+            write(struct.pack('>BI', 0xc6, n))
+        write(bytes(obj))
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:
+            write(bytes((0x90 | n,)))
+        elif n <= 0xffff:
+            write(struct.pack('>BH', 0xdc, n))
+        else:
+            write(struct.pack('>BI', 0xdd, n))
+        for item in obj:
+            _pack(item, write)
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:
+            write(bytes((0x80 | n,)))
+        elif n <= 0xffff:
+            write(struct.pack('>BH', 0xde, n))
+        else:
+            write(struct.pack('>BI', 0xdf, n))
+        for key, value in obj.items():
+            _pack(key, write)
+            _pack(value, write)
+    else:
+        raise TypeError(f"Cannot encode {type(obj).__name__} as MessagePack")
+
+
+class MsgPackRenderer(_StructuredRenderer):
+    """A stream of MessagePack maps, one per result, with the same fields as JSONRenderer."""
+
+    def render(self, result):
+        record = {'kind': result.kind}
+        record.update(result.to_dict())
+        _pack(record, self.writer.write)
+
+
+RENDERERS = {
+    'text': TextRenderer,
+    'json': JSONRenderer,
+    'csv': CSVRenderer,
+    'msgpack': MsgPackRenderer,
+}
+
+
+def get_renderer(fmt, writer):
+    try:
+        return RENDERERS[fmt](writer)
+    except KeyError:
+        raise ValueError(f"Unknown output format: {fmt}") from None
+
+
+def open_output(fmt, stream=None, buffer_size=DEFAULT_BUFFER_SIZE):
+    """(writer, renderer) for a format, writing to stream (default: stdout)."""
+    writer = OutputWriter(stream, binary=fmt == 'msgpack', buffer_size=buffer_size)
+    return writer, get_renderer(fmt, writer)
+
@@ -0,0 +1,200 @@
+"""
+results.py
+
+Result objects returned by the compute functions.
+
+Results hold plain values (type names, function tuples, numbers) and no
+preformatted text; core.render turns them into text, JSON, CSV or
+MessagePack. Each class uses __slots__, so a result costs one small
+object. Results also read like the dicts the functions used to return:
+result['type'], result.get('relation') and to_dict() all work, and
+to_dict() gives the JSON form used by batch and the server.
+"""
+
+
+def to_plain(value):
+    """Value with results converted to dicts and tuples to lists, for JSON."""
+    if isinstance(value, Result):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    return value
+
+
+class Result:
+    """Base class: fields are the subclass's __slots__, in order."""
+
+    __slots__ = ()
+    # Short name of the result type, written by the JSON and binary renderers
+    kind = None
+
+    def to_dict(self):
+        return {name: to_plain(getattr(self, name)) for name in self.__slots__}
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def keys(self):
+        return self.__slots__
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class RoleStack(Result):
+    """One role of a type: the function stack filling it and that stack's type."""
+
+    __slots__ = ('role', 'stack', 'mbti')
+    kind = 'role'
+
+    def __init__(self, role, stack, mbti):
+        self.role = role
+        self.stack = stack
+        self.mbti = mbti
+
+
+class TypeAnalysis(Result):
+    """
+    Function roles of a type. socionics is the type's socionics name when
+    requested, and relation its relation to compare_to when both were
+    requested.
+    """
+
+    __slots__ = ('type', 'roles', 'socionics', 'compare_to', 'relation')
+    kind = 'type_analysis'
+
+    def __init__(self, type, roles, socionics=None, compare_to=None, relation=None):
+        self.type = type
+        self.roles = roles
+        self.socionics = socionics
+        self.compare_to = compare_to
+        self.relation = relation
+
+
+class StackInference(Result):
+    """Closest type to a four-function stack (see infer_mbti_from_stack)."""
+
+    __slots__ = ('type', 'exact_match', 'confidence', 'closest_stack', 'differences')
+    kind = 'stack_inference'
+
+    def __init__(self, type, exact_match, confidence, closest_stack, differences):
+        self.type = type
+        self.exact_match = exact_match
+        self.confidence = confidence
+        self.closest_stack = closest_stack
+        self.differences = differences
+
+
+class TypeMatch(Result):
+    """A type ranked by Big Five distance to its norms."""
+
+    __slots__ = ('type', 'distance', 'confidence')
+    kind = 'type_match'
+
+    def __init__(self, type, distance, confidence):
+        self.type = type
+        self.distance = distance
+        self.confidence = confidence
+
+
+class TypeProbability(Result):
+    """A type with its score and probability from function strengths."""
+
+    __slots__ = ('type', 'score', 'probability')
+    kind = 'type_probability'
+
+    def __init__(self, type, score, probability):
+        self.type = type
+        self.score = score
+        self.probability = probability
+
+
+class TypeRanking(Result):
+    """Ranked TypeMatch or TypeProbability items, best first."""
+
+    __slots__ = ('types',)
+    kind = 'type_ranking'
+
+    def __init__(self, types):
+        self.types = types
+
+
+class Relation(Result):
+    """Socionics relation of type to compare_to."""
+
+    __slots__ = ('type', 'compare_to', 'relation')
+    kind = 'relation'
+
+    def __init__(self, type, compare_to=None, relation=None):
+        self.type = type
+        self.compare_to = compare_to
+        self.relation = relation
+
+
+class TraitDeviation(Result):
+    """
+    One Big Five score against its norm. norm and deviation are None when
+    the norms have no value for the trait; percentile (1-99) is None when
+    it cannot be computed.
+    """
+
+    __slots__ = ('trait', 'score', 'norm', 'deviation', 'percentile')
+    kind = 'trait_deviation'
+
+    def __init__(self, trait, score, norm, deviation, percentile):
+        self.trait = trait
+        self.score = score
+        self.norm = norm
+        self.deviation = deviation
+        self.percentile = percentile
+
+
+class BigFiveReport(Result):
+    """
+    Big Five scores against type norms (norms == 'type', for mbti_type) or
+    population norms (norms == 'population').
+    """
+
+    __slots__ = ('mbti_type', 'norms', 'traits')
+    kind = 'bigfive_report'
+
+    def __init__(self, mbti_type, norms, traits):
+        self.mbti_type = mbti_type
+        self.norms = norms
+        self.traits = traits
+
+
+class DistortionHit(Result):
+    """A detected cognitive distortion with its keyword spans in the lowercased text."""
+
+    __slots__ = ('name', 'description', 'reframe', 'spans')
+    kind = 'distortion'
+
+    def __init__(self, name, description, reframe, spans):
+        self.name = name
+        self.description = description
+        self.reframe = reframe
+        self.spans = spans
+
+
+class CBTAnalysis(Result):
+    """Cognitive distortions detected in a thought, in lexicon order."""
+
+    __slots__ = ('distortions',)
+    kind = 'cbt_analysis'
+
+    def __init__(self, distortions):
+        self.distortions = distortions
@@ -0,0 +1,238 @@
+"""
+server.py
+
+Persistent HTTP/JSON server so callers pay interpreter startup, argument
+parsing and norms loading once instead of per request.
+
+Endpoints (POST, JSON body, same arguments as the batch operations):
+    /analyze    analyze_type
+    /infer      infer_mbti_from_stack, infer_mbti_from_bigfive with 'bigfive',
+                or infer_type_distribution with 'strengths'
+    /relation   get_intertype_relation
+    /bigfive    BigFiveProfile.get_report
+    /cbt        analyze_cbt_thought
+    /           any batch operation named by 'op'
+    /reload     re-read the norms file if it changed (see BigFiveNorms.reload)
+GET /health returns {"status": "ok"} and the loaded norms file, plus result
+cache stats and call metrics when those are enabled.
+
+Norms are also reloaded on SIGHUP, and polled for changes when serve() is
+given a watch interval. Requests run on the event loop one at a time, so
+each finishes on the norms it started with.
+
+Connections are HTTP/1.1 keep-alive by default and pipelined requests are
+answered in order.
+"""
+
+import asyncio
+import json
+import signal
+import sys
+import traceback
+
+from core import instrument
+from core.batch import OPERATIONS, process_request
+from core.bigfive import BigFiveNorms, NormsWatcher
+from core.functions import get_inference_tables
+
+MAX_HEADER_LINES = 100
+MAX_BODY_BYTES = 1 << 20
+# Flush to the socket once this much output is queued on a connection
+WRITE_HIGH_WATER = 1 << 16
+
+ENDPOINTS = {
+    '/analyze': 'analyze_type',
+    '/infer': 'infer_mbti_from_stack',
+    '/relation': 'get_intertype_relation',
+    '/bigfive': 'bigfive',
+    '/cbt': 'analyze_cbt_thought',
+}
+
+_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def warm_up():
+    """Load norms and build lookup tables before the first request."""
+    BigFiveNorms.load_norms()
+    get_inference_tables()
+
+
+# ResultCache shared by all connections when serving with a cache
+_result_cache = None
+
+
+def handle(method, path, body):
+    """Return (status, payload) for one request."""
+    if path == '/health':
+        norms = BigFiveNorms.snapshot()
+        payload = {'status': 'ok', 'norms': {'path': norms.path, 'digest': norms.digest}}
+        if _result_cache is not None:
+            payload['cache'] = _result_cache.stats()
+        if instrument.is_enabled():
+            payload['metrics'] = instrument.snapshot()
+        return 200, payload
+    if method != 'POST':
+        raise HTTPError(405, f"Method {method} not allowed")
+    if path == '/reload':
+        reloaded = BigFiveNorms.reload()
+        norms = BigFiveNorms.snapshot()
+        return 200, {'reloaded': reloaded, 'norms': {'path': norms.path, 'digest': norms.digest}}
+
+    try:
+        request = json.loads(body) if body else {}
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise HTTPError(400, f"Invalid JSON: {e}")
+    if not isinstance(request, dict):
+        raise HTTPError(400, "Request must be a JSON object")
+
+    if path != '/':
+        op = ENDPOINTS.get(path)
+        if op is None:
+            raise HTTPError(404, f"Unknown endpoint: {path}")
+        if path == '/infer' and 'bigfive' in request:
+            op = 'infer_mbti_from_bigfive'
+        elif path == '/infer' and 'strengths' in request:
+            op = 'infer_type_distribution'
+        request['op'] = op
+
+    record = process_request(request, _result_cache)
+    if 'error' in record:
+        return 400, {'error': record['error']}
+    return 200, record['result']
+
+
+def _response(status, payload, keep_alive):
+    body = _encode(payload).encode('utf-8')
+    head = (
+        f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode('latin-1') + body
+
+
+async def _read_request(reader):
+    """Parse one request; returns (method, path, version, headers, body) or None at EOF."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(400, "Too many headers")
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length < 0:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method, path.split('?', 1)[0], version, headers, body
+
+
+async def _serve_connection(reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except HTTPError as e:
+                writer.write(_response(e.status, {'error': str(e)}, False))
+                break
+            except (asyncio.LimitOverrunError, ValueError):
+                # A line longer than the stream limit; the rest of the
+                # stream cannot be parsed, so the connection is closed
+                writer.write(_response(400, {'error': "Request line or header too long"}, False))
+                break
+            if request is None:
+                break
+            method, path, version, headers, body = request
+
+            connection = headers.get('connection', '').lower()
+            if version == 'HTTP/1.0':
+                keep_alive = connection == 'keep-alive'
+            else:
+                keep_alive = connection != 'close'
+
+            try:
+                status, payload = handle(method, path, body)
+                # Encoded here so a payload that is not JSON-serializable
+                # is answered with a 500 as well
+                response = _response(status, payload, keep_alive)
+            except HTTPError as e:
+                response = _response(e.status, {'error': str(e)}, keep_alive)
+            except Exception:
+                traceback.print_exc(file=sys.stderr)
+                response = _response(500, {'error': "Internal server error"}, keep_alive)
+            writer.write(response)
+
+            if not keep_alive:
+                break
+            # Pipelined requests already buffered are answered before flushing
+            if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                await writer.drain()
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host='127.0.0.1', port=8765, unix_path=None, ready=None, cache=None, watch_interval=None):
+    """
+    Run the server until cancelled. Listens on a Unix socket when unix_path
+    is given, otherwise on host:port. ready, if given, is called with the
+    listening server once it accepts connections. cache, a ResultCache, is
+    used for every request; the caller closes it. With watch_interval, the
+    norms file is checked for changes every that many seconds.
+    """
+    global _result_cache
+    _result_cache = cache
+    warm_up()
+    loop = asyncio.get_running_loop()
+    if hasattr(signal, 'SIGHUP'):
+        try:
+            loop.add_signal_handler(signal.SIGHUP, BigFiveNorms.reload)
+        except (NotImplementedError, RuntimeError):
+            pass
+    watcher = NormsWatcher(watch_interval).start() if watch_interval else None
+    if unix_path:
+        server = await asyncio.start_unix_server(_serve_connection, path=unix_path)
+    else:
+        server = await asyncio.start_server(_serve_connection, host, port)
+    if ready is not None:
+        ready(server)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if watcher is not None:
+            watcher.stop()
@@ -2,12 +2,20 @@
 socionics.py
 
 Exact Mathematical Socionics intertype relations via altered MBTI variables and P/J status,
-covering all 16 types and 14 classical relations with directionality.
+covering all 16 types and 14 classical relations with directionality, plus
+quadras, clubs, temperaments and Reinin dichotomies as bitmasks for roster
+queries and team summaries.
 
 Authoritative, exception-free, and deterministic.
 """
 
-from typing import List, Optional
+from array import array
+from itertools import compress
+from typing import List, Optional, Tuple
+
+from core.compat import require_numpy, is_ndarray
+from core.instrument import instrumented
+from core.typecode import TYPE_NAMES, TYPE_CODES, EI_BIT, NS_BIT, TF_BIT, PJ_BIT
 
 # MBTI to Socionics type code mapping
 MBTI_TO_SOCIONICS = {
@@ -121,17 +129,335 @@ def get_exact_relation(mbti_a: str, mbti_b: str) -> Optional[str]:
     # If no match found
     return None
 
+# Relation code (index) -> relation name. Codes fit in 4 bits.
+RELATIONS = (
+    "Identity",
+    "Duality",
+    "Activity",
+    "Mirror",
+    "Semi-Duality",
+    "Illusionary",
+    "Comparative",
+    "Look-a-Like",
+    "Quasi-Identical",
+    "Contrary",
+    "Super-Ego",
+    "Conflict",
+    "Benefactor",
+    "Beneficiary",
+    "Supervisor",
+    "Supervisee",
+)
+
+RELATION_CODES = {name: code for code, name in enumerate(RELATIONS)}
+
+def _build_relation_table() -> bytes:
+    """
+    Build the 16x16 relation table indexed by (code_a << 4) | code_b.
+
+    A relation depends only on the altered variables (code_a ^ code_b) and
+    the P/J status of type A, so the 32 distinct cases are resolved once via
+    get_exact_relation and then spread over all 256 ordered pairs.
+    """
+    by_xor_pj = []
+    for xor in range(16):
+        for pj_a in (0, 1):
+            relation = get_exact_relation(TYPE_NAMES[pj_a], TYPE_NAMES[pj_a ^ xor])
+            by_xor_pj.append(RELATION_CODES[relation])
+    return bytes(
+        by_xor_pj[((a ^ b) << 1) | (a & PJ_BIT)]
+        for a in range(16)
+        for b in range(16)
+    )
+
+RELATION_TABLE = _build_relation_table()
+
+# Per-type-A rows padded to 256 bytes for bytes.translate()
+_ROW_TRANSLATIONS = tuple(RELATION_TABLE[a << 4:(a + 1) << 4] + bytes(240) for a in range(16))
+
+_relation_array = None
+
+def relation_code(code_a: int, code_b: int) -> int:
+    """Relation code between two 4-bit type codes (see RELATIONS)."""
+    return RELATION_TABLE[(code_a << 4) | code_b]
+
+def relation_matrix(codes_a, codes_b):
+    """
+    Relation codes for every pair in codes_a x codes_b.
+
+    Accepts NumPy integer arrays or any sequence of type codes such as
+    array('B'). NumPy input returns an (N, M) uint8 array; other input
+    returns a list of N array('B') rows of length M. Decode codes with
+    RELATIONS.
+    """
+    global _relation_array
+    if is_ndarray(codes_a) or is_ndarray(codes_b):
+        np = require_numpy("relation_matrix")
+        a = np.asarray(codes_a, dtype=np.intp).ravel()
+        b = np.asarray(codes_b, dtype=np.intp).ravel()
+        for codes in (a, b):
+            if codes.size and (codes.min() < 0 or codes.max() > 15):
+                raise ValueError("Type codes must be in range 0-15")
+        if _relation_array is None:
+            _relation_array = np.frombuffer(RELATION_TABLE, dtype=np.uint8).reshape(16, 16)
+        return _relation_array[a[:, None], b[None, :]]
+
+    b = bytes(codes_b)
+    if b and max(b) > 15:
+        raise ValueError("Type codes must be in range 0-15")
+    rows = {}
+    matrix = []
+    for a in codes_a:
+        row = rows.get(a)
+        if row is None:
+            if not 0 <= a <= 15:
+                raise ValueError("Type codes must be in range 0-15")
+            row = rows[a] = b.translate(_ROW_TRANSLATIONS[a])
+        matrix.append(array('B', row))
+    return matrix
+
+def verify_relation_table() -> List[Tuple]:
+    """
+    Compare RELATION_TABLE with get_exact_relation for all 256 ordered pairs.
+    Returns a list of (type_a, type_b, expected, actual) mismatches.
+    """
+    mismatches = []
+    for a, type_a in enumerate(TYPE_NAMES):
+        for b, type_b in enumerate(TYPE_NAMES):
+            expected = get_exact_relation(type_a, type_b)
+            actual = RELATIONS[relation_code(a, b)]
+            if expected != actual:
+                mismatches.append((type_a, type_b, expected, actual))
+    return mismatches
+
+@instrumented('get_intertype_relation')
 def get_intertype_relation(mbti_a: str, mbti_b: str) -> Optional[str]:
     """
     Public function to get socionics intertype relation between two MBTI types.
     Returns exact classical relation or None if invalid input or no relation.
     """
-    try:
-        # Validate MBTI types
-        _ = mbti_to_socionics(mbti_a)
-        _ = mbti_to_socionics(mbti_b)
-    except ValueError:
+    code_a = TYPE_CODES.get(mbti_a.upper())
+    code_b = TYPE_CODES.get(mbti_b.upper())
+    if code_a is None or code_b is None:
         return None
+    return RELATIONS[RELATION_TABLE[(code_a << 4) | code_b]]
+
+
+# Type groups as 16-bit masks over type codes: bit c is set when the type
+# with code c is in the group, so membership is a shift, and intersections
+# and unions of groups are & and |.
+#
+# Groups follow the relation table above, which reads the MBTI letters as
+# the socionics dichotomies (J/P as rational/irrational): a quadra is a
+# type with its Dual, Activity and Mirror partners, so group and relation
+# queries agree. MBTI_TO_SOCIONICS swaps J/P for some introverted types, so
+# its names are not used for grouping.
+
+ALL_TYPES = 0xFFFF
+
+def _type_code(value) -> int:
+    """Type code of an MBTI type name or of a code."""
+    if isinstance(value, str):
+        code = TYPE_CODES.get(value.strip().upper())
+        if code is None:
+            raise ValueError(f"Unknown MBTI type: {value}")
+        return code
+    code = int(value)
+    if not 0 <= code <= 15:
+        raise ValueError(f"Invalid type code: {code}")
+    return code
+
+def types_mask(types) -> int:
+    """Mask of MBTI type names or type codes."""
+    mask = 0
+    for value in types:
+        mask |= 1 << _type_code(value)
+    return mask
+
+def mask_types(mask: int) -> List[str]:
+    """MBTI type names in a mask, in type code order."""
+    return [TYPE_NAMES[code] for code in range(16) if mask >> code & 1]
+
+def in_group(mbti, mask: int) -> bool:
+    """True if a type (name or code) is in the group mask."""
+    return bool(mask >> _type_code(mbti) & 1)
+
+def _bit_mask(bit: int, value: int) -> int:
+    """Types whose code has bit set (value 1) or clear (value 0)."""
+    return sum(1 << code for code in range(16) if bool(code & bit) == bool(value))
+
+# RELATION_MASKS[a][r]: types b whose relation from a (a -> b, as in
+# get_intertype_relation(a, b)) has relation code r
+RELATION_MASKS = tuple(
+    tuple(
+        sum(1 << b for b in range(16) if RELATION_TABLE[(a << 4) | b] == r)
+        for r in range(len(RELATIONS))
+    )
+    for a in range(16)
+)
 
-    return get_exact_relation(mbti_a, mbti_b)
+# Dual of each type code
+DUALS = tuple(RELATION_MASKS[a][RELATION_CODES['Duality']].bit_length() - 1 for a in range(16))
 
+def _quadra(mbti: str) -> int:
+    masks = RELATION_MASKS[TYPE_CODES[mbti]]
+    return masks[RELATION_CODES['Identity']] | masks[RELATION_CODES['Duality']] \
+        | masks[RELATION_CODES['Activity']] | masks[RELATION_CODES['Mirror']]
+
+# Named by their irrational extraverts (ILE, SLE, SEE, IEE)
+QUADRAS = {
+    'Alpha': _quadra('ENTP'),
+    'Beta': _quadra('ESTP'),
+    'Gamma': _quadra('ESFP'),
+    'Delta': _quadra('ENFP'),
+}
+
+EXTRAVERTS = _bit_mask(EI_BIT, 1)
+INTUITIVES = _bit_mask(NS_BIT, 0)
+LOGICALS = _bit_mask(TF_BIT, 0)
+RATIONALS = _bit_mask(PJ_BIT, 0)
+
+CLUBS = {
+    'Researchers': INTUITIVES & LOGICALS,                           # NT
+    'Socials': (ALL_TYPES ^ INTUITIVES) & (ALL_TYPES ^ LOGICALS),   # SF
+    'Pragmatists': (ALL_TYPES ^ INTUITIVES) & LOGICALS,             # ST
+    'Humanitarians': INTUITIVES & (ALL_TYPES ^ LOGICALS),           # NF
+}
+
+# Extraverted or introverted, irrational (p) or rational (j)
+TEMPERAMENTS = {
+    'Ep': EXTRAVERTS & (ALL_TYPES ^ RATIONALS),
+    'Ej': EXTRAVERTS & RATIONALS,
+    'Ip': (ALL_TYPES ^ EXTRAVERTS) & (ALL_TYPES ^ RATIONALS),
+    'Ij': (ALL_TYPES ^ EXTRAVERTS) & RATIONALS,
+}
+
+def parity_mask(*masks: int) -> int:
+    """
+    Types in an odd number of the given masks. Every Reinin dichotomy is
+    a pole of the parity of some of the four base dichotomies, e.g.
+    parity_mask(EXTRAVERTS, RATIONALS) gives the rational introverts and
+    irrational extraverts, the static types.
+    """
+    result = 0
+    for mask in masks:
+        result ^= mask
+    return result
+
+# Reinin dichotomies: (first pole, second pole) -> first pole's mask; the
+# second pole is its complement. Each of the 15 nonempty sets of base
+# dichotomies gives one; ENTP (ILE) is Carefree, Obstinate, Tactical,
+# Constructivist, Positivist, Asking and Process.
+DICHOTOMIES = {
+    ('Extravert', 'Introvert'): EXTRAVERTS,
+    ('Intuitive', 'Sensing'): INTUITIVES,
+    ('Logical', 'Ethical'): LOGICALS,
+    ('Rational', 'Irrational'): RATIONALS,
+    ('Democratic', 'Aristocratic'): QUADRAS['Alpha'] | QUADRAS['Gamma'],
+    ('Merry', 'Serious'): QUADRAS['Alpha'] | QUADRAS['Beta'],
+    ('Judicious', 'Decisive'): QUADRAS['Alpha'] | QUADRAS['Delta'],
+    ('Static', 'Dynamic'): TEMPERAMENTS['Ep'] | TEMPERAMENTS['Ij'],
+    ('Carefree', 'Farsighted'): ALL_TYPES ^ parity_mask(EXTRAVERTS, INTUITIVES),
+    ('Yielding', 'Obstinate'): parity_mask(EXTRAVERTS, LOGICALS),
+    ('Tactical', 'Strategic'): parity_mask(INTUITIVES, RATIONALS),
+    ('Constructivist', 'Emotivist'): parity_mask(EXTRAVERTS, INTUITIVES, LOGICALS, RATIONALS),
+    ('Positivist', 'Negativist'): parity_mask(EXTRAVERTS, INTUITIVES, LOGICALS),
+    ('Asking', 'Declaring'): parity_mask(LOGICALS, RATIONALS),
+    ('Process', 'Result'): ALL_TYPES ^ parity_mask(INTUITIVES, LOGICALS, RATIONALS),
+}
+
+# Group or pole name (lower case) -> mask
+GROUPS = {
+    **{name.lower(): mask for name, mask in QUADRAS.items()},
+    **{name.lower(): mask for name, mask in CLUBS.items()},
+    **{name.lower(): mask for name, mask in TEMPERAMENTS.items()},
+    **{first.lower(): mask for (first, _), mask in DICHOTOMIES.items()},
+    **{second.lower(): ALL_TYPES ^ mask for (_, second), mask in DICHOTOMIES.items()},
+}
+
+def group_mask(name: str) -> int:
+    """Mask of a quadra, club, temperament or dichotomy pole by name (case-insensitive)."""
+    mask = GROUPS.get(name.strip().lower())
+    if mask is None:
+        raise ValueError(f"Unknown group: {name}")
+    return mask
+
+def relation_mask(mbti, relation: str) -> int:
+    """Types that mbti (name or code) has the named relation with."""
+    code = RELATION_CODES.get(relation)
+    if code is None:
+        raise ValueError(f"Unknown relation: {relation}")
+    return RELATION_MASKS[_type_code(mbti)][code]
+
+def roster_codes(roster):
+    """Type codes of a roster of type names or codes; NumPy integer arrays pass through."""
+    if is_ndarray(roster) and roster.dtype.kind in 'iu':
+        return roster
+    return array('B', (_type_code(value) for value in roster))
+
+def roster_select(roster, mask: int):
+    """
+    Indexes of the roster members whose type is in mask, e.g. everyone in
+    Beta who is Dual with ENTP:
+
+        roster_select(roster, QUADRAS['Beta'] & relation_mask('ENTP', 'Duality'))
+
+    NumPy input gives an index array, other input a list.
+    """
+    codes = roster_codes(roster)
+    if is_ndarray(codes):
+        np = require_numpy("roster_select")
+        if codes.size and (codes.min() < 0 or codes.max() > 15):
+            raise ValueError("Type codes must be in range 0-15")
+        return np.flatnonzero((mask >> codes.astype(np.int32)) & 1)
+    # One byte per type code saying whether it is in the mask
+    table = bytes(mask >> code & 1 for code in range(16)) + bytes(240)
+    flags = bytes(codes).translate(table)
+    return list(compress(range(len(flags)), flags))
+
+def type_histogram(roster) -> List[int]:
+    """Number of roster members of each type code (16 counts)."""
+    codes = roster_codes(roster)
+    if is_ndarray(codes):
+        np = require_numpy("type_histogram")
+        if codes.size and (codes.min() < 0 or codes.max() > 15):
+            raise ValueError("Type codes must be in range 0-15")
+        return np.bincount(codes, minlength=16).tolist()
+    data = bytes(codes)
+    return [data.count(code) for code in range(16)]
+
+def histogram_mask(histogram) -> int:
+    """Mask of the types present in a 16-bin histogram."""
+    return sum(1 << code for code, n in enumerate(histogram) if n)
+
+def group_counts(histogram, groups: dict) -> dict:
+    """{name: members} for each group mask in groups, from a 16-bin histogram."""
+    return {
+        name: sum(n for code, n in enumerate(histogram) if mask >> code & 1)
+        for name, mask in groups.items()
+    }
+
+def team_summary(roster) -> dict:
+    """
+    Composition of a team from its type histogram: counts per type,
+    quadra, club, temperament and dichotomy pole, plus 'missing_duals',
+    {type: dual} for each type present without its dual. After the
+    histogram, the cost does not depend on the team size.
+    """
+    histogram = type_histogram(roster)
+    size = sum(histogram)
+    present = histogram_mask(histogram)
+    poles = group_counts(histogram, {f"{first}/{second}": mask for (first, second), mask in DICHOTOMIES.items()})
+    return {
+        'size': size,
+        'types': {TYPE_NAMES[code]: n for code, n in enumerate(histogram) if n},
+        'quadras': group_counts(histogram, QUADRAS),
+        'clubs': group_counts(histogram, CLUBS),
+        'temperaments': group_counts(histogram, TEMPERAMENTS),
+        'dichotomies': {name: [n, size - n] for name, n in poles.items()},
+        'missing_duals': {
+            TYPE_NAMES[code]: TYPE_NAMES[DUALS[code]]
+            for code in range(16)
+            if present >> code & 1 and not present >> DUALS[code] & 1
+        },
+    }
@@ -0,0 +1,53 @@
+"""
+typecode.py
+
+Compact 4-bit encoding of the 16 MBTI types.
+
+Each dichotomy occupies one bit, so two types differ in exactly the variables
+set in the XOR of their codes:
+
+    bit 3: E/I  (E = 1)
+    bit 2: N/S  (S = 1)
+    bit 1: T/F  (F = 1)
+    bit 0: J/P  (P = 1)
+"""
+
+from enum import IntEnum
+
+# Bit masks per MBTI variable (1=E/I, 2=N/S, 3=T/F, 4=P/J)
+EI_BIT = 0b1000
+NS_BIT = 0b0100
+TF_BIT = 0b0010
+PJ_BIT = 0b0001
+
+VARIABLE_BITS = (EI_BIT, NS_BIT, TF_BIT, PJ_BIT)
+
+_LETTERS = (('I', 'E'), ('N', 'S'), ('T', 'F'), ('J', 'P'))
+
+# Code -> MBTI string
+TYPE_NAMES = tuple(
+    ''.join(_LETTERS[i][(code >> (3 - i)) & 1] for i in range(4))
+    for code in range(16)
+)
+
+# MBTI string -> code
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+
+# TypeCode.INFJ == 2, TypeCode(2).name == 'INFJ'
+TypeCode = IntEnum('TypeCode', [(name, code) for code, name in enumerate(TYPE_NAMES)])
+TypeCode.__doc__ = "4-bit MBTI type code; interchangeable with plain ints."
+
+
+def type_to_code(mbti):
+    """Return the 4-bit code for an MBTI type string (case-insensitive)."""
+    code = TYPE_CODES.get(mbti.upper()) if isinstance(mbti, str) else None
+    if code is None:
+        raise ValueError(f"Unknown MBTI type: {mbti}")
+    return code
+
+
+def code_to_type(code):
+    """Return the MBTI type string for a 4-bit code."""
+    if not 0 <= code < 16:
+        raise ValueError(f"Invalid type code: {code}")
+    return TYPE_NAMES[code]
@@ -1,65 +1,513 @@
+import os
 import sys
-from core.functions import analyze_type, infer_mbti_from_stack
-from core.bigfive import BigFiveProfile
-from core.cbt import analyze_cbt_thought 
+
+# Must run before any other project import so those imports are timed too
+if os.environ.get("EIDON_IMPORT_PROFILE"):
+    from core.importprofile import install_import_profiler
+    install_import_profiler()
+
 from utils import parse_arguments
 
+# Core modules are imported inside each command so a command only pays
+# for what it uses.
+
+# Default order for `list`, matching the scripts in scripts/
+LIST_ORDER = [
+    "ISTJ", "ISFJ", "INFJ", "INTJ",
+    "ISTP", "ISFP", "INFP", "INTP",
+    "ESTP", "ESFP", "ENFP", "ENTP",
+    "ESTJ", "ESFJ", "ENFJ", "ENTJ",
+]
+
+def open_result_cache(args):
+    """ResultCache for --cache, or None."""
+    if not args.cache:
+        return None
+    import sqlite3
+    from core.cache import ResultCache
+    try:
+        return ResultCache(args.cache_path, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Error: cannot open result cache: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+def close_result_cache(cache):
+    if cache is None:
+        return
+    cache.close()
+    stats = cache.stats()
+    print(f"Result cache: {stats['hits']} hits ({stats['hits_memory']} memory, {stats['hits_disk']} disk), "
+          f"{stats['misses']} misses, {stats['evictions']} evicted", file=sys.stderr)
+
+def open_renderer(fmt):
+    """(writer, renderer) for the run's output on stdout."""
+    from core.render import open_output
+    return open_output(fmt)
+
+def fail(writer, fmt, message, status=1):
+    """
+    Flush the output so far, then report an error: on stdout after text
+    output, as the reports always have, or on stderr so machine-readable
+    output stays parseable.
+    """
+    writer.flush()
+    print(message, file=sys.stdout if fmt == "text" else sys.stderr)
+    sys.exit(status)
+
+def install_instrumentation(args):
+    """Enable metrics for --profile/--metrics; must run before core modules are imported."""
+    metrics = args.metrics or os.environ.get("EIDON_METRICS")
+    if not args.profile and not metrics:
+        return
+    from core import instrument
+    try:
+        if metrics:
+            instrument.enable()
+            instrument.start_exporter(instrument.exporter_for(metrics), args.metrics_interval)
+        if args.profile:
+            instrument.install_profile_report(args.profile_format, args.profile_output)
+    except ValueError as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
 def main():
     args = parse_arguments()
+    install_instrumentation(args)
 
     if args.command == "analyze":
         if args.functions is None:
             args.functions = ["ego", "subconscious", "unconscious", "superego"]
+        writer, renderer = open_renderer(args.format)
 
         if args.type:
-            analyze_type(
-                args.type.upper(),
-                args.functions,
-                show_socionics=getattr(args, 'show_socionics', False),
-                compare_to_type=args.compare_to.upper() if args.compare_to else None
-            )
+            from core.functions import analyze_type
+            try:
+                renderer.render(analyze_type(
+                    args.type.upper(),
+                    args.functions,
+                    show_socionics=getattr(args, 'show_socionics', False),
+                    compare_to_type=args.compare_to.upper() if args.compare_to else None
+                ))
+            except ValueError as e:
+                fail(writer, args.format, f"Error: {str(e)}")
 
         if args.bigfive:
+            from core.bigfive import BigFiveProfile
             try:
                 if len(args.bigfive) != 5:
                     raise ValueError("Big Five input must have exactly 5 values.")
                 o, c, e, a, n = args.bigfive
                 mbti_type = args.type.upper() if args.type else None
-                b5 = BigFiveProfile(o, c, e, a, n, mbti_type=mbti_type)
+                stratum = {'age': args.age, 'sex': args.sex, 'country': args.country}
+                b5 = BigFiveProfile(o, c, e, a, n, mbti_type=mbti_type, stratum=stratum)
                 b5.validate()
-                print("\nBig Five Analysis:")
-                print("\n".join(b5.get_report()))
+                renderer.section("Big Five Analysis")
+                renderer.render(b5.analyze())
             except ValueError as e:
-                print(f"Error: {str(e)}")
-                sys.exit(1)
+                fail(writer, args.format, f"Error: {str(e)}")
 
         if args.cbt_thought:
+            from core.cbt import analyze_cbt_thought
             try:
                 cbt_results = analyze_cbt_thought(args.cbt_thought)
-                print("\nCBT Analysis:")
-                if cbt_results['distortions']:
-                    print("Detected cognitive distortions:")
-                    for dist in cbt_results['distortions']:
-                        print(f"- {dist['name']}: {dist['description']}")
-                        print(f"  Suggested reframe: {dist['reframe']}")
-                else:
-                    print("No common cognitive distortions detected.")
             except Exception as e:
-                print(f"Error during CBT analysis: {str(e)}")
-                sys.exit(1)
+                fail(writer, args.format, f"Error during CBT analysis: {str(e)}")
+            renderer.section("CBT Analysis")
+            renderer.render(cbt_results)
+        writer.close()
 
     elif args.command == "infer":
-        stack = [func.strip() for func in args.stack]
+        from core.results import TypeRanking
+        writer, renderer = open_renderer(args.format)
+        try:
+            if args.bigfive:
+                from core.bigfive import BigFiveProfile, infer_mbti_from_bigfive
+                BigFiveProfile(*args.bigfive).validate()
+                result = TypeRanking(infer_mbti_from_bigfive(args.bigfive, top_k=args.top_k))
+            elif args.strengths or args.partial_stack:
+                from core.functions import DISTRIBUTION_TEMPERATURE, infer_type_distribution
+                temperature = DISTRIBUTION_TEMPERATURE if args.temperature is None else args.temperature
+                if args.strengths:
+                    ranked = infer_type_distribution(strengths=args.strengths, temperature=temperature)
+                else:
+                    ranked = infer_type_distribution(stacks=args.partial_stack, temperature=temperature)
+                result = TypeRanking(ranked[:max(1, args.top_k)])
+            else:
+                from core.functions import infer_mbti_from_stack
+                result = infer_mbti_from_stack([func.strip() for func in args.stack])
+        except ValueError as e:
+            # An invalid stack has always been reported with a zero exit status
+            fail(writer, args.format, f"Error: {str(e)}", status=0 if args.stack else 1)
+        except ImportError as e:
+            fail(writer, args.format, f"Error: {str(e)}")
+        renderer.render(result)
+        writer.close()
+
+    elif args.command == "batch":
+        from core.batch import open_batch_files, run_batch
+        try:
+            infile, outfile = open_batch_files(args.input, args.output)
+        except OSError as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        cache = open_result_cache(args)
+        try:
+            _, failed = run_batch(infile, outfile, cache)
+        finally:
+            for f in (infile, outfile):
+                if f not in (sys.stdin, sys.stdout):
+                    f.close()
+            close_result_cache(cache)
+        if failed:
+            sys.exit(2)
+
+    elif args.command == "serve":
+        import asyncio
+        from core.server import serve
+        where = args.unix or f"http://{args.host}:{args.port}"
+        cache = open_result_cache(args)
+        try:
+            asyncio.run(serve(args.host, args.port, unix_path=args.unix, cache=cache, watch_interval=args.watch_norms,
+                              ready=lambda server: print(f"Serving on {where}", file=sys.stderr)))
+        except KeyboardInterrupt:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            close_result_cache(cache)
+
+    elif args.command == "list":
+        from core.functions import analyze_type, describe_roles
+        from core.typecode import TYPE_CODES
+        types = [t.upper() for t in args.types] or LIST_ORDER
+        unknown = [t for t in types if t not in TYPE_CODES]
+        if unknown:
+            print(f"Error: Unknown MBTI type: {', '.join(unknown)}", file=sys.stderr)
+            sys.exit(1)
+        if args.format == "json":
+            import json
+            print(json.dumps({t: describe_roles(t) for t in types}, indent=2))
+        else:
+            writer, renderer = open_renderer("text")
+            for mbti in types:
+                renderer.render(analyze_type(mbti, ["ego", "subconscious", "unconscious", "superego"]))
+                renderer.line("-" * 58)
+            writer.close()
+
+    elif args.command == "check":
+        from core.checks import run_checks
+        results = run_checks(args.only)
+        passed = all(result['passed'] for result in results)
+        if args.format == "json":
+            import json
+            print(json.dumps({'passed': passed, 'checks': results}, indent=2))
+        else:
+            for result in results:
+                status = "PASS" if result['passed'] else "FAIL"
+                print(f"{status}: {result['name']} ({result['checked']} checked) - {result['description']}")
+                for failure in result['failures']:
+                    print(f"  {failure}")
+            failed = sum(not result['passed'] for result in results)
+            print()
+            print("All checks passed." if passed else f"{failed} check(s) failed.")
+        if not passed:
+            sys.exit(1)
+
+    elif args.command == "cbt":
+        from core.cbt import CBT_DISTORTIONS, ParallelCBTAnalyzer, iter_cbt_sentences
         try:
-            result = infer_mbti_from_stack(stack)
-            if result['exact_match']:
-                print(f"MBTI Type: {result['type']}")
+            infile = sys.stdin if args.file == "-" else open(args.file, 'r', encoding='utf-8', errors='replace')
+        except OSError as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        if args.format == "json":
+            import json
+            dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        unit = "records" if args.records else "sentences"
+        analyzer = None
+        matched = 0
+        totals = {}
+        try:
+            if args.records:
+                analyzer = ParallelCBTAnalyzer(args.workers, args.batch_size)
+                lines = (line.rstrip('\n') for line in infile)
+                results = (
+                    {'line': line_no, 'counts': counts}
+                    for line_no, counts in enumerate(analyzer.imap(lines), 1)
+                    if counts or args.all_sentences
+                )
             else:
-                print(f"Closest MBTI: {result['type']} (confidence: {result['confidence']}%)")
-                print(f"Expected stack: {'-'.join(result['closest_stack'])}")
-                print(f"Differences in positions: {', '.join(map(str, result['differences']))}")
+                results = iter_cbt_sentences(infile, args.chunk_size, include_empty=args.all_sentences)
+            for result in results:
+                matched += 1
+                for key, count in result['counts'].items():
+                    totals[key] = totals.get(key, 0) + count
+                if args.format == "json":
+                    print(dumps(result))
+                    continue
+                found = ", ".join(f"{CBT_DISTORTIONS[key]['name']} ({count})" for key, count in result['counts'].items())
+                if args.records:
+                    print(f"line {result['line']}: {found or 'None'}")
+                else:
+                    print(f"{result['start']}-{result['end']}: {found or 'None'}")
+                    print(f"  {result['text']}")
         except ValueError as e:
-            print(f"Error: {str(e)}")
+            print(f"Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if analyzer is not None:
+                analyzer.close()
+            if infile is not sys.stdin:
+                infile.close()
+        totals = {key: totals[key] for key in CBT_DISTORTIONS if key in totals}
+        if args.format == "json":
+            print(dumps({'summary': {unit: matched, 'counts': totals}}))
+        else:
+            print()
+            label = unit.capitalize() if args.all_sentences else f"{unit.capitalize()} with distortions"
+            print(f"{label}: {matched}")
+            if totals:
+                print("Distortion totals:")
+                for key, count in totals.items():
+                    print(f"- {CBT_DISTORTIONS[key]['name']}: {count}")
+            else:
+                print("No common cognitive distortions detected.")
+
+    elif args.command == "norms":
+        from core.bigfive import TRAITS
+        from core import normstore
+        if args.norms_command == "convert":
+            try:
+                populated = normstore.convert_json_norms(args.input, args.output, TRAITS)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error: {str(e)}", file=sys.stderr)
+                sys.exit(1)
+            print(f"Wrote {populated} norm cells to {args.output}")
+        else:
+            from core.bigfive import BigFiveNorms
+            BigFiveNorms.load_norms(args.file)
+            if BigFiveNorms.store() is None:
+                print("Error: stratified norms require a binary norms file (see `eidon.py norms convert`)", file=sys.stderr)
+                sys.exit(1)
+            types = [args.type.upper()] if args.type else LIST_ORDER
+            for mbti in types:
+                cell = BigFiveNorms.get_stratum(mbti, args.age, args.sex, args.country)
+                if cell is None:
+                    print(f"{mbti}: no norms")
+                    continue
+                print(f"{mbti} (stratum: {', '.join(cell.key[1:])}; n={cell.n}):")
+                for trait, mean, sd in zip(TRAITS, cell.means, cell.sds):
+                    print(f"  {trait.title()}: mean {mean}, SD {sd if sd == sd else 'n/a'}")
+
+    elif args.command == "aggregate":
+        from core.aggregate import CohortAggregate, detect_format, iter_rows
+        from core.profilestore import ProfileStore, is_profile_store
+        aggregate = CohortAggregate(quantiles=args.quantiles)
+        try:
+            for path in args.inputs:
+                fmt = args.format or ('csv' if path == "-" else detect_format(path))
+                if path != "-" and is_profile_store(path):
+                    with ProfileStore(path) as store:
+                        for rows in store.chunks():
+                            aggregate.add_arrays(store.types[rows], store.scores(rows))
+                elif path == "-":
+                    aggregate.add_rows(iter_rows(sys.stdin, fmt))
+                else:
+                    with open(path, 'r', encoding='utf-8', newline='') as f:
+                        aggregate.add_rows(iter_rows(f, fmt))
+            for path in args.merge:
+                aggregate.merge(CohortAggregate.load_partial(path))
+            if args.partial:
+                aggregate.save_partial(args.partial)
+            if args.output:
+                written = aggregate.write_norms(args.output, args.min_count)
+        except (OSError, ValueError, KeyError, ImportError) as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Aggregated {aggregate.count()} rows ({aggregate.skipped} skipped)", file=sys.stderr)
+        if args.output:
+            print(f"Wrote norms for {written} types to {args.output}", file=sys.stderr)
+
+    elif args.command == "match":
+        import json
+        from core.aggregate import detect_format
+        from core.matching import DEFAULT_PREFERENCE, MatchPool, bigfive_array, read_profiles
+        from core.compat import require_numpy
+        from core.profilestore import ProfileStore, is_profile_store
+        from core.typecode import TYPE_NAMES, type_to_code
+
+        def read(path):
+            fmt = args.input_format or ('csv' if path == "-" else detect_format(path))
+            if path != "-" and is_profile_store(path):
+                # Profiles are identified by their position in the store
+                store = ProfileStore(path)
+                scores = store.scores()
+                return list(range(len(store))), store.types, None if np.isnan(scores).all() else scores, 0
+            if path == "-":
+                return read_profiles(sys.stdin, fmt)
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                return read_profiles(f, fmt)
+
+        try:
+            np = require_numpy("eidon match")
+            ids, types, bigfive, skipped = read(args.pool)
+            use_bigfive = bigfive is not None and not args.no_bigfive
+            pool = MatchPool(types, bigfive_array(np, bigfive) if use_bigfive else None, ids)
+            preference = args.prefer or DEFAULT_PREFERENCE
+            if args.type:
+                query_ids, query_types = [None], [type_to_code(args.type)]
+                query_bigfive = [args.bigfive] if args.bigfive and use_bigfive else None
+                result = pool.match(query_types, query_bigfive, args.top_k, preference)
+            elif args.queries:
+                query_ids, query_types, query_bigfive, query_skipped = read(args.queries)
+                skipped += query_skipped
+                if query_bigfive is not None and use_bigfive:
+                    query_bigfive = bigfive_array(np, query_bigfive)
+                else:
+                    query_bigfive = None
+                result = pool.match(query_types, query_bigfive, args.top_k, preference)
+            else:
+                query_ids, query_types = ids, pool.types.tolist()
+                result = pool.match_members(k=args.top_k, preference=preference, use_bigfive=use_bigfive)
+        except (OSError, ValueError, ImportError) as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        for row, (query_id, query_type) in enumerate(zip(query_ids, query_types)):
+            partners = pool.describe(result, row)
+            if args.format == "json":
+                print(dumps({'id': query_id, 'type': TYPE_NAMES[query_type], 'partners': partners}))
+                continue
+            label = TYPE_NAMES[query_type] if query_id is None else f"{query_id} ({TYPE_NAMES[query_type]})"
+            print(f"{label}:")
+            if not partners:
+                print("  No partners found.")
+            for rank, partner in enumerate(partners, 1):
+                distance = f", distance: {partner['distance']}" if partner['distance'] is not None else ""
+                print(f"  {rank}. {partner['id']} ({partner['type']}, {partner['relation']}{distance})")
+        if skipped:
+            print(f"Skipped {skipped} invalid profiles", file=sys.stderr)
+
+    elif args.command == "profiles":
+        import json
+        from core.aggregate import detect_format
+        from core.bigfive import TRAITS
+        from core.compat import require_numpy
+        from core import profilestore
+        from core.typecode import TYPE_NAMES
+        if args.profiles_command == "pack":
+            try:
+                writer = profilestore.ProfileWriter(args.output, args.traits, stacks=args.stacks)
+                skipped = 0
+                for path in args.inputs:
+                    fmt = args.format or ('csv' if path == "-" else detect_format(path))
+                    if path == "-":
+                        skipped += profilestore.pack_profiles(writer, profilestore.iter_profiles(sys.stdin, fmt))
+                    else:
+                        with open(path, 'r', encoding='utf-8', newline='') as f:
+                            skipped += profilestore.pack_profiles(writer, profilestore.iter_profiles(f, fmt))
+                count = writer.close()
+            except (OSError, ValueError, ImportError) as e:
+                print(f"Error: {str(e)}", file=sys.stderr)
+                sys.exit(1)
+            print(f"Packed {count} profiles ({skipped} skipped) into {args.output}", file=sys.stderr)
+        else:
+            try:
+                np = require_numpy("eidon profiles")
+                store = profilestore.ProfileStore(args.store)
+                ranges = {}
+                for trait, low, high in args.range:
+                    name = next((t for t in TRAITS if t.startswith(trait.lower())), None)
+                    if name is None:
+                        raise ValueError(f"Unknown trait {trait!r} in --range (expected one of {', '.join(TRAITS)})")
+                    ranges[name] = tuple(None if bound == "-" else float(bound) for bound in (low, high))
+                rows = store.select(args.type, ranges)
+                scores = store.scores(rows)
+                if args.output:
+                    keys = store.stack_keys(rows) if store.has_stacks else None
+                    profilestore.write_profile_store(args.output, store.types[rows], scores, keys, store.trait_dtype)
+            except (OSError, ValueError, ImportError) as e:
+                print(f"Error: {str(e)}", file=sys.stderr)
+                sys.exit(1)
+            counts = store.type_counts(rows).tolist()
+            present = ~np.isnan(scores)
+            totals = np.where(present, scores, 0.0).sum(axis=0)
+            summary = {
+                'count': len(rows),
+                'types': {TYPE_NAMES[code]: n for code, n in enumerate(counts) if n},
+                'means': {
+                    trait: round(float(total) / n, 2) if n else None
+                    for trait, total, n in zip(TRAITS, totals, present.sum(axis=0).tolist())
+                },
+            }
+            if args.format == "json":
+                print(json.dumps(summary))
+            else:
+                print(f"{summary['count']} of {len(store)} profiles match")
+                for mbti_type, n in summary['types'].items():
+                    print(f"  {mbti_type}: {n}")
+                for trait, mean in summary['means'].items():
+                    print(f"  {trait.title()} mean: {'n/a' if mean is None else mean}")
+            if args.output:
+                print(f"Wrote {len(rows)} profiles to {args.output}", file=sys.stderr)
+
+    elif args.command == "team":
+        import json
+        from core import socionics
+        from core.aggregate import detect_format
+        from core.matching import read_profiles
+        from core.profilestore import ProfileStore, is_profile_store
+        from core.typecode import TYPE_NAMES, type_to_code
+        try:
+            skipped = 0
+            if not args.roster:
+                types = [type_to_code(mbti) for mbti in args.members]
+                ids = list(range(len(types)))
+            elif args.roster != "-" and is_profile_store(args.roster):
+                # Members are identified by their position in the store
+                types = ProfileStore(args.roster).types
+                ids = None
+            else:
+                fmt = args.input_format or ('csv' if args.roster == "-" else detect_format(args.roster))
+                if args.roster == "-":
+                    ids, types, _, skipped = read_profiles(sys.stdin, fmt)
+                else:
+                    with open(args.roster, 'r', encoding='utf-8', newline='') as f:
+                        ids, types, _, skipped = read_profiles(f, fmt)
+            mask = socionics.ALL_TYPES
+            for group in args.select:
+                mask &= socionics.group_mask(group)
+            for relation, mbti in args.relation:
+                mask &= socionics.relation_mask(mbti, relation)
+            summary = socionics.team_summary(types)
+            selected = None
+            if args.select or args.relation:
+                selected = [
+                    {'id': int(row) if ids is None else ids[row], 'type': TYPE_NAMES[types[row]]}
+                    for row in socionics.roster_select(types, mask)
+                ]
+        except (OSError, ValueError, ImportError) as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        if args.format == "json":
+            print(json.dumps({**summary, 'selected': selected}, ensure_ascii=False))
+        else:
+            print(f"Team of {summary['size']}")
+            print("  Types: " + (", ".join(f"{mbti} {n}" for mbti, n in summary['types'].items()) or "none"))
+            for key in ('quadras', 'clubs', 'temperaments'):
+                print(f"  {key.title()}: " + ", ".join(f"{name} {n}" for name, n in summary[key].items()))
+            print("  Dichotomies: " + ", ".join(
+                f"{name} {first}/{second}" for name, (first, second) in summary['dichotomies'].items()
+            ))
+            missing = summary['missing_duals']
+            print("  Missing duals: " + (", ".join(f"{dual} (for {mbti})" for mbti, dual in missing.items()) or "none"))
+            if selected is not None:
+                print(f"Selected {len(selected)}:")
+                for member in selected:
+                    print(f"  {member['id']} ({member['type']})")
+        if skipped:
+            print(f"Skipped {skipped} invalid profiles", file=sys.stderr)
 
     else:
         print("Invalid command. Use --help for more information.")
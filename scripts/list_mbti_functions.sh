@@ -4,38 +4,13 @@
 SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
 PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
 
-# If no arguments given, use all 16 MBTI types
+# Lists all 16 MBTI types when no arguments are given. All types are
+# handled by a single `eidon.py list` process.
 if [ "$#" -eq 0 ]; then
-  mbti_types=(
-    ISTJ ISFJ INFJ INTJ
-    ISTP ISFP INFP INTP
-    ESTP ESFP ENFP ENTP
-    ESTJ ESFJ ENFJ ENTJ
-  )
+  echo "Listing cognitive functions for all MBTI types"
 else
-  # Use types passed as arguments (convert to uppercase)
-  mbti_types=()
-  for arg in "$@"; do
-    mbti_types+=("$(echo "$arg" | tr '[:lower:]' '[:upper:]')")
-  done
+  echo "Listing cognitive functions for MBTI types: $*"
 fi
-
-echo "Listing cognitive functions for MBTI types: ${mbti_types[*]}"
 echo "----------------------------------------------------------"
 
-for type in "${mbti_types[@]}"
-do
-  echo "MBTI Type: $type"
-  # Run analyze command from project root
-  output=$(cd "$PROJECT_ROOT" && python3 eidon.py analyze --type "$type" --functions ego subconscious unconscious superego 2>/dev/null)
-
-  if [[ -z "$output" ]]; then
-    echo "  ERROR: No output for $type"
-  else
-    # Indent output lines for readability
-    echo "$output" | sed 's/^/  /'
-  fi
-
-  echo "----------------------------------------------------------"
-done
-
+cd "$PROJECT_ROOT" && python3 eidon.py list "$@"
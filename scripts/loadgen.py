@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Small load generator for `eidon.py serve`.
+
+Opens keep-alive connections, sends requests (optionally pipelined) and
+reports throughput and latency percentiles.
+
+    python3 eidon.py serve --port 8765 &
+    python3 scripts/loadgen.py --port 8765 --connections 4 --requests 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+PAYLOADS = {
+    'infer': ('/infer', {'stack': ['Ni', 'Fe', 'Ti', 'Se']}),
+    'analyze': ('/analyze', {'type': 'INFJ'}),
+    'relation': ('/relation', {'type': 'INFJ', 'compare_to': 'ENTP'}),
+    'bigfive': ('/bigfive', {'bigfive': [60, 50, 40, 70, 30], 'type': 'INFJ'}),
+    'cbt': ('/cbt', {'text': 'I always ruin everything and it is all my fault'}),
+}
+
+
+def build_request(endpoint, host):
+    path, payload = PAYLOADS[endpoint]
+    body = json.dumps(payload).encode('utf-8')
+    head = (
+        f"POST {path} HTTP/1.1\r\n"
+        f"Host: {host}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode('latin-1') + body
+
+
+async def read_response(reader):
+    status = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status.split()[1])
+
+
+async def worker(args, requests, count, latencies, errors):
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    sent = 0
+    while sent < count:
+        depth = min(args.pipeline, count - sent)
+        batch = b''.join(requests[(sent + i) % len(requests)] for i in range(depth))
+        start = time.perf_counter()
+        writer.write(batch)
+        for _ in range(depth):
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+        sent += depth
+    writer.close()
+
+
+def percentile(sorted_values, p):
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run(args):
+    endpoints = list(PAYLOADS) if args.endpoint == 'mix' else [args.endpoint]
+    requests = [build_request(endpoint, args.host) for endpoint in endpoints]
+    per_connection = args.requests // args.connections
+    latencies, errors = [], []
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        worker(args, requests, per_connection, latencies, errors)
+        for _ in range(args.connections)
+    ))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"Requests: {len(latencies)}  Errors: {len(errors)}  Time: {elapsed:.2f}s  "
+          f"Throughput: {len(latencies) / elapsed:,.0f} req/s")
+    for p in (50, 90, 99, 99.9):
+        print(f"p{p}: {percentile(latencies, p) * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for eidon serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="Connect to a Unix socket instead of TCP")
+    parser.add_argument("--connections", type=int, default=1, help="Concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=10000, help="Total requests to send")
+    parser.add_argument("--pipeline", type=int, default=1, help="Requests in flight per connection")
+    parser.add_argument(
+        "--endpoint",
+        default="mix",
+        choices=["mix"] + list(PAYLOADS),
+        help="Endpoint to exercise (default: rotate through all)"
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
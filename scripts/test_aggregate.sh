@@ -0,0 +1,125 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing that merged aggregate shards equal a single pass over all rows (with and without quantiles)..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+import csv, json, os, random, subprocess, sys, tempfile
+from collections import defaultdict
+import numpy as np
+from core.bigfive import TRAITS
+from core.normstore import NormStore
+from core.typecode import TYPE_NAMES
+
+def fail(message):
+    print(f"  FAIL: {message}")
+
+# Rows with two-decimal scores, scores on the range ends, and invalid rows
+# (unknown type, out-of-range or missing score) that are counted as skipped
+rng = random.Random(0)
+rows = []
+for _ in range(20000):
+    mbti = rng.choice(TYPE_NAMES[:12])
+    scores = [rng.choice([0.0, 100.0]) if rng.random() < 0.02 else round(rng.gauss(50, 15) % 100, 2) for _ in TRAITS]
+    if rng.random() < 0.02:
+        mbti, scores = rng.choice([("XXXX", scores), (mbti, scores[:4] + [150.0]), (mbti, scores[:4] + [""])])
+    rows.append((mbti, scores))
+valid = [(mbti, scores) for mbti, scores in rows if mbti in TYPE_NAMES and all(s != "" and 0 <= s <= 100 for s in scores)]
+
+def write_csv(path, part, header):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows([mbti, *scores] for mbti, scores in part)
+
+def write_jsonl(path, part, bigfive):
+    with open(path, "w") as f:
+        for mbti, scores in part:
+            record = {"bigfive": scores} if bigfive else dict(zip(TRAITS, scores))
+            f.write(json.dumps({"type": mbti, **record}) + "\n")
+
+def aggregate(*args):
+    result = subprocess.run([sys.executable, "eidon.py", "aggregate", *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        command = " ".join(["eidon.py aggregate", *args])
+        fail(f"{command} exited with {result.returncode}: {result.stderr.strip()}")
+    return result.stderr.splitlines()[0] if result.stderr else ""
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+with tempfile.TemporaryDirectory() as tmp:
+    everything = os.path.join(tmp, "all.csv")
+    write_csv(everything, rows, ["type", *TRAITS])
+    # Uneven shards in every input format, one of them empty
+    cuts = [0, 7000, 7000, 7001, 15000, len(rows)]
+    shards = []
+    for i, (start, end) in enumerate(zip(cuts, cuts[1:])):
+        part = rows[start:end]
+        if i % 3 == 0:
+            shards.append(os.path.join(tmp, f"shard{i}.csv"))
+            write_csv(shards[-1], part, ["mbti", "O", "C", "E", "A", "N"])
+        else:
+            shards.append(os.path.join(tmp, f"shard{i}.jsonl"))
+            write_jsonl(shards[-1], part, bigfive=i % 3 == 1)
+
+    for options in ([], ["--quantiles"]):
+        label = " ".join(options) or "means only"
+        partials = []
+        for shard in shards:
+            partials.append(shard + ".partial.json")
+            aggregate(shard, *options, "--partial", partials[-1])
+        for suffix in ("json", "bin"):
+            single = os.path.join(tmp, f"single.{suffix}")
+            summary = aggregate(everything, *options, "--output", single)
+            merges = {
+                "merged": ["--merge", *partials],
+                "merged in reverse": ["--merge", *reversed(partials)],
+                "shard plus merged partials": [shards[0], *options, "--merge", *partials[1:]],
+            }
+            for name, args in merges.items():
+                merged = os.path.join(tmp, f"merged.{suffix}")
+                merged_summary = aggregate(*args, "--output", merged)
+                if read_bytes(merged) != read_bytes(single):
+                    fail(f"{label}: {name} .{suffix} norms differ from a single pass")
+                if merged_summary != summary:
+                    fail(f"{label}: {name}: {merged_summary!r}, single pass {summary!r}")
+
+        # The single pass itself agrees with a direct computation
+        by_type = defaultdict(list)
+        for mbti, scores in valid:
+            by_type[mbti].append(scores)
+            by_type["*"].append(scores)
+        with NormStore(os.path.join(tmp, "single.bin")) as store:
+            for mbti, group in by_type.items():
+                values = np.array(group)
+                cell = store.cell(None if mbti == "*" else mbti)
+                if cell is None or cell.n != len(values):
+                    fail(f"{label}: {mbti} has {cell and cell.n} rows, expected {len(values)}")
+                    continue
+                means, sds = values.mean(axis=0), values.std(axis=0, ddof=1)
+                for i, trait in enumerate(TRAITS):
+                    if abs(cell.means[i] - means[i]) > 0.006 or abs(cell.sds[i] - sds[i]) > 0.006:
+                        fail(f"{label}: {mbti} {trait} mean {cell.means[i]}, SD {cell.sds[i]}, expected {means[i]:.4f}, {sds[i]:.4f}")
+                    if options:
+                        # The sketch has 0.1-point bins, interpolated linearly
+                        exact = np.quantile(values[:, i], store.quantile_probs, method="inverted_cdf")
+                        error = max(abs(q - e) for q, e in zip(cell.quantiles[i], exact))
+                        if error > 0.11:
+                            fail(f"{label}: {mbti} {trait} quantiles {cell.quantiles[i]}, expected {exact.tolist()}")
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
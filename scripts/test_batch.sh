@@ -0,0 +1,51 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing batch requests with several rows (one result per row, as for single-row requests)..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+import json, subprocess, sys
+
+def fail(message):
+    print(f"  FAIL: {message}")
+
+stacks = [["Ni", "Fe"], ["Ti"], ["?", "Ne", "?", "Si"]]
+strengths = [[1, 2, 3, 4, 5, 6, 7, 8], [1, 1, 1, 1, 1, 1, 1, 1], {"Ni": 9, "Fe": 7}]
+requests = [
+    {"id": "stacks", "op": "infer_type_distribution", "stack": stacks},
+    {"id": "strengths", "op": "infer_type_distribution", "strengths": strengths[:2], "temperature": 0.5},
+]
+requests += [{"id": f"stack {i}", "op": "infer_type_distribution", "stack": s} for i, s in enumerate(stacks)]
+requests += [{"id": f"strengths {i}", "op": "infer_type_distribution", "strengths": s, "temperature": 0.5}
+             for i, s in enumerate(strengths)]
+lines = "".join(json.dumps(request) + "\n" for request in requests)
+
+result = subprocess.run([sys.executable, "eidon.py", "batch"], input=lines, capture_output=True, text=True)
+if result.returncode != 0:
+    fail(f"batch exited with {result.returncode}: {result.stderr.strip()[-300:]}")
+records = {record["id"]: record for record in map(json.loads, result.stdout.splitlines())}
+if len(records) != len(requests):
+    fail(f"{len(records)} records for {len(requests)} requests")
+for name, count in (("stack", len(stacks)), ("strengths", 2)):
+    several = records.get(name + "s" if name == "stack" else name, {})
+    if "error" in several or "result" not in several:
+        fail(f"{name} rows: {several}")
+        continue
+    singles = [records.get(f"{name} {i}", {}).get("result", {}).get("types") for i in range(count)]
+    if several["result"]["types"] != singles:
+        fail(f"{name} rows: results differ from one request per row")
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
@@ -0,0 +1,129 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing CBT distortion matching against one regex per keyword, streaming against whole-text counts, and parallel analysis order..."
+
+TMP_DIR="$(mktemp -d)"
+trap 'rm -rf "$TMP_DIR"' EXIT
+
+# A test lexicon with overlapping, prefix, shared, multi-word and regex keywords,
+# and keywords starting with punctuation
+cat > "$TMP_DIR/lexicon.json" <<'EOF'
+{
+  "overgeneralization": {"name": "Overgeneralization", "description": "d", "reframe": "r",
+                         "keywords": ["always", "never", "no one", "no", "everyone", "every time"]},
+  "should_statements": {"name": "Should Statements", "description": "d", "reframe": "r",
+                        "keywords": ["should", "should have", "must", "ought to", "no one"]},
+  "labeling": {"name": "Labeling", "description": "d", "reframe": "r",
+               "keywords": ["loser", "failure", "\\bfail(?:ed|s)?\\b", "c++", "toujours", "-ish", "'til"]}
+}
+EOF
+
+output=$(cd "$PROJECT_ROOT" && EIDON_CBT_LEXICONS="$TMP_DIR/lexicon.json" EIDON_CACHE_DIR="$TMP_DIR/cache" python3 -c '
+import io, random, re
+from collections import Counter
+from core.cbt import (
+    CBT_DISTORTIONS, DistortionMatcher, ParallelCBTAnalyzer, analyze_cbt_stream, analyze_cbt_thought,
+    count_distortions, iter_cbt_sentences, load_matcher,
+)
+
+def fail(message):
+    print(f"  FAIL: {message}")
+
+# Random texts mixing keywords, near misses and separators, in mixed case
+WORDS = [
+    "always", "never", "no one", "no", "everyone", "every time", "should", "should have", "must",
+    "ought to", "loser", "failure", "fail", "failed", "fails", "c++", "toujours",
+    "-ish", "\x27til", "nowhere", "noone", "shoulder", "failing", "alwaysly", "musty", "i", "the", "one", "have", "time",
+]
+SEPARATORS = [" ", " ", " ", ", ", ". ", "! ", "? ", "\n", "-", "\x27", "  ", ""]
+rng = random.Random(0)
+def random_text(n):
+    parts = []
+    for _ in range(n):
+        word = rng.choice(WORDS)
+        parts.append(word.upper() if rng.random() < 0.1 else word.title() if rng.random() < 0.1 else word)
+        parts.append(rng.choice(SEPARATORS))
+    return "".join(parts)
+texts = [random_text(rng.randint(0, 60)) for _ in range(300)]
+
+def reference_hits(text):
+    hits = Counter()
+    for key, distortion in CBT_DISTORTIONS.items():
+        for pattern in distortion["keywords"]:
+            for match in re.finditer(pattern, text):
+                hits[match.start(), match.end(), key] += 1
+    return hits
+
+matcher = DistortionMatcher(CBT_DISTORTIONS)
+cached = load_matcher(CBT_DISTORTIONS)
+reloaded = load_matcher(CBT_DISTORTIONS)
+# Short texts are matched branch by branch until the whole alternation is
+# compiled; once it is, every text is scanned with it
+full = load_matcher(CBT_DISTORTIONS)
+full.regex
+for index, text in enumerate(texts):
+    lowered = text.lower()
+    expected = reference_hits(lowered)
+    for label, candidate in (("compiled", matcher), ("cached", cached), ("reloaded", reloaded), ("whole regex", full)):
+        actual = Counter((start, end, key) for start, end, _, keys in candidate.finditer(lowered) for key in keys)
+        if actual != expected:
+            fail(f"{label} matcher, text {index}: {sorted(actual - expected)} extra, {sorted(expected - actual)} missing")
+    if list(cached.finditer(lowered)) != list(full.finditer(lowered)):
+        fail(f"text {index}: hits matched branch by branch come in another order than with the whole regex")
+    counts = Counter(key for _, _, key in expected.elements())
+    if count_distortions(text) != {key: counts[key] for key in CBT_DISTORTIONS if key in counts}:
+        fail(f"count_distortions, text {index}: {count_distortions(text)}")
+
+# Spans index the caller\x27s text, even where lowercasing changes its length
+text = "\u0130stanbul NEVER fails. \u0130\u0130 always"
+spans = sorted(span for hit in analyze_cbt_thought(text).distortions for span in hit.spans)
+if [text[start:end].lower() for start, end in spans] != ["never", "fails", "always"]:
+    fail(f"analyze_cbt_thought spans {spans} index {[text[start:end] for start, end in spans]}")
+if sum(count_distortions(text).values()) != len(spans):
+    fail(f"count_distortions {count_distortions(text)} disagrees with spans {spans}")
+
+# Streaming: per-sentence counts add up to the whole-text counts for any
+# chunk size, including keywords across chunk boundaries and forced splits
+document = "".join(texts)
+whole = count_distortions(document)
+for chunk_size in (1, 3, 16, 97, 4096):
+    for max_sentence in (None, 4, 30):
+        totals = Counter()
+        previous_end = 0
+        for sentence in iter_cbt_sentences(io.StringIO(document), chunk_size, max_sentence, include_empty=True):
+            if document[sentence["start"]:sentence["end"]] != sentence["text"] or sentence["start"] < previous_end:
+                fail(f"chunk_size={chunk_size}, max_sentence={max_sentence}: sentence at {previous_end}+ has wrong offsets")
+                break
+            previous_end = sentence["end"]
+            totals.update(sentence["counts"])
+        if dict(totals) != whole:
+            fail(f"chunk_size={chunk_size}, max_sentence={max_sentence}: sentence totals {dict(totals)}, whole text {whole}")
+        streamed = analyze_cbt_stream(io.StringIO(document), chunk_size, max_sentence)["counts"]
+        if streamed != whole:
+            fail(f"analyze_cbt_stream chunk_size={chunk_size}, max_sentence={max_sentence}: {streamed}, whole text {whole}")
+
+# Parallel records come back in input order, whatever order the chunks finish in
+records = texts * 4
+expected = [count_distortions(text) for text in records]
+for workers, chunk_size in ((1, 5), (3, 1), (3, 7), (4, 1000)):
+    with ParallelCBTAnalyzer(workers, chunk_size) as analyzer:
+        actual = list(analyzer.imap(iter(records)))
+    if actual != expected:
+        wrong = next((i for i, (a, e) in enumerate(zip(actual, expected)) if a != e), min(len(actual), len(expected)))
+        fail(f"ParallelCBTAnalyzer(workers={workers}, chunk_size={chunk_size}): {len(actual)} results, first mismatch at record {wrong}")
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
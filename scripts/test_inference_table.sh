@@ -0,0 +1,42 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing precomputed stack inference table against weighted scan scoring (4096 stacks)..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+from core.functions import infer_many, verify_inference_table
+for stack, expected, actual in verify_inference_table():
+    stack_str = "-".join(stack)
+    print(f"  FAIL: {stack_str}: expected {expected}, table has {actual}")
+
+# Out-of-range keys are rejected the same way with and without NumPy input
+try:
+    import numpy as np
+except ImportError:
+    np = None
+for keys in ([-1], [4096], [70000], [0, -5]):
+    for label, value in (("list", keys), ("ndarray", np.array(keys) if np is not None else None)):
+        if value is None:
+            continue
+        try:
+            infer_many(value)
+            print(f"  FAIL: infer_many({label} {keys}) accepted out-of-range keys")
+        except ValueError:
+            pass
+        except Exception as e:
+            print(f"  FAIL: infer_many({label} {keys}) raised {type(e).__name__}: {e}")
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
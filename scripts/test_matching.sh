@@ -0,0 +1,94 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing MatchPool against a brute-force ranking of every pool member (relation preference, Big Five distance, pool order)..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+import math, random
+import numpy as np
+from core.matching import DEFAULT_PREFERENCE, MatchPool
+from core.socionics import RELATIONS, get_exact_relation
+from core.typecode import TYPE_NAMES
+
+def fail(message):
+    print(f"  FAIL: {message}")
+
+def brute_force(pool_types, pool_scores, query_type, query_scores, k, preference, exclude):
+    """Rank every other pool member by preference, then distance, then pool position."""
+    rank = {name: i for i, name in enumerate(preference)}
+    scored = query_scores is not None and not any(math.isnan(v) for v in query_scores)
+    ranked = []
+    for position, (partner_type, scores) in enumerate(zip(pool_types, pool_scores)):
+        relation = get_exact_relation(TYPE_NAMES[query_type], TYPE_NAMES[partner_type])
+        if position == exclude or relation not in rank:
+            continue
+        distance = math.nan
+        if scored:
+            distance = math.dist(query_scores, scores)
+        ranked.append((rank[relation], math.inf if math.isnan(distance) else distance, position, relation, distance))
+    ranked.sort()
+    return [(position, relation, distance) for _, _, position, relation, distance in ranked[:k]]
+
+def compare(label, pool, pool_types, pool_scores, query_types, query_scores, result, k, preference, excludes):
+    for row, query_type in enumerate(query_types):
+        scores = None if query_scores is None else query_scores[row]
+        expected = brute_force(pool_types, pool_scores, query_type, scores, k, preference, excludes[row])
+        actual = [(position, RELATIONS[relation], distance) for position, relation, distance in zip(
+            result["partners"][row].tolist(), result["relations"][row].tolist(), result["distances"][row].tolist())
+            if position >= 0]
+        same = len(actual) == len(expected) and all(
+            a[:2] == e[:2] and (math.isnan(a[2]) and math.isnan(e[2]) or abs(a[2] - e[2]) < 1e-9)
+            for a, e in zip(actual, expected))
+        if not same:
+            fail(f"{label}, query {row} ({TYPE_NAMES[query_type]}): {actual}, expected {expected}")
+        padding = result["partners"][row, len(actual):]
+        if (padding != -1).any() or (result["relations"][row, len(actual):] != 255).any():
+            fail(f"{label}, query {row}: partners past the last match are not padded")
+
+rng = random.Random(0)
+preferences = [DEFAULT_PREFERENCE, ("Identity", "Conflict", "Duality"), ("Super-Ego",)]
+for case in range(12):
+    size = rng.choice([0, 1, 5, 40, 300])
+    # Few types, so some buckets are empty or small; whole-number scores
+    # from a short list, so distances tie and are computed exactly
+    types_in_pool = rng.sample(range(16), rng.choice([1, 4, 16]))
+    pool_types = [rng.choice(types_in_pool) for _ in range(size)]
+    levels = [rng.choice([0, 25, 50, 75, 100]) for _ in range(3)]
+    pool_scores = [[rng.choice(levels) for _ in range(5)] for _ in range(size)]
+    for scores in pool_scores:
+        if rng.random() < 0.1:
+            scores[rng.randrange(5)] = math.nan
+    k = rng.choice([1, 3, 8, 50])
+    preference = preferences[case % len(preferences)]
+    pool = MatchPool([TYPE_NAMES[t] for t in pool_types], bigfive=pool_scores if size else np.empty((0, 5)))
+
+    # External queries, with and without scores
+    query_types = [rng.randrange(16) for _ in range(60)]
+    query_scores = [[rng.choice(levels) for _ in range(5)] for _ in query_types]
+    query_scores[0][2] = math.nan
+    for scores in (None, query_scores):
+        result = pool.match(query_types, scores, k=k, preference=preference)
+        label = f"case {case}: match({len(query_types)} queries, {size} pool, k={k}, scores={scores is not None})"
+        compare(label, pool, pool_types, pool_scores, query_types, scores, result, k, preference, [-1] * len(query_types))
+
+    # Pool members against the rest of the pool
+    for use_bigfive in (False, True):
+        result = pool.match_members(k=k, preference=preference, use_bigfive=use_bigfive)
+        label = f"case {case}: match_members({size} pool, k={k}, use_bigfive={use_bigfive})"
+        compare(label, pool, pool_types, pool_scores, pool_types, pool_scores if use_bigfive else None,
+                result, k, preference, list(range(size)))
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
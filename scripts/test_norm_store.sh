@@ -0,0 +1,206 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing JSON to binary norms store round-trips (flat and stratified norms, stratum fallback) and percentiles..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+import json, math, os, random, subprocess, sys, tempfile
+import numpy as np
+from core.bigfive import TRAITS, BigFiveBatch, BigFiveNorms, BigFiveProfile
+from core.normstore import ANY, NormStore
+from core.percentiles import QuantileTable, normal_cdf, normal_cdf_array, normal_percentile
+from core.typecode import TYPE_NAMES
+
+def fail(message):
+    print(f"  FAIL: {message}")
+
+def close(a, b):
+    """Equal within float32 storage precision, NaN matching NaN or None."""
+    if a is None or b is None or math.isnan(a) or math.isnan(b):
+        return (a is None or math.isnan(a)) and (b is None or math.isnan(b))
+    return abs(a - b) <= 1e-4 * max(1.0, abs(b))
+
+def convert(source, target):
+    subprocess.run([sys.executable, "eidon.py", "norms", "convert", source, target], check=True, capture_output=True)
+
+with tempfile.TemporaryDirectory() as tmp:
+    # Flat per-type norms: the binary store gives back the same means
+    flat_json = os.path.join("data", "mbti_bigfive_norms.json")
+    flat_bin = os.path.join(tmp, "flat.bin")
+    convert(flat_json, flat_bin)
+    with open(flat_json) as f:
+        flat = json.load(f)
+    with NormStore(flat_bin) as store:
+        means = store.type_means()
+    if set(means) != set(flat):
+        fail(f"flat norms: types {sorted(means)} read back, expected {sorted(flat)}")
+    for mbti, traits in flat.items():
+        for trait, mean in traits.items():
+            if not close(means.get(mbti, {}).get(trait), mean):
+                fail(f"flat norms: {mbti} {trait} read back as {means.get(mbti, {}).get(trait)}, expected {mean}")
+
+    # BigFiveNorms gives the same reports from either file
+    profiles = [((60, 50, 40, 70, 30), "INFJ"), ((20, 80, 90, 10, 55), "ESTJ"), ((50, 50, 50, 50, 50), None)]
+    reports = {}
+    for path in (flat_json, flat_bin):
+        BigFiveNorms.reload(path, force=True)
+        reports[path] = [BigFiveProfile(*scores, mbti_type=mbti).get_report() for scores, mbti in profiles]
+    if reports[flat_json] != reports[flat_bin]:
+        fail("reports from the JSON norms and their binary conversion differ")
+
+    # Stratified norms: every cell reads back, and missing cells widen
+    # country, then sex, then age
+    rng = random.Random(0)
+    quantiles = [0.1, 0.25, 0.5, 0.75, 0.9]
+    ages, sexes, countries = ["18-24", "25-34", "65+"], ["F", "M"], ["DE", "US"]
+    cells = {}
+    for mbti in [ANY] + list(TYPE_NAMES):
+        for age in [ANY] + ages:
+            for sex in [ANY] + sexes:
+                for country in [ANY] + countries:
+                    if (age, sex, country) != (ANY, ANY, ANY) and rng.random() < 0.4:
+                        continue
+                    cell = {"type": mbti, "age": age, "sex": sex, "country": country, "n": rng.randint(1, 5000)}
+                    for trait in TRAITS:
+                        if rng.random() < 0.1:
+                            continue
+                        mean = round(rng.uniform(20, 80), 2)
+                        values = sorted(round(rng.uniform(0, 100), 2) for _ in quantiles)
+                        cell[trait] = {
+                            "mean": mean,
+                            "sd": None if rng.random() < 0.2 else round(rng.uniform(5, 15), 3),
+                            "quantiles": [None if rng.random() < 0.1 else v for v in values],
+                        }
+                    cells[mbti, age, sex, country] = cell
+    strat_json = os.path.join(tmp, "strata.json")
+    strat_bin = os.path.join(tmp, "strata.bin")
+    with open(strat_json, "w") as f:
+        json.dump({"quantiles": quantiles, "cells": list(cells.values())}, f)
+    convert(strat_json, strat_bin)
+
+    with NormStore(strat_bin) as store:
+        if tuple(store.quantile_probs) != tuple(quantiles):
+            fail(f"stratified norms: quantile probabilities {store.quantile_probs}, expected {quantiles}")
+        for mbti in [ANY] + list(TYPE_NAMES):
+            for age in [ANY] + ages:
+                for sex in [ANY] + sexes:
+                    for country in [ANY] + countries:
+                        key = (mbti, age, sex, country)
+                        expected = cells.get(key)
+                        labels = [None if label == ANY else label for label in key]
+                        cell = store.cell(*labels)
+                        populated = expected is not None and any(trait in expected for trait in TRAITS)
+                        if not populated:
+                            if cell is not None:
+                                fail(f"stratified norms: {key} is empty but read back as {cell}")
+                        elif cell is None:
+                            fail(f"stratified norms: {key} not read back")
+                        else:
+                            if cell.key != key or cell.n != expected["n"]:
+                                fail(f"stratified norms: {key} read back as {cell.key}, n={cell.n}")
+                            for i, trait in enumerate(TRAITS):
+                                stats = expected.get(trait, {})
+                                pairs = [(cell.means[i], stats.get("mean")), (cell.sds[i], stats.get("sd"))]
+                                pairs += zip(cell.quantiles[i], stats.get("quantiles") or [None] * len(quantiles))
+                                if not all(close(actual, want) for actual, want in pairs):
+                                    fail(f"stratified norms: {key} {trait} read back as {pairs}")
+
+                        # Fallback order of lookup()
+                        want = None
+                        for stratum in ((age, sex, country), (age, sex, ANY), (age, ANY, ANY), (ANY, ANY, ANY)):
+                            candidate = cells.get((mbti, *stratum))
+                            if candidate is not None and any(trait in candidate for trait in TRAITS):
+                                want = (mbti, *stratum)
+                                break
+                        found = store.lookup(*labels)
+                        if (found.key if found is not None else None) != want:
+                            fail(f"stratified norms: lookup{tuple(labels)} found {found and found.key}, expected {want}")
+
+        # A numeric age selects its band
+        for years, band in ((19, "18-24"), (30, "25-34"), (70, "65+")):
+            by_years, by_band = store.lookup("INFJ", years, "F", "US"), store.lookup("INFJ", band, "F", "US")
+            if (by_years and by_years.key) != (by_band and by_band.key):
+                fail(f"stratified norms: age {years} selected {by_years and by_years.key}, band {band} {by_band and by_band.key}")
+
+    # Batches and single profiles give the same percentiles, from quantile
+    # tables where the store has them, the normal CDF for population norms
+    # otherwise (the column CDF table is accurate to about 3e-8, or 3e-6
+    # percentile points), and none for type norms without a table
+    scores = [[round(rng.uniform(0, 100), 2) for _ in TRAITS] for _ in range(400)]
+    types = [rng.choice(list(TYPE_NAMES) + [None, "XXXX"]) for _ in scores]
+    for path in (flat_json, strat_bin):
+        BigFiveNorms.reload(path, force=True)
+        batch = BigFiveBatch(scores, [mbti or "" for mbti in types])
+        snapshot = batch.norms_snapshot
+        exact, shown, typed = batch.percentiles(exact=True), batch.percentiles(), batch.uses_type_norms()
+        for row, (values, mbti) in enumerate(zip(scores, types)):
+            report = BigFiveProfile(*values, mbti_type=mbti).analyze(snapshot)
+            if (report.norms == "type") != bool(typed[row]):
+                fail(f"{path}: row {row} ({mbti}) uses {report.norms} norms in a report but not in the batch")
+                continue
+            tables = snapshot.quantile_tables(mbti if report.norms == "type" else None)
+            for i, trait in enumerate(report.traits):
+                if trait.trait in tables:
+                    want = tables[trait.trait].percentile(trait.score)
+                elif report.norms == "population":
+                    want = normal_percentile(trait.score, 50.0, 10.0)
+                else:
+                    want = None
+                if want is None:
+                    # Type norms without a quantile table give no percentile
+                    if not math.isnan(exact[row, i]) or trait.percentile is not None:
+                        fail(f"{path}: row {row} ({mbti}) {trait.trait} percentile {exact[row, i]} in the batch, {trait.percentile} in the report, expected none")
+                    continue
+                if abs(exact[row, i] - want) > 1e-5:
+                    fail(f"{path}: row {row} ({mbti}) {trait.trait} exact percentile {exact[row, i]}, expected {want}")
+                if shown[row, i] != trait.percentile:
+                    fail(f"{path}: row {row} ({mbti}) {trait.trait} percentile {shown[row, i]} in the batch, {trait.percentile} in the report")
+    BigFiveNorms.reload(flat_json, force=True)
+
+# The column CDF table agrees with the exact scalar CDF
+z = np.concatenate([np.linspace(-12, 12, 200001), [np.nan, -np.inf, np.inf]])
+table = normal_cdf_array(z)
+exact = np.array([normal_cdf(v) if not math.isnan(v) else math.nan for v in z.tolist()])
+error = np.nanmax(np.abs(table - exact))
+if error > 1e-7 or not np.array_equal(np.isnan(table), np.isnan(exact)):
+    fail(f"normal_cdf_array differs from normal_cdf by up to {error}")
+
+# Quantile tables: the knots map to their probabilities, the CDF is
+# monotone even for noisy or partial quantiles, and columns equal scalars
+grid = np.linspace(-5, 105, 11001)
+probs = [0.01 * k for k in range(1, 100)]
+sample = np.clip(np.random.default_rng(0).normal(50, 12, 20000), 0, 100)
+knots = np.quantile(sample, probs).tolist()
+empirical = QuantileTable(probs, knots)
+for p, v in zip(probs, knots):
+    if abs(empirical.percentile(v) - 100 * p) > 1e-9:
+        fail(f"quantile table: the {p:.2f} quantile {v} has percentile {empirical.percentile(v)}")
+below = 100.0 * np.searchsorted(np.sort(sample), grid[(grid > 0) & (grid < 100)]) / len(sample)
+error = np.max(np.abs(empirical.percentiles(grid[(grid > 0) & (grid < 100)]) - below))
+if error > 1.0:
+    fail(f"quantile table percentiles differ from the sample fraction below by up to {error}")
+noisy = [v + rng.uniform(-8, 8) if rng.random() < 0.5 else (math.nan if rng.random() < 0.2 else v) for v in knots]
+for label, quantile_table in (("empirical", empirical), ("noisy", QuantileTable(probs, noisy)),
+                              ("partial", QuantileTable([0.5, 0.9], [math.nan, 70.0]))):
+    column = quantile_table.percentiles(grid)
+    scalars = np.array([quantile_table.percentile(v) for v in grid.tolist()])
+    if np.any(np.diff(scalars) < 0) or scalars[0] != 0.0 or scalars[-1] != 100.0:
+        fail(f"{label} quantile table: percentiles are not a monotone 0-100 CDF")
+    if np.max(np.abs(column - scalars)) > 1e-9:
+        fail(f"{label} quantile table: column percentiles differ from scalar ones by up to {np.max(np.abs(column - scalars))}")
+
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
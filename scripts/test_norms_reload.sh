@@ -0,0 +1,128 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing thread-safe norms loading and hot reload (first-load race, atomic swap, pinned snapshots)..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+import contextlib, gc, io, json, os, tempfile, threading, weakref
+from core.bigfive import TRAITS, BigFiveBatch, BigFiveNorms, BigFiveProfile
+from core.normstore import convert_json_norms
+from core.typecode import TYPE_CODES, TYPE_NAMES
+
+def norms_file(path, openness):
+    """Write norms with every type at openness, other traits 50, replacing path in one rename."""
+    norms = {mbti: {trait: (openness if trait == "openness" else 50.0) for trait in TRAITS} for mbti in TYPE_NAMES}
+    with open(path + ".tmp", "w") as f:
+        json.dump(norms, f)
+    os.replace(path + ".tmp", path)
+
+def openness(snapshot):
+    return snapshot.norms["INFJ"]["openness"]
+
+def fail(message):
+    print(f"  FAIL: {message}")
+
+with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, "norms.json")
+    norms_file(path, 60.0)
+    os.environ["EIDON_NORMS_FILE"] = path
+
+    # Threads racing for the first load read the file once
+    reads = []
+    read_snapshot = BigFiveNorms._read_snapshot.__func__
+    def counting_read(cls, filepath, strict=False):
+        reads.append(filepath)
+        return read_snapshot(cls, filepath, strict)
+    BigFiveNorms._read_snapshot = classmethod(counting_read)
+    barrier = threading.Barrier(16)
+    seen = []
+    def first_load():
+        barrier.wait()
+        seen.append(BigFiveNorms.snapshot())
+    threads = [threading.Thread(target=first_load) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if len(reads) != 1 or len({id(snapshot) for snapshot in seen}) != 1:
+        fail(f"16 racing first loads read the file {len(reads)} times and saw {len({id(s) for s in seen})} snapshots")
+
+    # A batch keeps the norms it was created with; report() agrees with its arrays
+    batch = BigFiveBatch([[70, 50, 50, 50, 50]], ["INFJ"])
+    old = BigFiveNorms.snapshot()
+    norms_file(path, 80.0)
+    if not BigFiveNorms.reload():
+        fail("reload() did not pick up changed norms")
+    if openness(BigFiveNorms.snapshot()) != 80.0:
+        fail(f"reloaded openness norm is {openness(BigFiveNorms.snapshot())}, expected 80.0")
+    if float(batch.norms()[0, 0]) != 60.0:
+        fail(f"batch created before the reload uses openness norm {float(batch.norms()[0, 0])}, expected 60.0")
+    if batch.report(0) != BigFiveProfile(70, 50, 50, 50, 50, mbti_type="INFJ").get_report(old):
+        fail("batch report() does not use the batch snapshot")
+    if batch.report(0) == BigFiveProfile(70, 50, 50, 50, 50, mbti_type="INFJ").get_report():
+        fail("batch report() follows the reloaded norms")
+
+    # Unchanged content is not re-read; a half-written file keeps the loaded norms
+    current = BigFiveNorms.snapshot()
+    os.utime(path)
+    if BigFiveNorms.reload() or BigFiveNorms.snapshot().norms is not current.norms:
+        fail("reload() re-read a touched but unchanged file")
+    with open(path, "w") as f:
+        f.write("{\"INFJ\": {")
+    warning = io.StringIO()
+    with contextlib.redirect_stderr(warning):
+        reloaded = BigFiveNorms.reload()
+    if reloaded or openness(BigFiveNorms.snapshot()) != 80.0:
+        fail("reload() replaced the norms with a half-written file")
+    if "Keeping the loaded norms" not in warning.getvalue():
+        fail(f"no warning for a half-written file: {warning.getvalue()!r}")
+
+    # Readers racing with reloads always see one whole version
+    stop = threading.Event()
+    errors = []
+    def reader():
+        code = TYPE_CODES["INFJ"]
+        while not stop.is_set():
+            snapshot = BigFiveNorms.snapshot()
+            value = openness(snapshot)
+            if value not in (60.0, 80.0) or float(snapshot.type_norm_matrix()[code, 0]) != value:
+                errors.append(value)
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for i in range(200):
+        norms_file(path, 60.0 if i % 2 else 80.0)
+        BigFiveNorms.reload(force=True)
+    stop.set()
+    for thread in readers:
+        thread.join()
+    if errors:
+        fail(f"{len(errors)} reads during reloads saw mixed norms")
+
+    # A replaced binary store is released as soon as nothing holds its snapshot
+    binary = os.path.join(tmp, "norms.bin")
+    norms_file(path, 60.0)
+    convert_json_norms(path, binary, TRAITS)
+    BigFiveNorms.reload(binary)
+    BigFiveNorms.snapshot().get_type_norms("INFJ", age=30)
+    store = weakref.ref(BigFiveNorms.snapshot().store)
+    gc.disable()
+    BigFiveNorms.reload(path)
+    gc.enable()
+    if store() is not None:
+        fail("the replaced NormStore was not freed without a GC pass")
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
@@ -0,0 +1,128 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing profile store pack/query round-trips (float16 and uint8 traits) against a scan of the input..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+import csv, math, os, random, subprocess, sys, tempfile
+import numpy as np
+from core.bigfive import TRAITS
+from core.functions import pack_stack, derive_cognitive_stack
+from core.profilestore import ProfileStore
+from core.typecode import TYPE_NAMES
+
+rng = random.Random(0)
+# Scores with one decimal, so distinct inputs stay distinct in float16;
+# some exactly on the query bounds below, some missing
+BOUND_VALUES = [10.4, 33.3, 50.0, 66.7, 99.9, 0.0, 100.0]
+rows = []
+for i in range(3000):
+    mbti = rng.choice(TYPE_NAMES)
+    scores = [
+        None if rng.random() < 0.05 else
+        rng.choice(BOUND_VALUES) if rng.random() < 0.2 else
+        round(rng.uniform(0, 100), 1)
+        for _ in TRAITS
+    ]
+    stack = derive_cognitive_stack(mbti) if rng.random() < 0.8 else None
+    rows.append((mbti, scores, stack))
+
+queries = [
+    (None, {"openness": (10.4, None)}),
+    (None, {"openness": (None, 10.4)}),
+    (None, {"openness": (10.4, 10.4)}),
+    (["INFJ"], {"conscientiousness": (33.3, 66.7)}),
+    (["INFJ", "ENTP", "ISTJ", "ESFP"], {"extraversion": (50.0, 99.9), "neuroticism": (0.0, 50.0)}),
+    (["ENTP", "ISFP"], None),
+    (None, {"agreeableness": (None, None)}),
+    (None, {"openness": (100.0, 100.0)}),
+    (None, {"openness": (150.0, None)}),
+]
+
+def expected_rows(types, ranges, quantize):
+    matches = []
+    for index, (mbti, scores, _) in enumerate(rows):
+        if types is not None and mbti not in types:
+            continue
+        ok = True
+        for trait, (low, high) in (ranges or {}).items():
+            value = scores[TRAITS.index(trait)]
+            if value is None:
+                ok = False
+                break
+            value = quantize(value)
+            if (low is not None and value < low) or (high is not None and value > high):
+                ok = False
+                break
+        if ok:
+            matches.append(index)
+    return matches
+
+with tempfile.TemporaryDirectory() as tmp:
+    source = os.path.join(tmp, "profiles.csv")
+    with open(source, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["type", *TRAITS, "stack"])
+        for mbti, scores, stack in rows:
+            writer.writerow([mbti, *("" if s is None else s for s in scores), "-".join(stack) if stack else ""])
+
+    # uint8 stores whole points; with whole-point bounds a rounded value is compared as is
+    for trait_dtype, quantize in (("float16", lambda v: v), ("uint8", lambda v: float(np.rint(v)))):
+        path = os.path.join(tmp, f"profiles-{trait_dtype}.bin")
+        subprocess.run([sys.executable, "eidon.py", "profiles", "pack", source, "--output", path,
+                        "--traits", trait_dtype, "--stacks"], check=True, capture_output=True)
+        store = ProfileStore(path)
+        if len(store) != len(rows):
+            print(f"  FAIL: {trait_dtype}: {len(store)} profiles stored, expected {len(rows)}")
+            continue
+        if [TYPE_NAMES[code] for code in store.types.tolist()] != [mbti for mbti, _, _ in rows]:
+            print(f"  FAIL: {trait_dtype}: types differ from the input")
+        scores = store.scores()
+        tolerance = 0.05 if trait_dtype == "float16" else 0.5
+        for index, (_, expected, _) in enumerate(rows):
+            for col, value in enumerate(expected):
+                stored = float(scores[index, col])
+                if (value is None) != math.isnan(stored) or (value is not None and abs(stored - value) > tolerance):
+                    print(f"  FAIL: {trait_dtype}: row {index} {TRAITS[col]} stored as {stored}, expected {value}")
+        keys = store.stack_keys().tolist()
+        for index, (_, _, stack) in enumerate(rows):
+            if keys[index] != (pack_stack(stack) if stack else 0xFFFF):
+                print(f"  FAIL: {trait_dtype}: row {index} stack key {keys[index]}")
+
+        for types, ranges in queries:
+            if trait_dtype == "uint8":
+                ranges = {t: tuple(None if b is None else float(math.floor(b)) for b in r) for t, r in (ranges or {}).items()}
+            expected = expected_rows(types, ranges, quantize)
+            actual = store.select(types, ranges).tolist()
+            if actual != expected:
+                print(f"  FAIL: {trait_dtype}: select({types}, {ranges}) gave {len(actual)} rows, expected {len(expected)}")
+
+        # query --output writes the matching rows to a store of their own
+        subset = os.path.join(tmp, f"subset-{trait_dtype}.bin")
+        subprocess.run([sys.executable, "eidon.py", "profiles", "query", path, "--type", "INFJ", "ENTP",
+                        "--range", "openness", "10.4", "-", "--output", subset], check=True, capture_output=True)
+        selected = store.select(["INFJ", "ENTP"], {"openness": (10.4, None)})
+        copy = ProfileStore(subset)
+        if copy.types.tolist() != store.types[selected].tolist():
+            print(f"  FAIL: {trait_dtype}: query --output types differ from select()")
+        if not np.array_equal(copy.scores(), store.scores(selected), equal_nan=True):
+            print(f"  FAIL: {trait_dtype}: query --output scores differ from select()")
+        if copy.stack_keys().tolist() != store.stack_keys(selected).tolist():
+            print(f"  FAIL: {trait_dtype}: query --output stacks differ from select()")
+        copy.close()
+        store.close()
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
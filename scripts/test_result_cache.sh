@@ -0,0 +1,61 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing that batch --cache output equals uncached output (cold and warm cache)..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+import json, os, subprocess, sys, tempfile
+
+# Requests that share a cache key differ only in case, whitespace or id
+requests = [
+    {"op": "get_intertype_relation", "type": "INFJ", "compare_to": "ENTP"},
+    {"op": "get_intertype_relation", "type": " infj", "compare_to": "entp"},
+    {"op": "get_intertype_relation", "type": "INFJ", "compare_to": "XXXX"},
+    {"op": "analyze_type", "type": "enfp ", "compare_to": "ISTJ", "id": 7},
+    {"op": "analyze_type", "type": "ENFP", "compare_to": "istj", "id": 8},
+    {"op": "bigfive", "type": "infj", "bigfive": [60, 50, 40, 70, 30]},
+    {"op": "bigfive", "type": " INFJ", "bigfive": [60, 50, 40, 70, 30]},
+    {"op": "infer_mbti_from_bigfive", "bigfive": [65, 55, 35, 70, 45], "top_k": 3},
+    {"op": "infer_mbti_from_bigfive", "bigfive": [65, 55, 35, 70, 45], "top_k": 1e400},
+    {"op": "infer_type_distribution", "stack": ["Ni", "Fe", "Ti", "Se"]},
+    {"op": "analyze_cbt_thought", "text": "I ALWAYS fail, everyone hates me"},
+    {"op": "analyze_cbt_thought", "text": "i always fail, everyone hates me"},
+]
+lines = "".join(json.dumps(request) + "\n" for request in requests)
+
+with tempfile.TemporaryDirectory() as tmp:
+    env = dict(os.environ, EIDON_CACHE_DIR=tmp)
+    def run(*extra):
+        # Exit status 2 means some records are errors, as some are here
+        result = subprocess.run(
+            [sys.executable, "eidon.py", "batch", *extra], input=lines, env=env,
+            capture_output=True, text=True,
+        )
+        if result.returncode not in (0, 2):
+            command = " ".join(["eidon.py batch", *extra])
+            print(f"  FAIL: {command} exited with {result.returncode}: {result.stderr.strip()}")
+        return result.stdout.splitlines()
+    uncached = run()
+    cache_args = ["--cache", "--cache-path", os.path.join(tmp, "results.sqlite")]
+    for label, cached in (("cold", run(*cache_args)), ("warm", run(*cache_args))):
+        if len(cached) != len(uncached):
+            print(f"  FAIL: {label} cache gave {len(cached)} records, expected {len(uncached)}")
+            continue
+        for request, expected, actual in zip(requests, uncached, cached):
+            if actual != expected:
+                print(f"  FAIL: {label} cache, {json.dumps(request)}: {actual} != {expected}")
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
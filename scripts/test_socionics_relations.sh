@@ -0,0 +1,24 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+echo "Testing precomputed Socionics relation table against get_exact_relation (256 pairs)..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+from core.socionics import verify_relation_table
+for type_a, type_b, expected, actual in verify_relation_table():
+    print(f"  FAIL: {type_a} -> {type_b}: expected {expected}, table has {actual}")
+' 2>&1)
+
+echo
+if [[ -z "$output" ]]; then
+  echo "All tests passed successfully!"
+else
+  echo "$output"
+  echo "$(echo "$output" | wc -l) test(s) failed."
+  exit 1
+fi
@@ -0,0 +1,44 @@
+#!/bin/bash
+
+# Get the directory of this script (scripts/)
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+
+# Project root is parent directory of scripts/
+PROJECT_ROOT="$(dirname "$SCRIPT_DIR")"
+
+# Cold-start budget for `eidon.py infer`, in milliseconds (best of RUNS)
+BUDGET_MS="${EIDON_STARTUP_BUDGET_MS:-150}"
+RUNS="${EIDON_STARTUP_RUNS:-5}"
+
+echo "Testing cold-start time of 'eidon.py infer' (budget: ${BUDGET_MS} ms, best of ${RUNS})..."
+
+output=$(cd "$PROJECT_ROOT" && python3 -c '
+import subprocess, sys, time
+
+budget_ms, runs = float(sys.argv[1]), int(sys.argv[2])
+
+def best_of(cmd):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+baseline = best_of([sys.executable, "-c", "pass"])
+infer = best_of([sys.executable, "eidon.py", "infer", "--stack", "Ni", "Fe", "Ti", "Se"])
+print(f"  python3 -c pass: {baseline:.1f} ms")
+print(f"  eidon.py infer:  {infer:.1f} ms")
+if infer > budget_ms:
+    print(f"  FAIL: {infer:.1f} ms exceeds budget of {budget_ms:.0f} ms")
+' "$BUDGET_MS" "$RUNS" 2>&1)
+
+echo "$output"
+echo
+if echo "$output" | grep -q -e "FAIL" -e "Error"; then
+  echo "1 test(s) failed."
+  echo "Run with EIDON_IMPORT_PROFILE=1 to see per-module import times."
+  exit 1
+else
+  echo "All tests passed successfully!"
+fi
@@ -1,12 +1,7 @@
 import argparse
+import sys
 
-def parse_arguments():
-    parser = argparse.ArgumentParser(description="MBTI Cognitive Function Analysis")
-
-    subparsers = parser.add_subparsers(dest="command", help="sub-command help", required=True)
-
-    # Analyze command
-    analyze_parser = subparsers.add_parser("analyze", help="Analyze MBTI cognitive functions")
+def _add_analyze_arguments(analyze_parser):
     analyze_parser.add_argument("--type", help="The MBTI type (e.g., INFJ, INTJ)")
     analyze_parser.add_argument(
         '--bigfive',
@@ -15,6 +10,18 @@ def parse_arguments():
         metavar=('O', 'C', 'E', 'A', 'N'),
         help='Big Five traits: Openness, Conscientiousness, Extraversion, Agreeableness, Neuroticism (0-100)'
     )
+    analyze_parser.add_argument(
+        '--age',
+        help='Age in years or age band, for stratified Big Five norms'
+    )
+    analyze_parser.add_argument(
+        '--sex',
+        help='Sex label, for stratified Big Five norms'
+    )
+    analyze_parser.add_argument(
+        '--country',
+        help='Country label, for stratified Big Five norms'
+    )
     analyze_parser.add_argument(
         "--functions",
         nargs="+",
@@ -35,17 +42,464 @@ def parse_arguments():
         type=str,
         help='Input a free-text thought for CBT cognitive distortion analysis'
     )
+    _add_output_format_argument(analyze_parser)
 
-    # Infer command
-    infer_parser = subparsers.add_parser("infer", help="Infer MBTI type from cognitive function stack")
-    infer_parser.add_argument(
+def _add_output_format_argument(parser):
+    parser.add_argument(
+        "--format",
+        choices=["text", "json", "csv", "msgpack"],
+        default="text",
+        help="Output format: text, JSON lines, CSV or a MessagePack stream (default: text)"
+    )
+
+def _add_infer_arguments(infer_parser):
+    infer_source = infer_parser.add_mutually_exclusive_group(required=True)
+    infer_source.add_argument(
         "--stack",
         nargs=4,
-        required=True,
         help="Four-letter cognitive function stack (e.g., Ni Fe Ti Se)"
     )
+    infer_source.add_argument(
+        '--bigfive',
+        nargs=5,
+        type=float,
+        metavar=('O', 'C', 'E', 'A', 'N'),
+        help='Infer the closest MBTI types from Big Five traits (0-100)'
+    )
+    infer_source.add_argument(
+        '--strengths',
+        nargs=8,
+        type=float,
+        metavar=('NE', 'NI', 'SE', 'SI', 'TE', 'TI', 'FE', 'FI'),
+        help='Type probabilities from strength scores of all eight functions (any scale)'
+    )
+    infer_source.add_argument(
+        '--partial-stack',
+        nargs='+',
+        metavar='FUNCTION',
+        help="Type probabilities from up to four stack positions, '?' for unknown (e.g., Ni ? Ti)"
+    )
+    infer_parser.add_argument(
+        '--temperature',
+        type=float,
+        help='Softmax temperature for --strengths and --partial-stack (default: 0.1, '
+             'core.functions.DISTRIBUTION_TEMPERATURE)'
+    )
+    _add_output_format_argument(infer_parser)
+    infer_parser.add_argument(
+        '--top-k',
+        type=int,
+        default=3,
+        help='Number of ranked types to show with --bigfive, --strengths or --partial-stack (default: 3)'
+    )
 
-    args = parser.parse_args()
+def _add_batch_arguments(batch_parser):
+    batch_parser.add_argument(
+        "--input",
+        default="-",
+        help="JSONL request file (default: stdin)"
+    )
+    batch_parser.add_argument(
+        "--output",
+        default="-",
+        help="JSONL result file (default: stdout)"
+    )
+    _add_cache_arguments(batch_parser)
+
+def _add_cache_arguments(parser):
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse results across runs (memory LRU plus on-disk SQLite cache)"
+    )
+    parser.add_argument(
+        "--cache-path",
+        help="SQLite result cache file (default: results.sqlite in the cache directory)"
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=256,
+        help="Evict least recently used results beyond this size (default: 256)"
+    )
+
+def _add_serve_arguments(serve_parser):
+    serve_parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on (default: 127.0.0.1)"
+    )
+    serve_parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="TCP port to listen on (default: 8765)"
+    )
+    serve_parser.add_argument(
+        "--unix",
+        metavar="PATH",
+        help="Listen on a Unix socket instead of TCP"
+    )
+    serve_parser.add_argument(
+        "--watch-norms",
+        type=float,
+        metavar="SECONDS",
+        help="Check the norms file for changes every SECONDS and reload it (default: only on SIGHUP or POST /reload)"
+    )
+    _add_cache_arguments(serve_parser)
+
+def _add_list_arguments(list_parser):
+    list_parser.add_argument(
+        "types",
+        nargs="*",
+        metavar="TYPE",
+        help="MBTI types to list (default: all 16)"
+    )
+    list_parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="Output format (default: text)"
+    )
+
+def _add_check_arguments(check_parser):
+    check_parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=["ego-round-trip", "shadow-round-trips", "relation-symmetry", "relation-table", "inference-table",
+                 "socionics-groups"],
+        help="Run only these checks"
+    )
+    check_parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="Output format (default: text)"
+    )
+
+def _add_cbt_arguments(cbt_parser):
+    cbt_parser.add_argument(
+        "--file",
+        required=True,
+        help="Text file to analyze ('-' for stdin)"
+    )
+    cbt_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1 << 16,
+        help="Characters read per chunk (default: 65536)"
+    )
+    cbt_parser.add_argument(
+        "--records",
+        action="store_true",
+        help="Treat each input line as a separate record instead of one document"
+    )
+    cbt_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Worker processes for --records (default: CPU count)"
+    )
+    cbt_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=2000,
+        help="Records sent to a worker at a time with --records (default: 2000)"
+    )
+    cbt_parser.add_argument(
+        "--all-sentences",
+        action="store_true",
+        help="Also output sentences (or records) with no detected distortions"
+    )
+    cbt_parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="Output format: text, or one JSON object per line (default: text)"
+    )
+
+def _add_norms_arguments(norms_parser):
+    norms_subparsers = norms_parser.add_subparsers(dest="norms_command", required=True)
+    convert_parser = norms_subparsers.add_parser("convert", help="Convert JSON norms to the binary norms store")
+    convert_parser.add_argument("input", help="JSON norms file (flat per-type or stratified cells)")
+    convert_parser.add_argument("output", help="Binary norms file to write")
+    show_parser = norms_subparsers.add_parser("show", help="Show the norms selected for a stratum")
+    show_parser.add_argument("--file", help="Norms file (default: EIDON_NORMS_FILE or data/mbti_bigfive_norms.json)")
+    show_parser.add_argument("--type", help="MBTI type (default: all types)")
+    show_parser.add_argument("--age", help="Age in years or age band")
+    show_parser.add_argument("--sex", help="Sex label")
+    show_parser.add_argument("--country", help="Country label")
+
+def _add_aggregate_arguments(aggregate_parser):
+    aggregate_parser.add_argument(
+        "inputs",
+        nargs="*",
+        metavar="INPUT",
+        help="CSV or JSONL files of MBTI type and Big Five scores ('-' for stdin), or binary profile stores"
+    )
+    aggregate_parser.add_argument(
+        "--format",
+        choices=["csv", "jsonl"],
+        help="Input format (default: from the file extension; csv for stdin)"
+    )
+    aggregate_parser.add_argument(
+        "--quantiles",
+        action="store_true",
+        help="Keep histogram quantile sketches (written to binary norms files)"
+    )
+    aggregate_parser.add_argument(
+        "--merge",
+        nargs="+",
+        default=[],
+        metavar="PARTIAL",
+        help="Partial aggregates from other shards to merge in"
+    )
+    aggregate_parser.add_argument(
+        "--partial",
+        metavar="PATH",
+        help="Save the aggregate as a partial file for a later --merge"
+    )
+    aggregate_parser.add_argument(
+        "--output",
+        metavar="PATH",
+        help="Write norms: flat JSON for a .json path, otherwise a binary norms store"
+    )
+    aggregate_parser.add_argument(
+        "--min-count",
+        type=int,
+        default=1,
+        help="Leave out types with fewer rows than this (default: 1)"
+    )
+
+def _add_match_arguments(match_parser):
+    match_parser.add_argument(
+        "pool",
+        help="CSV or JSONL candidate profiles: id, type and optional Big Five scores ('-' for stdin); "
+             "or a binary profile store"
+    )
+    match_query = match_parser.add_mutually_exclusive_group()
+    match_query.add_argument(
+        "--type",
+        help="Match one query of this MBTI type (default: every pool member against the rest)"
+    )
+    match_query.add_argument(
+        "--queries",
+        metavar="PATH",
+        help="CSV or JSONL query profiles, in the same format as the pool"
+    )
+    match_parser.add_argument(
+        '--bigfive',
+        nargs=5,
+        type=float,
+        metavar=('O', 'C', 'E', 'A', 'N'),
+        help='Big Five scores of the --type query, to order partners of the same type'
+    )
+    match_parser.add_argument(
+        "--input-format",
+        choices=["csv", "jsonl"],
+        help="Pool and query format (default: from the file extension; csv for stdin)"
+    )
+    match_parser.add_argument(
+        "--top-k",
+        type=int,
+        default=5,
+        help="Partners per query (default: 5)"
+    )
+    match_parser.add_argument(
+        "--prefer",
+        nargs="+",
+        metavar="RELATION",
+        help="Relations to match, best first (default: Duality, Activity, Semi-Duality, Mirror, "
+             "Identity, ...; never Conflict or Supervision)"
+    )
+    match_parser.add_argument(
+        "--no-bigfive",
+        action="store_true",
+        help="Ignore Big Five scores and keep pool order within each type"
+    )
+    match_parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="Output format: text, or one JSON object per query (default: text)"
+    )
+
+def _add_profiles_arguments(profiles_parser):
+    profiles_subparsers = profiles_parser.add_subparsers(dest="profiles_command", required=True)
+    pack_parser = profiles_subparsers.add_parser("pack", help="Pack CSV or JSONL profiles into a binary profile store")
+    pack_parser.add_argument(
+        "inputs",
+        nargs="+",
+        metavar="INPUT",
+        help="CSV or JSONL profiles: type, optional Big Five scores and stack ('-' for stdin)"
+    )
+    pack_parser.add_argument("--output", required=True, metavar="PATH", help="Profile store to write")
+    pack_parser.add_argument(
+        "--format",
+        choices=["csv", "jsonl"],
+        help="Input format (default: from the file extension; csv for stdin)"
+    )
+    pack_parser.add_argument(
+        "--traits",
+        choices=["float16", "uint8"],
+        default="float16",
+        help="Trait encoding: float16 (2 bytes, about 0.03 points) or uint8 (1 byte, whole points) (default: float16)"
+    )
+    pack_parser.add_argument("--stacks", action="store_true", help="Also store each profile's function stack")
+    query_parser = profiles_subparsers.add_parser("query", help="Filter a profile store and summarize the matches")
+    query_parser.add_argument("store", help="Profile store written by `profiles pack`")
+    query_parser.add_argument("--type", nargs="+", metavar="TYPE", help="Keep profiles of these MBTI types")
+    query_parser.add_argument(
+        "--range",
+        nargs=3,
+        action="append",
+        default=[],
+        metavar=("TRAIT", "LOW", "HIGH"),
+        help="Keep profiles with TRAIT between LOW and HIGH ('-' for no bound); repeatable"
+    )
+    query_parser.add_argument("--output", metavar="PATH", help="Write the matching profiles to a new profile store")
+    query_parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="Output format (default: text)"
+    )
+
+def _add_team_arguments(team_parser):
+    team_parser.add_argument(
+        "members",
+        nargs="*",
+        metavar="TYPE",
+        help="MBTI types of the team members"
+    )
+    team_parser.add_argument(
+        "--roster",
+        metavar="PATH",
+        help="CSV or JSONL roster: id and type per member, as for `match` ('-' for stdin); "
+             "or a binary profile store"
+    )
+    team_parser.add_argument(
+        "--input-format",
+        choices=["csv", "jsonl"],
+        help="Roster format (default: from the file extension; csv for stdin)"
+    )
+    team_parser.add_argument(
+        "--select",
+        nargs="+",
+        default=[],
+        metavar="GROUP",
+        help="List the members in all of these quadras, clubs, temperaments or dichotomy poles "
+             "(e.g. Beta, Researchers, Ep, Static)"
+    )
+    team_parser.add_argument(
+        "--relation",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("RELATION", "TYPE"),
+        help="List the members with RELATION to TYPE (e.g. Duality ENTP); repeatable"
+    )
+    team_parser.add_argument(
+        "--format",
+        choices=["text", "json"],
+        default="text",
+        help="Output format (default: text)"
+    )
+
+# Command name -> (help, function adding the command's arguments)
+COMMANDS = {
+    "analyze": ("Analyze MBTI cognitive functions", _add_analyze_arguments),
+    "infer": ("Infer MBTI type from cognitive function stack", _add_infer_arguments),
+    "batch": ("Process newline-delimited JSON requests in one run", _add_batch_arguments),
+    "serve": ("Run a persistent local HTTP/JSON server", _add_serve_arguments),
+    "list": ("List cognitive function roles for MBTI types", _add_list_arguments),
+    "check": ("Run consistency checks across all 16 types", _add_check_arguments),
+    "cbt": ("Stream a text file through CBT distortion analysis", _add_cbt_arguments),
+    "norms": ("Convert and inspect Big Five normative data", _add_norms_arguments),
+    "aggregate": ("Build Big Five type norms from raw survey data", _add_aggregate_arguments),
+    "match": ("Find the best-relation partners for each query in a pool", _add_match_arguments),
+    "profiles": ("Pack and query binary profile stores", _add_profiles_arguments),
+    "team": ("Summarize a team's socionics groups and select members by group and relation", _add_team_arguments),
+}
+
+# Global options that take a value
+GLOBAL_VALUE_OPTIONS = ("--profile-format", "--profile-output", "--metrics", "--metrics-interval")
+
+def _command_name(argv):
+    """
+    The command in argv: the first token that is neither a global option
+    nor an option's value. None if that token is not a command.
+    """
+    tokens = iter(argv)
+    for token in tokens:
+        if not token.startswith("-"):
+            return token if token in COMMANDS else None
+        if "=" in token or token == "--profile":
+            continue
+        # argparse accepts unambiguous prefixes of long options
+        if any(option.startswith(token) for option in GLOBAL_VALUE_OPTIONS):
+            next(tokens, None)
+    return None
+
+def parse_arguments(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="MBTI Cognitive Function Analysis")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the run and report call metrics and cProfile results at exit"
+    )
+    parser.add_argument(
+        "--profile-format",
+        choices=["text", "json", "pstats"],
+        default="text",
+        help="--profile report format: text, json, or a cProfile pstats file (default: text)"
+    )
+    parser.add_argument(
+        "--profile-output",
+        metavar="PATH",
+        help="File for the --profile report (default: stderr; required for pstats)"
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FORMAT:PATH",
+        help="Export call metrics periodically and at exit: prometheus:PATH or jsonl:PATH "
+             "(default: EIDON_METRICS)"
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between metrics exports (default: 10)"
+    )
+
+    subparsers = parser.add_subparsers(dest="command", help="sub-command help", required=True)
+
+    # Only the command being run gets a subparser; each one is a full
+    # ArgumentParser. Without a recognizable command (e.g. bare --help or a
+    # typo) all of them are built so help and errors list every command.
+    selected = _command_name(argv)
+    for name, (help_text, add_arguments) in COMMANDS.items():
+        if selected is None or name == selected:
+            add_arguments(subparsers.add_parser(name, help=help_text))
+
+    args = parser.parse_args(argv)
+
+    if args.profile and args.profile_format == "pstats" and not args.profile_output:
+        parser.error("--profile-format pstats requires --profile-output")
+
+    if args.command == "aggregate":
+        if not args.inputs and not args.merge:
+            parser.error("aggregate command requires INPUT files or --merge")
+        if not args.partial and not args.output:
+            parser.error("aggregate command requires --output or --partial")
+
+    if args.command == "team" and bool(args.members) == bool(args.roster):
+        parser.error("team command requires either TYPE arguments or --roster")
+
+    if args.command == "match" and args.bigfive and not args.type:
+        parser.error("match --bigfive requires --type")
 
     # Validation: analyze requires at least --type or --bigfive or --cbt-thought
     if args.command == "analyze":
@@ -53,4 +507,3 @@ def parse_arguments():
             parser.error("analyze command requires at least --type or --bigfive or --cbt-thought")
 
     return args
-